@@ -0,0 +1,74 @@
+"""
+Operator endpoints (profiles, traces), all behind
+``X-Admin-Token: <ADMIN_TOKEN>``. Without ADMIN_TOKEN set they answer
+404, as if they did not exist. ``require_admin`` also guards the other
+endpoints that expose internals (/health/db, /auth/hashing).
+"""
+import hmac
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from config import ADMIN_TOKEN, PROFILE_MAX_SECONDS
+import profiling
+import tracing
+
+logger = logging.getLogger(__name__)
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def list_request_profiles():
+    """Recent per-request profiles (requests sent with X-Profile), newest first"""
+    return profiling.list_profiles()
+
+
+@router.get("/profiles/{profile_id}")
+async def get_request_profile(profile_id: str):
+    """One request's time breakdown, Mongo and Gemini waits, and cProfile call tree"""
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
+@router.get("/profiler/collapsed", response_class=PlainTextResponse)
+async def sample_collapsed_stacks(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(10, ge=1, le=1000),
+):
+    """Sample every thread's stack for a window; collapsed stacks for a flamegraph"""
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {PROFILE_MAX_SECONDS}")
+    try:
+        profiler = await profiling.sample(seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logger.info(f"Sampled {profiler.samples} stacks over {seconds}s")
+    return profiler.collapsed()
+
+
+@router.get("/traces")
+async def list_traces(limit: int = Query(50, ge=1, le=500)):
+    """Newest traces in the in-memory buffer"""
+    return tracing.recent_traces(limit)
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str, format: str = Query("native", pattern="^(native|otlp)$")):
+    """Spans of one trace, natively or as an OTLP/JSON ExportTraceServiceRequest"""
+    spans = tracing.get_trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found (it may have left the buffer)")
+    if format == "otlp":
+        return tracing.to_otlp(spans)
+    return [span.to_dict() for span in spans]
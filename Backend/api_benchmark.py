@@ -0,0 +1,302 @@
+"""
+Request-path micro-benchmark on the in-memory repositories.
+
+Drives the API in process through httpx's ASGI transport: no sockets and
+no Mongo, so the timings cover routing, validation, serialization and
+service logic only. Responses are only checked for an error status;
+tests/test_api.py covers what the endpoints return.
+
+    python api_benchmark.py [requests per endpoint]
+    python api_benchmark.py --logs                  # with INFO logging on
+    METRICS_ENABLED=False python api_benchmark.py   # baseline without metrics
+    python api_benchmark.py --round-trips [--rtt-ms 1]
+
+--round-trips compares the lab report and user drug write paths before
+and after they stopped reading back what they wrote. "before" is the
+current route plus the reads (and, for deletes, the separate pulls) it
+used to make, replayed as repository calls. Each repository call is one
+Mongo command on the Motor backend. It is counted and delayed by --rtt-ms
+to stand in for the network. Counter writes are the same on both sides
+and are not counted.
+
+With --logs every record goes through the real pipeline (queue, JSON
+formatting, redaction) and is written to /dev/null, so the difference to
+a plain run is the cost logging adds to the request path.
+
+Counters and dose reminders still need Mongo. Here their writes fail and
+are skipped, as they would be during a Mongo outage.
+"""
+import os
+
+os.environ["REPOSITORY_BACKEND"] = "memory"
+# Pin a cheap hash cost so startup skips calibration; no endpoint here hashes
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+os.environ.setdefault("GEMINI_WARM_UP", "False")
+
+import argparse
+import asyncio
+import inspect
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+import httpx
+import orjson
+from bson import ObjectId
+from fastapi import APIRouter
+from main import app
+from logging_config import configure_logging
+from lab_reports_routes import LabReport, create_lab_report, lab_report_out, update_lab_report
+from models import Drug
+from repositories import (
+    get_drugs_repository,
+    get_images_repository,
+    get_lab_reports_repository,
+    get_readings_repository,
+)
+from responses import ORJSONResponse
+import drug_service
+import user_drugs
+
+USERS = 20
+
+LAB_REPORT = {
+    "basicInfo": {"title": "Checkup", "type": "routine", "description": "Annual"},
+    "healthcareInfo": {"doctorName": "Dr. Rahman", "hospitalName": "City Hospital"},
+    "vitalSigns": {
+        "bloodPressure": "120/80",
+        "heartRate": "72 bpm",
+        "GlucoseLevel": "5.4 mmol/L",
+        "weight": "70 kg",
+    },
+    "additionalInfo": {"medications": "none", "diagnosis": "healthy"},
+}
+
+
+def _drug(i: int) -> dict:
+    return {
+        "drug_name": f"TAB NAPA {i % 5 * 100 + 500}MG",
+        "dosage": "1+0+1",
+        "instruction": "after meal",
+        "duration": "7 days",
+    }
+
+
+async def _seed_images(n: int = 200):
+    images = get_images_repository()
+    now = datetime.utcnow()
+    for i in range(n):
+        await images.insert({
+            "_id": f"image-{i}",
+            "user_id": "anonymous",
+            "original_filename": f"prescription-{i}.jpg",
+            "file_path": f"uploads/image-{i}.jpg",
+            "uploaded_at": now - timedelta(minutes=i),
+            "status": "completed",
+        })
+
+
+async def _timed(client, n: int, request) -> dict:
+    latencies = []
+    for i in range(n):
+        started = time.perf_counter()
+        response = await request(client, i)
+        latencies.append((time.perf_counter() - started) * 1e6)
+        assert response.status_code < 400, (response.status_code, response.text)
+    latencies.sort()
+    return {
+        "p50_us": round(latencies[len(latencies) // 2]),
+        "p99_us": round(latencies[int(0.99 * (len(latencies) - 1))]),
+        "req_per_s": round(n / (sum(latencies) / 1e6)),
+    }
+
+
+REQUESTS = {
+    "POST /api/readings/bp": lambda c, i: c.post(
+        "/api/readings/bp", params={"user_id": f"u{i % USERS}"},
+        json={"value": {"systolic": 120, "diastolic": 80}},
+    ),
+    "POST /api/readings/glucose": lambda c, i: c.post(
+        "/api/readings/glucose", params={"user_id": f"u{i % USERS}"}, json={"value": 5.4},
+    ),
+    "GET /api/readings/": lambda c, i: c.get("/api/readings/", params={"user_id": f"u{i % USERS}"}),
+    "POST /lab-reports/": lambda c, i: c.post(
+        "/lab-reports/", params={"user_id": f"u{i % USERS}"}, json=LAB_REPORT,
+    ),
+    "POST /user-drugs/all-drugs": lambda c, i: c.post(
+        f"/user-drugs/all-drugs/u{i % USERS}", json=[_drug(i), _drug(i + 1)],
+    ),
+    "GET /user-drugs/all-drugs": lambda c, i: c.get(f"/user-drugs/all-drugs/u{i % USERS}"),
+    "GET /user-drugs/interactions": lambda c, i: c.get(f"/user-drugs/interactions/u{i % USERS}"),
+    "GET /api/images": lambda c, i: c.get("/api/images", params={"limit": 20}),
+}
+
+
+async def main(n: int):
+    async with app.router.lifespan_context(app):
+        await _seed_images()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Lab report lookups need ids created by the POSTs
+            report_ids = []
+
+            async def get_report(c, i):
+                return await c.get(f"/lab-reports/{report_ids[i % len(report_ids)]}")
+
+            started = time.perf_counter()
+            for name, request in REQUESTS.items():
+                print(f"{name:32} {await _timed(client, n, request)}")
+                if name == "POST /lab-reports/":
+                    reports = (await client.get("/lab-reports/")).json()
+                    report_ids = [r["_id"] for r in reports]
+            print(f"{'GET /lab-reports/{id}':32} {await _timed(client, n, get_report)}")
+            print(f"total {time.perf_counter() - started:.2f}s for {n * (len(REQUESTS) + 1)} requests")
+
+
+# --round-trips
+
+class RoundTrips:
+    """Counts repository calls and delays each by the simulated round-trip time"""
+
+    def __init__(self, rtt_ms: float):
+        self.rtt = rtt_ms / 1000
+        self.count = 0
+
+    def instrument(self, repository):
+        for name, method in inspect.getmembers(repository, inspect.iscoroutinefunction):
+            if not name.startswith("_"):
+                setattr(repository, name, self._counted(method))
+
+    def _counted(self, method):
+        async def call(*args, **kwargs):
+            self.count += 1
+            await asyncio.sleep(self.rtt)
+            return await method(*args, **kwargs)
+        return call
+
+
+# The write paths as they were: respond from a re-read, check for the
+# document before writing, pull from each list separately
+before = APIRouter(prefix="/before")
+
+
+async def _reread(response) -> ORJSONResponse:
+    report = await get_lab_reports_repository().get(ObjectId(orjson.loads(response.body)["_id"]))
+    return ORJSONResponse(lab_report_out(report))
+
+
+@before.post("/lab-reports/")
+async def create_then_read(report: LabReport, user_id: Optional[str] = None):
+    return await _reread(await create_lab_report(report, user_id))
+
+
+@before.put("/lab-reports/{report_id}")
+async def update_then_read(report_id: str, report: LabReport):
+    return await _reread(await update_lab_report(report_id, report))
+
+
+@before.post("/user-drugs/all-drugs/{user_id}")
+async def read_then_add(user_id: str, drugs: List[Drug]):
+    await get_drugs_repository().get(user_id)
+    return await user_drugs.add_drugs_to_all(user_id, drugs)
+
+
+@before.post("/user-drugs/active-drugs/{user_id}")
+async def read_then_activate(user_id: str, drug: Drug):
+    await get_drugs_repository().get(user_id)
+    return await user_drugs.add_drug_to_active(user_id, drug)
+
+
+@before.delete("/user-drugs/active-drugs/{user_id}")
+async def read_then_deactivate(user_id: str, drug: Drug):
+    await get_drugs_repository().get(user_id)
+    return await user_drugs.remove_drug_from_active(user_id, drug)
+
+
+@before.delete("/user-drugs/all-drugs/{user_id}")
+async def read_then_pull_each(user_id: str, drug: Drug):
+    doc = await get_drugs_repository().get(user_id)
+    keyed = drug_service.with_key(drug.model_dump(include=user_drugs.DRUG_INPUT_FIELDS))
+    active = any(d.get("drug_key") == keyed["drug_key"] for d in (doc or {}).get("active_drugs", []))
+    response = await user_drugs.delete_drug_from_all(user_id, drug)
+    if active:
+        # active_drugs was a second pull
+        await get_drugs_repository().deactivate(user_id, keyed)
+    return response
+
+
+# One drug's lifecycle per user: each step is a path under test
+WRITE_PATHS = [
+    ("POST /lab-reports/", lambda c, p, i, ids: c.post(
+        f"{p}/lab-reports/", params={"user_id": f"rt{i}"}, json=LAB_REPORT,
+    )),
+    ("PUT /lab-reports/{id}", lambda c, p, i, ids: c.put(f"{p}/lab-reports/{ids[i]}", json=LAB_REPORT)),
+    ("POST /user-drugs/all-drugs", lambda c, p, i, ids: c.post(
+        f"{p}/user-drugs/all-drugs/rt{i}", json=[_drug(0), _drug(1)],
+    )),
+    ("POST /user-drugs/active-drugs", lambda c, p, i, ids: c.post(f"{p}/user-drugs/active-drugs/rt{i}", json=_drug(0))),
+    ("DELETE /user-drugs/active-drugs", lambda c, p, i, ids: c.request(
+        "DELETE", f"{p}/user-drugs/active-drugs/rt{i}", json=_drug(0),
+    )),
+    ("DELETE /user-drugs/all-drugs", lambda c, p, i, ids: c.request(
+        "DELETE", f"{p}/user-drugs/all-drugs/rt{i}", json=_drug(1),
+    )),
+]
+
+
+async def _write_paths(client, round_trips: RoundTrips, prefix: str, n: int) -> dict:
+    trips = {name: 0 for name, _ in WRITE_PATHS}
+    latencies = {name: [] for name, _ in WRITE_PATHS}
+    report_ids = []
+    for i in range(n):
+        for name, request in WRITE_PATHS:
+            round_trips.count = 0
+            started = time.perf_counter()
+            response = await request(client, prefix, i, report_ids)
+            latencies[name].append((time.perf_counter() - started) * 1000)
+            trips[name] += round_trips.count
+            assert response.status_code < 400, (prefix, name, response.status_code, response.text)
+            if name == "POST /lab-reports/":
+                report_ids.append(response.json()["_id"])
+    results = {}
+    for name, _ in WRITE_PATHS:
+        ordered = sorted(latencies[name])
+        results[name] = (trips[name] / n, ordered[len(ordered) // 2], ordered[int(0.99 * (len(ordered) - 1))])
+    return results
+
+
+async def round_trips_main(n: int, rtt_ms: float):
+    round_trips = RoundTrips(rtt_ms)
+    for repository in (get_lab_reports_repository(), get_drugs_repository(), get_readings_repository()):
+        round_trips.instrument(repository)
+    app.include_router(before)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            old = await _write_paths(client, round_trips, "/before", n)
+            new = await _write_paths(client, round_trips, "", n)
+    print(f"{n} requests per path, {rtt_ms} ms per round trip")
+    print(f"{'path':32} {'round trips':>12} {'p50 ms':>14} {'p99 ms':>14}")
+    for name, _ in WRITE_PATHS:
+        (old_trips, old_p50, old_p99), (new_trips, new_p50, new_p99) = old[name], new[name]
+        print(f"{name:32} {old_trips:5.1f} -> {new_trips:<4.1f} {old_p50:5.2f} -> {new_p50:<5.2f} "
+              f"{old_p99:5.2f} -> {new_p99:<5.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Request-path micro-benchmark")
+    parser.add_argument("requests", nargs="?", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--logs", action="store_true", help="keep INFO logging on (written to /dev/null)")
+    parser.add_argument("--round-trips", action="store_true", help="write paths before / after, with round trips")
+    parser.add_argument("--rtt-ms", type=float, default=1.0, help="simulated Mongo round trip (--round-trips)")
+    args = parser.parse_args()
+    if args.logs:
+        configure_logging(stream=open(os.devnull, "w"))
+        # The benchmark's own client logs every request; only count the app's
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+    else:
+        logging.disable(logging.WARNING)
+    if args.round_trips:
+        asyncio.run(round_trips_main(args.requests, args.rtt_ms))
+    else:
+        asyncio.run(main(args.requests))
@@ -0,0 +1,119 @@
+"""
+Current-user resolution shared by all routers.
+
+``get_current_user`` is a FastAPI dependency; FastAPI resolves it once per
+request no matter how many route dependencies ask for it. Behind it:
+
+- a verified-token cache keyed by the JWT signature, so a token is decoded
+  and HMAC-checked once and then trusted until its own ``exp``, unless the
+  revocation filter (see session_service) reports its ``jti`` as revoked;
+- a TTL/LRU cache of ``UserResponse`` by user_id, so repeated /auth/me and
+  /auth/check calls need no database round trip. Call ``invalidate_user``
+  whenever a user's profile changes.
+"""
+import time
+import logging
+from typing import Optional
+from cachetools import LRUCache, TTLCache
+from fastapi import Depends, Header, HTTPException, status
+import jwt
+from config import (
+    SECRET_KEY,
+    ALGORITHM,
+    TOKEN_CACHE_SIZE,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL_SECONDS,
+)
+from auth_service import get_user_by_id
+from session_service import revocations
+from models import UserResponse
+
+logger = logging.getLogger(__name__)
+
+# signature -> (signing input, claims)
+_token_cache = LRUCache(maxsize=TOKEN_CACHE_SIZE)
+# user_id -> UserResponse
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+def _decode_token(token: str) -> Optional[dict]:
+    """Claims of a correctly signed, unexpired token, decoding each distinct token only once"""
+    signing_input, _, signature = token.rpartition(".")
+    cached = _token_cache.get(signature)
+    if cached is not None:
+        cached_input, claims = cached
+        if cached_input == signing_input and claims.get("exp", 0) > time.time():
+            return claims
+        _token_cache.pop(signature, None)
+
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    if claims.get("sub") is None:
+        return None
+    _token_cache[signature] = (signing_input, claims)
+    return claims
+
+
+async def verify_token_claims(token: str) -> Optional[dict]:
+    """Claims of a valid, unrevoked token, or None"""
+    claims = _decode_token(token)
+    if claims is None:
+        return None
+    # Tokens issued before sessions existed carry no jti and cannot be revoked
+    jti = claims.get("jti")
+    if jti and await revocations.is_revoked(jti):
+        _token_cache.pop(token.rpartition(".")[2], None)
+        return None
+    return claims
+
+
+async def verify_token(token: str) -> Optional[str]:
+    """Return the user_id of a valid, unrevoked token"""
+    claims = await verify_token_claims(token)
+    return claims["sub"] if claims else None
+
+
+def invalidate_user(user_id: str):
+    """Drop a cached user profile (call after any profile update)"""
+    _user_cache.pop(user_id, None)
+
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    return authorization.split(" ")[1]
+
+
+async def get_optional_user_id(authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """user_id of the bearer token, or None if missing or invalid"""
+    token = bearer_token(authorization)
+    return await verify_token(token) if token else None
+
+
+async def get_current_user_id(authorization: Optional[str] = Header(None)) -> str:
+    """user_id of the bearer token; 401 if missing or invalid"""
+    token = bearer_token(authorization)
+    if not token:
+        logger.warning("No authorization header or invalid format")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated"
+        )
+    user_id = await verify_token(token)
+    if not user_id:
+        logger.warning("Invalid token")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
+        )
+    return user_id
+
+
+async def get_current_user(user_id: str = Depends(get_current_user_id)) -> UserResponse:
+    """The authenticated user's profile, served from cache when possible"""
+    user = _user_cache.get(user_id)
+    if user is None:
+        user_in_db = await get_user_by_id(user_id)
+        user = UserResponse(**user_in_db.model_dump(exclude={"password"}))
+        _user_cache[user_id] = user
+    return user
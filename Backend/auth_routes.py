@@ -1,60 +1,49 @@
-from fastapi import APIRouter, HTTPException, status, Response, Request, Header
+from fastapi import APIRouter, HTTPException, status, Response, Request, Header, Depends
 from fastapi.responses import JSONResponse
-from models import UserCreate, UserLogin, UserResponse, SignupResponse, LoginResponse
-from auth_service import create_user, authenticate_user, get_user_by_id
+from models import (
+    UserCreate,
+    UserLogin,
+    UserResponse,
+    SignupResponse,
+    LoginResponse,
+    RefreshRequest,
+    RefreshResponse,
+)
+from auth_service import create_user, authenticate_user
+from auth_dependencies import (
+    bearer_token,
+    get_current_user,
+    get_optional_user_id,
+    verify_token_claims,
+)
+from session_service import (
+    create_session,
+    rotate_session,
+    revoke_session,
+    revoke_refresh_token,
+)
+from rate_limiter import client_ip, login_limiter, retry_after_header
+from password_hashing import hashing_stats
+from admin_routes import require_admin
 from typing import Optional
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
-import jwt
-from config import SECRET_KEY, ALGORITHM
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create JWT access token"""
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(days=7)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-
-def verify_token(token: str):
-    """Verify JWT token"""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            return None
-        return user_id
-    except jwt.PyJWTError:
-        return None
-
-
 @router.post("/signup", response_model=SignupResponse)
 async def signup(user_data: UserCreate):
     """Register a new user"""
     try:
-        print(f"Creating user: {user_data}")
-
         user = await create_user(user_data)
-        print(f"User created successfully: {user}")
+        logger.info(f"User created: {user.user_id}")
 
-        # Create JWT token
-        access_token_expires = timedelta(days=7)
-        access_token = create_access_token(
-            data={"sub": user.user_id}, expires_delta=access_token_expires
-        )
-        print(f"Access token created: {access_token[:20]}...")
+        # Start a session: short-lived access token plus refresh token
+        access_token, refresh_token = await create_session(user.user_id)
 
         user_response = UserResponse(
             user_id=user.user_id,
@@ -64,14 +53,17 @@ async def signup(user_data: UserCreate):
             sex=user.sex,
             created_at=user.created_at,
         )
-        print(f"UserResponse created: {user_response}")
 
         signup_response = SignupResponse(
-            access_token=access_token, token_type="bearer", user=user_response
+            access_token=access_token,
+            token_type="bearer",
+            user=user_response,
+            refresh_token=refresh_token,
         )
-        print(f"SignupResponse created: {signup_response}")
 
         return signup_response
+    except HTTPException:
+        raise
     except AttributeError as e:
         if "bcrypt" in str(e) or "__about__" in str(e):
             logger.error(f"Bcrypt compatibility error: {str(e)}")
@@ -86,20 +78,26 @@ async def signup(user_data: UserCreate):
 
 
 @router.post("/login", response_model=LoginResponse)
-async def login(login_data: UserLogin):
+async def login(login_data: UserLogin, request: Request):
     """Login user"""
     try:
-        logger.info(f"Login attempt for email: {login_data.user_email}")
-        user = await authenticate_user(login_data)
-        logger.info(f"User authenticated successfully: {user.user_email}")
-
-        # Create JWT token
-        access_token_expires = timedelta(days=7)
-        access_token = create_access_token(
-            data={"sub": user.user_id}, expires_delta=access_token_expires
-        )
+        # Throttle before the user lookup and bcrypt verify
+        retry_after = await login_limiter.check(client_ip(request), login_data.user_email)
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, please retry later",
+                headers=retry_after_header(retry_after),
+            )
+        try:
+            user = await authenticate_user(login_data)
+        except HTTPException as e:
+            if e.status_code == status.HTTP_401_UNAUTHORIZED:
+                await login_limiter.record_failure(login_data.user_email)
+            raise
 
-        logger.info(f"Token created for user: {user.user_email}")
+        # Start a session: short-lived access token plus refresh token
+        access_token, refresh_token = await create_session(user.user_id)
 
         user_response = UserResponse(
             user_id=user.user_id,
@@ -111,11 +109,16 @@ async def login(login_data: UserLogin):
         )
 
         response_data = LoginResponse(
-            access_token=access_token, token_type="bearer", user=user_response
+            access_token=access_token,
+            token_type="bearer",
+            user=user_response,
+            refresh_token=refresh_token,
         )
 
-        logger.info(f"Login successful for user: {user.user_email}")
+        logger.info(f"Login successful for user: {user.user_id}")
         return response_data
+    except HTTPException:
+        raise
     except AttributeError as e:
         if "bcrypt" in str(e) or "__about__" in str(e):
             logger.error(f"Bcrypt compatibility error: {str(e)}")
@@ -125,49 +128,55 @@ async def login(login_data: UserLogin):
             )
         raise HTTPException(status_code=401, detail=str(e))
     except Exception as e:
-        logger.error(f"Login failed for email {login_data.user_email}: {str(e)}")
+        logger.error(f"Login failed: {str(e)}")
         raise HTTPException(status_code=401, detail=str(e))
 
 
-@router.post("/logout")
-async def logout():
-    """Logout user (with JWT, just remove token from client)"""
-    return {"message": "Successfully logged out"}
-
-
-@router.get("/me", response_model=UserResponse)
-async def get_current_user(authorization: Optional[str] = Header(None)):
-    """Get current user info"""
-    if not authorization or not authorization.startswith("Bearer "):
-        logger.warning("No authorization header or invalid format")
+@router.post("/refresh", response_model=RefreshResponse)
+async def refresh(refresh_data: RefreshRequest):
+    """Exchange a refresh token for a new access token and refresh token (none in the grace window)"""
+    rotated = await rotate_session(refresh_data.refresh_token)
+    if rotated is None:
+        logger.warning("Refresh with invalid, expired or reused refresh token")
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
         )
+    user_id, access_token, refresh_token = rotated
+    logger.info(f"Session refreshed for user: {user_id}")
+    return RefreshResponse(
+        access_token=access_token, refresh_token=refresh_token, token_type="bearer"
+    )
 
-    token = authorization.split(" ")[1]
-    user_id = verify_token(token)
 
-    if not user_id:
-        logger.warning("Invalid token")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
-        )
+@router.post("/logout")
+async def logout(
+    refresh_data: Optional[RefreshRequest] = None,
+    authorization: Optional[str] = Header(None),
+):
+    """Logout user: revoke the session of the access token or refresh token"""
+    token = bearer_token(authorization)
+    claims = await verify_token_claims(token) if token else None
+    if claims and claims.get("sid"):
+        await revoke_session(claims["sid"], claims["sub"])
+        logger.info(f"Session revoked for user: {claims['sub']}")
+    elif refresh_data is not None:
+        await revoke_refresh_token(refresh_data.refresh_token)
+    return {"message": "Successfully logged out"}
 
-    user = await get_user_by_id(user_id)
-    logger.info(f"Current user retrieved: {user.user_email}")
 
-    return UserResponse(
-        user_id=user.user_id,
-        user_name=user.user_name,
-        user_email=user.user_email,
-        blood_group=user.blood_group,
-        sex=user.sex,
-        created_at=user.created_at,
-    )
+@router.get("/me", response_model=UserResponse)
+async def get_me(user: UserResponse = Depends(get_current_user)):
+    """Get current user info"""
+    logger.info(f"Current user retrieved: {user.user_id}")
+    return user
 
 
 @router.get("/check")
-async def check_auth_status(authorization: Optional[str] = Header(None)):
+async def check_auth_status(
+    authorization: Optional[str] = Header(None),
+    user_id: Optional[str] = Depends(get_optional_user_id),
+):
     """Check if user is authenticated"""
     logger.info(f"Auth check with authorization header: {authorization is not None}")
 
@@ -175,9 +184,6 @@ async def check_auth_status(authorization: Optional[str] = Header(None)):
         logger.info("No authorization header or invalid format")
         return {"authenticated": False, "message": "No authorization header"}
 
-    token = authorization.split(" ")[1]
-    user_id = verify_token(token)
-
     if not user_id:
         logger.info("Invalid or expired token")
         return {"authenticated": False, "message": "Invalid or expired token"}
@@ -186,6 +192,12 @@ async def check_auth_status(authorization: Optional[str] = Header(None)):
     return {"authenticated": True, "user_id": user_id}
 
 
+@router.get("/hashing", dependencies=[Depends(require_admin)])
+async def password_hashing_status():
+    """Password hash calibration, pool timings and login throttling counters (admin token)"""
+    return {"hashing": hashing_stats(), "login_rate_limit": login_limiter.stats()}
+
+
 @router.get("/test")
 async def test_endpoint():
     """Simple test endpoint to verify auth routes are working"""
@@ -195,6 +207,7 @@ async def test_endpoint():
         "available_endpoints": [
             "/auth/signup",
             "/auth/login",
+            "/auth/refresh",
             "/auth/logout",
             "/auth/me",
             "/auth/check",
@@ -1,32 +1,27 @@
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from database import get_users_collection
+from repositories import get_users_repository
 from models import UserCreate, UserInDB, UserLogin
+from password_hashing import verify_and_update_password, get_password_hash, HashPoolOverloaded
 import uuid
+import logging
 from fastapi import HTTPException, status
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str) -> str:
-    """Generate password hash"""
-    return pwd_context.hash(password)
+def _overloaded() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many authentication requests, please retry shortly",
+    )
 
 
 async def create_user(user_data: UserCreate) -> UserInDB:
     """Create a new user"""
-    users_collection = get_users_collection()
+    users = get_users_repository()
 
     # Check if user already exists
-    existing_user = await users_collection.find_one(
-        {"user_email": user_data.user_email}
-    )
+    existing_user = await users.find_by_email(user_data.user_email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -35,7 +30,10 @@ async def create_user(user_data: UserCreate) -> UserInDB:
 
     # Create user document
     user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(user_data.password)
+    try:
+        hashed_password = await get_password_hash(user_data.password)
+    except HashPoolOverloaded:
+        raise _overloaded()
 
     user_doc = {
         "user_id": user_id,
@@ -47,33 +45,47 @@ async def create_user(user_data: UserCreate) -> UserInDB:
         "created_at": datetime.utcnow(),
     }
 
-    await users_collection.insert_one(user_doc)
+    await users.insert(user_doc)
     return UserInDB(**user_doc)
 
 
 async def authenticate_user(login_data: UserLogin) -> UserInDB:
     """Authenticate user with email and password"""
-    users_collection = get_users_collection()
+    users = get_users_repository()
 
-    user = await users_collection.find_one({"user_email": login_data.user_email})
+    user = await users.find_by_email(login_data.user_email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
 
-    if not verify_password(login_data.password, user["password"]):
+    try:
+        password_ok, new_hash = await verify_and_update_password(
+            login_data.password, user["password"]
+        )
+    except HashPoolOverloaded:
+        raise _overloaded()
+
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
 
+    if new_hash:
+        # Stored hash uses an old scheme or cost: upgrade it while we have the password
+        try:
+            await users.replace_password_hash(user["user_id"], user["password"], new_hash)
+            user["password"] = new_hash
+            logger.info(f"Upgraded password hash for user {user['user_id']}")
+        except Exception as e:
+            logger.warning(f"Failed to upgrade password hash for user {user['user_id']}: {e}")
+
     return UserInDB(**user)
 
 
 async def get_user_by_id(user_id: str) -> UserInDB:
     """Get user by user_id"""
-    users_collection = get_users_collection()
-
-    user = await users_collection.find_one({"user_id": user_id})
+    user = await get_users_repository().find_by_id(user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
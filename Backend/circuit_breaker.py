@@ -0,0 +1,93 @@
+"""
+Circuit breaker for calls to an external service.
+
+After ``failure_threshold`` consecutive failures the circuit opens and
+calls fail fast with ``CircuitOpen`` instead of waiting on a service
+that is down. After ``reset_timeout`` seconds one trial call is let
+through (half-open). If it succeeds the circuit closes; if it fails the
+circuit opens again.
+"""
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a service whose circuit is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def _admit(self):
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpen(f"{self.name} circuit is open")
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self.trial_in_flight:
+                self.rejected += 1
+                raise CircuitOpen(f"{self.name} circuit is half-open, trial call in flight")
+            self.trial_in_flight = True
+
+    def _record(self, ok: bool):
+        self.trial_in_flight = False
+        if ok:
+            if self.state != CLOSED:
+                logger.info(f"{self.name} circuit closed")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"{self.name} circuit opened after {self.consecutive_failures} failures")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    async def call(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) through the breaker"""
+        self._admit()
+        self.calls += 1
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            # Neither success nor failure; let the next call be the trial
+            self.trial_in_flight = False
+            raise
+        except Exception:
+            self._record(False)
+            raise
+        self._record(True)
+        return result
+
+    def stats(self) -> dict:
+        retry_in = 0.0
+        if self.state == OPEN:
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(retry_in, 1),
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
@@ -1,24 +1,161 @@
 import os
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables: the only load_dotenv in the app, other
+# modules read settings from here
 load_dotenv()
 
 # MongoDB Configuration
 MONGODB_URI = os.getenv("MONGODB_URI")
 
+# MongoDB connection pool (per worker process). 0 means "driver default" for
+# the timeouts. Compressors are tried in order ("zstd,snappy,zlib"); zstd and
+# snappy need the zstandard / python-snappy packages.
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "0"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+
+# Route read-heavy endpoints to secondaries (replica sets only), in causally
+# consistent sessions; secondaries lagging more than the staleness bound
+# (driver minimum 90 s) are skipped
+SECONDARY_READS = os.getenv("SECONDARY_READS", "False").lower() == "true"
+READ_MAX_STALENESS_SECONDS = int(os.getenv("READ_MAX_STALENESS_SECONDS", "90"))
+
+# Storage backend for users, readings, lab reports, drugs, images and
+# analyses: "motor" (MongoDB) or "memory" (per-process, for tests and
+# benchmarks; Mongo is not connected and its background jobs do not run)
+REPOSITORY_BACKEND = os.getenv("REPOSITORY_BACKEND", "motor")
+
+# Schema migrations: run pending ones in the background at startup, in
+# batches of MIGRATION_BATCH_SIZE, busy at most MIGRATION_DUTY_CYCLE of the
+# time (0.25 = sleep three times as long as each batch took)
+MIGRATIONS_ON_STARTUP = os.getenv("MIGRATIONS_ON_STARTUP", "True").lower() == "true"
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "500"))
+MIGRATION_DUTY_CYCLE = float(os.getenv("MIGRATION_DUTY_CYCLE", "0.25"))
+
 # JWT Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# Sessions: refresh token lifetime, how long the refresh token just replaced
+# still buys an access token (concurrent refreshes from one client), how
+# often each worker pulls revoked token ids into its in-memory filter, and
+# how many ids the filter is sized for
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+REFRESH_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "30"))
+REVOCATION_SYNC_INTERVAL_SECONDS = int(os.getenv("REVOCATION_SYNC_INTERVAL_SECONDS", "15"))
+REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", "100000"))
+
+# Auth caches: verified tokens (bounded by token expiry) and user profiles
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+
+# Login throttling: sliding window limits on attempts per client IP and per
+# IP and email, and on failed logins per email from any IP, kept in process
+# memory ("memory") or shared by all workers in Mongo ("mongo").
+LOGIN_RATE_LIMIT_STORE = os.getenv("LOGIN_RATE_LIMIT_STORE", "memory")
+LOGIN_RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("LOGIN_RATE_LIMIT_WINDOW_SECONDS", "60"))
+LOGIN_RATE_LIMIT_PER_IP = int(os.getenv("LOGIN_RATE_LIMIT_PER_IP", "20"))
+LOGIN_RATE_LIMIT_PER_EMAIL = int(os.getenv("LOGIN_RATE_LIMIT_PER_EMAIL", "5"))
+LOGIN_FAILURE_LIMIT_PER_EMAIL = int(os.getenv("LOGIN_FAILURE_LIMIT_PER_EMAIL", "30"))
+
+# Proxies whose X-Forwarded-For is trusted for the client IP: comma-separated
+# addresses or CIDR ranges. "*" trusts whichever peer connects, for hosts such
+# as Render (the default there) where the app is only reachable through their
+# proxy; list further ranges after it if more proxies sit in front.
+TRUSTED_PROXIES = [
+    proxy.strip()
+    for proxy in os.getenv("TRUSTED_PROXIES", "*" if os.getenv("RENDER") else "127.0.0.1,::1").split(",")
+    if proxy.strip()
+]
+
+# Password hashing pool: "process" or "thread" executor, worker count
+# (0 = one per CPU) and how many calls may wait before new ones are rejected
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "process")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "256"))
+
+# Password hash scheme ("bcrypt", or "argon2" with argon2-cffi installed) and
+# cost: calibrated at startup to about PASSWORD_HASH_TARGET_MS per hash,
+# unless PASSWORD_HASH_ROUNDS pins it
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "0"))
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "50"))
+
 # Google AI Configuration
 GOOGLE_AI_API_KEY = os.getenv("GOOGLE_AI_API_KEY")
+# Import the Gemini SDK in the background at startup. Off, it loads on the
+# first analysis instead (which then takes about half a second longer)
+GEMINI_WARM_UP = os.getenv("GEMINI_WARM_UP", "True").lower() == "true"
+
+# Gemini circuit breaker: open after this many consecutive failures, then
+# retry one call after the reset timeout
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+
+# Prometheus metrics middleware and /metrics endpoint
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+
+# Readiness (/health/ready) fails, so the load balancer stops routing to
+# this worker, when a threshold is crossed
+READY_MAX_MONGO_PING_MS = float(os.getenv("READY_MAX_MONGO_PING_MS", "500"))
+READY_MAX_POOL_SATURATION = float(os.getenv("READY_MAX_POOL_SATURATION", "0.9"))
+READY_MAX_LOOP_LAG_MS = float(os.getenv("READY_MAX_LOOP_LAG_MS", "200"))
+READY_MAX_ANALYSES_IN_FLIGHT = int(os.getenv("READY_MAX_ANALYSES_IN_FLIGHT", "20"))
 
 # Application Configuration
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", "10485760"))  # 10MB default
 
+# Admin endpoints (/admin) and per-request profiling are off unless set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Longest window GET /admin/profiler/collapsed will sample
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+# Tracing: share of requests traced, "memory" (ring buffer at /admin/traces)
+# or "file" (also appended to TRACE_FILE), and "native" or "otlp" JSON
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "True").lower() == "true"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "memory").lower()
+TRACE_FORMAT = os.getenv("TRACE_FORMAT", "native").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_BUFFER_SPANS = int(os.getenv("TRACE_BUFFER_SPANS", "5000"))
+
+# Logging: level, "json" or "text" output, and per-logger sampling of
+# records below WARNING, e.g. "uvicorn.access=0.1,image_routes=0.5"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+# Counter reconciliation interval (seconds)
+COUNTER_RECONCILE_INTERVAL_SECONDS = int(
+    os.getenv("COUNTER_RECONCILE_INTERVAL_SECONDS", "3600")
+)
+
+# Local drug dictionary used to normalize prescription drug names
+DRUG_DICTIONARY_PATH = os.getenv(
+    "DRUG_DICTIONARY_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "drug_dictionary.json"),
+)
+
+# Local drug-drug interaction dataset (keyed by canonical drug ids)
+DRUG_INTERACTIONS_PATH = os.getenv(
+    "DRUG_INTERACTIONS_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "drug_interactions.json"),
+)
+
+# Dose reminders: local time zone of dosage slot times, and how long a missed
+# dose stays "due" before the scheduler moves the reminder to the next dose
+DOSE_SCHEDULE_UTC_OFFSET_MINUTES = int(os.getenv("DOSE_SCHEDULE_UTC_OFFSET_MINUTES", "360"))
+DOSE_REMINDER_GRACE_MINUTES = int(os.getenv("DOSE_REMINDER_GRACE_MINUTES", "60"))
+
 # Allowed file extensions for uploads
 ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "bmp", "tiff"}
 
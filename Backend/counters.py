@@ -0,0 +1,145 @@
+"""
+Incrementally maintained document counters.
+
+Counts live in the ``counters`` collection and are ``$inc``-ed next to the
+writes that change them, so count endpoints never scan the source
+collections. A periodic reconciliation pass recomputes every counter from the
+source of truth to correct drift (e.g. a crash between a write and its $inc).
+"""
+import asyncio
+import logging
+from datetime import datetime
+from pymongo import UpdateOne
+from database import (
+    get_counters_collection,
+    get_lab_reports_collection,
+    get_image_collection,
+    get_user_readings_collection,
+    get_user_drug_collection,
+)
+
+logger = logging.getLogger(__name__)
+
+# Counter names
+LAB_REPORTS = "lab_reports"
+IMAGES = "images"
+BP_READINGS = "blood_pressure_readings"
+GLUCOSE_READINGS = "glucose_readings"
+DRUGS = "drugs"
+
+
+def _counter_id(name: str, user_id=None) -> str:
+    return name if user_id is None else f"{name}:{user_id}"
+
+
+def _inc_op(name: str, user_id, amount: int) -> UpdateOne:
+    return UpdateOne(
+        {"_id": _counter_id(name, user_id)},
+        {
+            "$inc": {"count": amount},
+            "$set": {"updated_at": datetime.utcnow()},
+            "$setOnInsert": {"name": name, "user_id": user_id},
+        },
+        upsert=True,
+    )
+
+
+async def increment(name: str, user_id=None, amount: int = 1):
+    """
+    Atomically adjust the global counter and, if a user is given, the user's counter.
+    Failures are logged, not raised: the reconciliation job repairs any drift.
+    """
+    if not amount:
+        return
+    ops = [_inc_op(name, None, amount)]
+    if user_id is not None:
+        ops.append(_inc_op(name, user_id, amount))
+    try:
+        await get_counters_collection().bulk_write(ops, ordered=False)
+    except Exception as e:
+        logger.warning(f"Failed to update counter {name} for user {user_id}: {e}")
+
+
+async def get_count(name: str, user_id=None) -> int:
+    """Read a counter value (0 if it has never been written)"""
+    doc = await get_counters_collection().find_one(
+        {"_id": _counter_id(name, user_id)}, {"count": 1}
+    )
+    return doc["count"] if doc else 0
+
+
+# Reconciliation: one aggregation per counter, grouped by user_id
+def _count_docs_pipeline():
+    return [{"$group": {"_id": "$user_id", "count": {"$sum": 1}}}]
+
+
+def _sum_array_pipeline(field: str):
+    return [
+        {
+            "$group": {
+                "_id": "$user_id",
+                "count": {"$sum": {"$size": {"$ifNull": [f"${field}", []]}}},
+            }
+        }
+    ]
+
+
+def _reconcile_sources():
+    return [
+        (LAB_REPORTS, get_lab_reports_collection(), _count_docs_pipeline()),
+        (IMAGES, get_image_collection(), _count_docs_pipeline()),
+        (BP_READINGS, get_user_readings_collection(), _sum_array_pipeline(BP_READINGS)),
+        (GLUCOSE_READINGS, get_user_readings_collection(), _sum_array_pipeline(GLUCOSE_READINGS)),
+        (DRUGS, get_user_drug_collection(), _sum_array_pipeline("all_drugs")),
+    ]
+
+
+async def reconcile_counters():
+    """Recompute every counter from its source collection"""
+    counters_collection = get_counters_collection()
+    for name, collection, pipeline in _reconcile_sources():
+        stamp = datetime.utcnow()
+        total = 0
+        ops = []
+        async for row in collection.aggregate(pipeline):
+            total += row["count"]
+            if row["_id"] is not None:
+                ops.append(
+                    UpdateOne(
+                        {"_id": _counter_id(name, row["_id"])},
+                        {
+                            "$set": {
+                                "name": name,
+                                "user_id": row["_id"],
+                                "count": row["count"],
+                                "reconciled_at": stamp,
+                            }
+                        },
+                        upsert=True,
+                    )
+                )
+        ops.append(
+            UpdateOne(
+                {"_id": name},
+                {"$set": {"name": name, "user_id": None, "count": total, "reconciled_at": stamp}},
+                upsert=True,
+            )
+        )
+        await counters_collection.bulk_write(ops, ordered=False)
+        # Users whose documents disappeared since the previous pass
+        await counters_collection.delete_many(
+            {"name": name, "user_id": {"$ne": None}, "reconciled_at": {"$lt": stamp}}
+        )
+        logger.info(f"Reconciled counter {name}: total={total}, users={len(ops) - 1}")
+
+
+async def run_reconciliation_loop(interval_seconds: int):
+    """Reconcile counters on startup and then every interval_seconds"""
+    while True:
+        try:
+            await reconcile_counters()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Counter reconciliation failed: {e}")
+        await asyncio.sleep(interval_seconds)
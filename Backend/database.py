@@ -1,34 +1,81 @@
-import os
+import logging
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.server_api import ServerApi
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from config import (
+    MONGODB_URI,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_COMPRESSORS,
+    ADMIN_TOKEN,
+    TRACING_ENABLED,
+)
+from mongo_monitoring import pool_listener, command_listener, write_clock
+from metrics import command_metrics
+from profiling import command_timer
+from tracing import command_spans
+
+logger = logging.getLogger(__name__)
 
 
 client = None
 db = None
 
 
-async def connect_to_mongo():
-    """Create database connection"""
+def client_options() -> dict:
+    """Pool, timeout and compression settings from config (unset values use driver defaults)"""
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS or None,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS or None,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS or None,
+        "event_listeners": [pool_listener, command_listener, write_clock, command_metrics],
+    }
+    if TRACING_ENABLED:
+        options["event_listeners"].append(command_spans)
+    if ADMIN_TOKEN:
+        # Attributes commands to requests profiled with X-Profile
+        options["event_listeners"].append(command_timer)
+    if MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = MONGO_MAX_IDLE_TIME_MS
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = MONGO_WAIT_QUEUE_TIMEOUT_MS
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return {k: v for k, v in options.items() if v is not None}
+
+
+async def connect_to_mongo() -> bool:
+    """
+    Create the database client and ping the server. Returns whether the
+    ping succeeded. The client is kept either way: the driver reconnects
+    on its own, and /health/ready reports when the server is reachable.
+    """
     global client, db
-    mongodb_uri = os.getenv("MONGODB_URI")
-    if not mongodb_uri:
+    if not MONGODB_URI:
         raise ValueError("MONGODB_URI not found in environment variables")
-    print("Connecting to MongoDB with URI:", mongodb_uri)  # Add this for debugging
 
-    client = AsyncIOMotorClient(mongodb_uri, server_api=ServerApi("1"))
+    options = client_options()
+    client = AsyncIOMotorClient(MONGODB_URI, server_api=ServerApi("1"), **options)
     db = client.medwise
+    logger.info(
+        f"Connecting to MongoDB (pool {options['minPoolSize']}-{options['maxPoolSize']}, "
+        f"compressors: {MONGO_COMPRESSORS or 'none'})"
+    )
 
     # Test the connection
     try:
         await client.admin.command("ping")
-        print("Successfully connected to MongoDB Atlas!")
+        logger.info("Successfully connected to MongoDB Atlas!")
+        return True
     except Exception as e:
-        print(f"Failed to connect to MongoDB: {e}")
-        db = None  # Ensure db is None if connection fails
+        logger.error(f"Failed to connect to MongoDB: {e}")
+        return False
 
 
 async def close_mongo_connection():
@@ -43,6 +90,11 @@ def get_database():
     return db
 
 
+def get_client():
+    """Get client instance"""
+    return client
+
+
 def get_user_collection():
     """Get user collection"""
     if db is None:
@@ -90,3 +142,45 @@ def get_lab_reports_collection():
     if db is None:
         raise RuntimeError("Database not connected. Call connect_to_mongo() first.")
     return db.lab_reports
+
+
+def get_counters_collection():
+    """Get counters collection"""
+    if db is None:
+        raise RuntimeError("Database not connected. Call connect_to_mongo() first.")
+    return db.counters
+
+
+def get_dose_reminders_collection():
+    """Get dose reminders collection"""
+    if db is None:
+        raise RuntimeError("Database not connected. Call connect_to_mongo() first.")
+    return db.dose_reminders
+
+
+def get_sessions_collection():
+    """Get login sessions collection"""
+    if db is None:
+        raise RuntimeError("Database not connected. Call connect_to_mongo() first.")
+    return db.sessions
+
+
+def get_revoked_tokens_collection():
+    """Get revoked access tokens collection"""
+    if db is None:
+        raise RuntimeError("Database not connected. Call connect_to_mongo() first.")
+    return db.revoked_tokens
+
+
+def get_rate_limits_collection():
+    """Get shared rate limit counters collection"""
+    if db is None:
+        raise RuntimeError("Database not connected. Call connect_to_mongo() first.")
+    return db.rate_limits
+
+
+def get_migrations_collection():
+    """Get schema migration checkpoints collection"""
+    if db is None:
+        raise RuntimeError("Database not connected. Call connect_to_mongo() first.")
+    return db.migrations
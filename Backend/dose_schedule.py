@@ -0,0 +1,132 @@
+"""
+Turn prescription dosage and duration strings into concrete dose times.
+
+``Drug.dosage`` uses the "morning+noon+night" convention ("1+0+1", "1+1+1+1",
+"½+0+½") and ``duration`` free text ("8 months", "14 days", "continue"). Each
+non-zero position of the dosage becomes a daily slot at a fixed local time.
+"""
+import re
+from datetime import datetime, time, timedelta
+from typing import List, Optional, Tuple
+from config import DOSE_SCHEDULE_UTC_OFFSET_MINUTES
+
+# Local slot times by number of dosage positions
+SLOT_TIMES = {
+    1: [time(8, 0)],
+    2: [time(8, 0), time(21, 0)],
+    3: [time(8, 0), time(14, 0), time(21, 0)],
+    4: [time(8, 0), time(13, 0), time(18, 0), time(22, 0)],
+}
+
+_FRACTIONS = {"½": 0.5, "¼": 0.25, "¾": 0.75}
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12,
+}
+_DURATION_UNITS = {"day": 1, "week": 7, "month": 30, "year": 365}
+_NUMBER = r"(?:(?<![\d.])\d+(?:\.\d+)?|\b(?:" + "|".join(_NUMBER_WORDS) + r")\b)"
+_DURATION_RE = re.compile(r"(" + _NUMBER + r")\s*(day|week|month|year|d|w|m|y)s?\b")
+# "for 2 weeks", "x 10 days": the span right after these is the course length
+_COURSE_MARKER_RE = re.compile(r"(?:\bfor|\bx|×)\s*$")
+# "twice a day", "every 2 days": spans after these are dose frequencies
+_FREQUENCY_MARKER_RE = re.compile(r"\b(?:per|every|once|twice|thrice|times)\s*$")
+_ONGOING_WORDS = ("continue", "cont", "ongoing", "long term", "lifelong", "indefinite")
+
+Slot = Tuple[time, float]
+
+
+def _quantity(part: str) -> float:
+    part = part.strip()
+    if part in _FRACTIONS:
+        return _FRACTIONS[part]
+    if "/" in part:
+        numerator, _, denominator = part.partition("/")
+        try:
+            return float(numerator) / float(denominator)
+        except (ValueError, ZeroDivisionError):
+            return 0.0
+    try:
+        return float(part)
+    except ValueError:
+        return 0.0
+
+
+def parse_dosage(dosage: str) -> List[Slot]:
+    """
+    Daily (local time, quantity) slots for a dosage like "1+0+1".
+    Returns [] if the dosage does not follow the x+x+x convention.
+    """
+    parts = re.split(r"\s*[+\-]\s*", (dosage or "").strip())
+    if len(parts) not in SLOT_TIMES:
+        return []
+    quantities = [_quantity(part) for part in parts]
+    return [
+        (slot_time, quantity)
+        for slot_time, quantity in zip(SLOT_TIMES[len(parts)], quantities)
+        if quantity > 0
+    ]
+
+
+def parse_duration(duration: str) -> Optional[timedelta]:
+    """
+    Length of a course like "8 months" or "once a day for 2 weeks".
+    None when ongoing, unparseable or ambiguous: a course that is not
+    understood must never end early.
+    """
+    text = (duration or "").lower()
+    if any(word in text for word in _ONGOING_WORDS):
+        return None
+
+    marked, unmarked = set(), set()
+    for match in _DURATION_RE.finditer(text):
+        amount, unit = match.groups()
+        before = text[:match.start()]
+        if _COURSE_MARKER_RE.search(before):
+            spans = marked
+        elif amount in ("a", "an") or _FREQUENCY_MARKER_RE.search(before):
+            # "a day", "per day", "every 2 days" say how often, not how long
+            continue
+        else:
+            spans = unmarked
+        amount = float(_NUMBER_WORDS.get(amount, amount))
+        unit = next(u for u in _DURATION_UNITS if u.startswith(unit))
+        spans.add(amount * _DURATION_UNITS[unit])
+
+    days = marked or unmarked
+    if len(days) != 1:
+        return None
+    return timedelta(days=days.pop())
+
+
+def _utc_offset() -> timedelta:
+    return timedelta(minutes=DOSE_SCHEDULE_UTC_OFFSET_MINUTES)
+
+
+def next_dose_time(slots: List[Slot], after: datetime) -> Optional[Tuple[datetime, float]]:
+    """First (UTC dose time, quantity) strictly after a naive UTC datetime"""
+    if not slots:
+        return None
+    local_after = after + _utc_offset()
+    for day_offset in (0, 1):
+        day = local_after.date() + timedelta(days=day_offset)
+        for slot_time, quantity in slots:
+            local = datetime.combine(day, slot_time)
+            if local > local_after:
+                return local - _utc_offset(), quantity
+    return None
+
+
+def expand_schedule(dosage: str, duration: str, start: datetime, limit: int = 1000) -> List[dict]:
+    """Concrete UTC dose times from start until the course ends (at most limit)"""
+    slots = parse_dosage(dosage)
+    course = parse_duration(duration)
+    ends_at = start + course if course else None
+    doses = []
+    current = start
+    while len(doses) < limit:
+        upcoming = next_dose_time(slots, current)
+        if upcoming is None or (ends_at and upcoming[0] > ends_at):
+            break
+        current, quantity = upcoming
+        doses.append({"due_at": current, "quantity": quantity})
+    return doses
@@ -0,0 +1,269 @@
+"""Offline drug-name normalization against the local dictionary (data/drug_dictionary.json)"""
+import heapq
+import json
+import re
+import logging
+from collections import defaultdict
+from functools import lru_cache
+from typing import Optional
+from config import DRUG_DICTIONARY_PATH
+
+logger = logging.getLogger(__name__)
+
+# Dosage form abbreviations -> canonical form
+DOSAGE_FORMS = {
+    "tab": "tablet", "tabs": "tablet", "tablet": "tablet", "tablets": "tablet",
+    "cap": "capsule", "caps": "capsule", "capsule": "capsule", "capsules": "capsule",
+    "syp": "syrup", "syr": "syrup", "syrup": "syrup",
+    "susp": "suspension", "suspension": "suspension",
+    "inj": "injection", "injection": "injection",
+    "sol": "solution", "solution": "solution",
+    "drop": "drops", "drops": "drops", "gtt": "drops",
+    "cream": "cream", "crm": "cream",
+    "oint": "ointment", "ointment": "ointment",
+    "gel": "gel", "lotion": "lotion",
+    "inh": "inhaler", "inhaler": "inhaler", "spray": "spray",
+    "supp": "suppository", "suppository": "suppository",
+    "sachet": "sachet", "powder": "powder", "pwd": "powder",
+}
+
+_UNITS = {"mg": "mg", "mcg": "mcg", "µg": "mcg", "ug": "mcg", "g": "g", "gm": "g",
+          "ml": "ml", "iu": "IU", "unit": "IU", "units": "IU", "%": "%"}
+
+_STRENGTH_RE = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(mcg|µg|ug|mg|gm|g|ml|iu|units?|%)"
+    r"(?:\s*/\s*(\d+(?:\.\d+)?)?\s*(ml|g|gm))?(?![a-z])"
+)
+# Digits stay in names: "vitamin b12" is not "vitamin b1"
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9\-]*")
+
+_DIGITS_RE = re.compile(r"\d+")
+
+# Edits a misspelling may be from a dictionary name: (min length, edits)
+FUZZY_EDITS = ((9, 2), (5, 1))
+# Dice similarity of the closest trigram hit to be suggested
+FUZZY_SUGGEST_THRESHOLD = 0.6
+FUZZY_MIN_LENGTH = 4
+FUZZY_CANDIDATES = 8
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_edits(name: str) -> int:
+    return next((edits for length, edits in FUZZY_EDITS if len(name) >= length), 0)
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Edits (insert, delete, substitute, swap adjacent) from a to b; limit + 1 once beyond limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    beyond = limit + 1
+    # Only cells within limit of the diagonal can stay within limit
+    before, previous = None, [j if j <= limit else beyond for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        current = [beyond] * (len(b) + 1)
+        current[0] = i if i <= limit else beyond
+        for j in range(low, high + 1):
+            cb = b[j - 1]
+            cost = previous[j - 1] if ca == cb else previous[j - 1] + 1
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb and before[j - 2] + 1 < cost:
+                cost = before[j - 2] + 1
+            current[j] = cost
+        if min(current[low - 1:high + 1]) > limit:
+            return beyond
+        before, previous = previous, current
+    return min(previous[-1], beyond)
+
+
+def _shape(name: str) -> tuple:
+    return name[0], _DIGITS_RE.findall(name), name.count(" ")
+
+
+def _format_number(number: str) -> str:
+    return number.rstrip("0").rstrip(".") if "." in number else number
+
+
+def parse_drug_text(text: str) -> tuple:
+    """Split raw prescription text into (base name, strength, form)"""
+    text = (text or "").lower()
+
+    strengths = []
+    for amount, unit, per_amount, per_unit in _STRENGTH_RE.findall(text):
+        strength = f"{_format_number(amount)} {_UNITS[unit]}"
+        if per_unit:
+            per = f"{_format_number(per_amount)} " if per_amount else ""
+            strength += f"/{per}{_UNITS[per_unit]}"
+        strengths.append(strength)
+    text = _STRENGTH_RE.sub(" ", text)
+
+    form = None
+    name_words = []
+    for word in _WORD_RE.findall(text):
+        word = word.strip("-")
+        if word in DOSAGE_FORMS:
+            form = form or DOSAGE_FORMS[word]
+        elif word and not word.replace("-", "").isdigit():
+            # Bare numbers ("napa 500") are strengths without a unit
+            name_words.append(word)
+
+    strength = " + ".join(strengths) if strengths else None
+    return " ".join(name_words), strength, form
+
+
+class DrugNormalizer:
+    """Lookup of drug names against a dictionary, tolerant of small misspellings"""
+
+    def __init__(self, entries: list):
+        self._exact = {}
+        self._names = []
+        self._name_entries = []
+        self._name_grams = []
+        # (first letter, digits, word count) a misspelling must share
+        self._name_shape = []
+        self._index = defaultdict(list)
+
+        for entry in entries:
+            for name in (entry["id"].replace("_", " "), entry["name"], *entry.get("aliases", [])):
+                name = parse_drug_text(name)[0]
+                if not name or name in self._exact:
+                    continue
+                self._exact[name] = entry
+                position = len(self._names)
+                grams = _trigrams(name)
+                self._names.append(name)
+                self._name_entries.append(entry)
+                self._name_grams.append(len(grams))
+                self._name_shape.append(_shape(name))
+                for gram in grams:
+                    self._index[gram].append(position)
+
+    @classmethod
+    def from_file(cls, path: str) -> "DrugNormalizer":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        logger.info(f"Loaded {len(data['drugs'])} drugs from {path}")
+        return cls(data["drugs"])
+
+    def _candidates(self, name: str) -> list:
+        """[(Dice similarity, position)] of the dictionary names sharing most trigrams with name"""
+        if len(name) < FUZZY_MIN_LENGTH:
+            return []
+
+        grams = _trigrams(name)
+        shared = defaultdict(int)
+        for gram in grams:
+            for position in self._index.get(gram, ()):
+                shared[position] += 1
+
+        # Dice coefficient over trigram sets
+        return heapq.nlargest(FUZZY_CANDIDATES, (
+            (2.0 * count / (len(grams) + self._name_grams[position]), position)
+            for position, count in shared.items()
+        ))
+
+    def _misspelling_of(self, name: str, candidates: list) -> Optional[tuple]:
+        """(Dice similarity, position) of the one entry name is a misspelling of, if any"""
+        limit = _max_edits(name)
+        if not limit:
+            return None
+        shape = _shape(name)
+
+        matches = {}
+        for score, position in candidates:
+            if self._name_shape[position] != shape:
+                continue
+            distance = _edit_distance(name, self._names[position], limit)
+            if distance <= limit:
+                matches.setdefault(self._name_entries[position]["id"], (distance, -score, position))
+        if not matches:
+            return None
+        ranked = sorted(matches.values())
+        if len(ranked) > 1 and ranked[1][0] == ranked[0][0]:
+            # Equally close to two drugs: no guess
+            return None
+        distance, score, position = ranked[0]
+        return -score, position
+
+    def lookup(self, name: str) -> tuple:
+        """
+        (dictionary entry, similarity, identified) for a base name.
+        identified is True for an exact name/alias, or for a misspelling of
+        exactly one entry (see _misspelling_of). Otherwise the entry is the
+        closest candidate, a suggestion only (None below
+        FUZZY_SUGGEST_THRESHOLD).
+        """
+        entry = self._exact.get(name)
+        if entry is not None:
+            return entry, 1.0, True
+        candidates = self._candidates(name)
+        match = self._misspelling_of(name, candidates)
+        if match is not None:
+            score, position = match
+            return self._name_entries[position], score, True
+        if not candidates or candidates[0][0] < FUZZY_SUGGEST_THRESHOLD:
+            return None, candidates[0][0] if candidates else 0.0, False
+        score, position = candidates[0]
+        return self._name_entries[position], score, False
+
+    def _ingredients(self, text: str, entry: Optional[dict], identified: bool) -> list:
+        """Canonical ids interaction checks use for text"""
+        if identified:
+            return entry.get("ingredients") or [entry["id"]]
+        parts = [part for part in text.split("+") if part.strip()]
+        if len(parts) > 1:
+            looked_up = [self.lookup(parse_drug_text(part)[0]) for part in parts]
+            if all(part_identified for _, _, part_identified in looked_up):
+                ids = []
+                for part_entry, _, _ in looked_up:
+                    for ingredient in part_entry.get("ingredients") or [part_entry["id"]]:
+                        if ingredient not in ids:
+                            ids.append(ingredient)
+                return ids
+        return []
+
+    def normalize(self, text: str) -> dict:
+        """Canonical id, name, strength and form for raw prescription text"""
+        base, strength, form = parse_drug_text(text)
+        entry, score, identified = self.lookup(base)
+
+        if identified:
+            canonical_id, name = entry["id"], entry["name"]
+        else:
+            canonical_id, name = base.replace(" ", "_") or None, base.title() or None
+        ingredients = self._ingredients(text or "", entry, identified)
+        return {
+            "canonical_id": canonical_id,
+            "name": name,
+            "ingredients": ingredients or ([canonical_id] if canonical_id else []),
+            "strength": strength,
+            "form": form,
+            "matched": identified,
+            "score": round(score, 3),
+            "suggestion": None if identified or entry is None else {"id": entry["id"], "name": entry["name"]},
+        }
+
+
+_normalizer: Optional[DrugNormalizer] = None
+
+
+def get_normalizer() -> DrugNormalizer:
+    """Load the drug dictionary on first use"""
+    global _normalizer
+    if _normalizer is None:
+        _normalizer = DrugNormalizer.from_file(DRUG_DICTIONARY_PATH)
+    return _normalizer
+
+
+@lru_cache(maxsize=50_000)
+def normalize_drug_name(text: str) -> dict:
+    """Normalize prescription drug text (cached; treat the result as read-only)"""
+    return get_normalizer().normalize(text)
@@ -0,0 +1,148 @@
+"""
+User drug lists keyed by a normalized drug identity.
+
+Every entry in ``all_drugs``/``active_drugs`` carries a ``drug_key`` derived
+from its normalized name (see drug_normalizer), strength and dosage. Add,
+activate, deactivate and delete are each one atomic update that matches on
+that key, so there is no read-then-write race and a drug can appear at most
+once per list. Entries written before keys existed are matched by their
+exact name and dosage until they are migrated.
+"""
+import re
+import logging
+from typing import List, Optional
+from repositories import get_drugs_repository, drug_matches, DRUG_LISTS
+from drug_normalizer import normalize_drug_name
+import counters
+from reminder_scheduler import schedule_drugs, unschedule_drug
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(text: str) -> str:
+    text = (text or "").lower()
+    text = re.sub(r"[^a-z0-9+]+", " ", text)
+    return " ".join(text.split())
+
+
+def drug_key(drug_name: str, dosage: str) -> str:
+    """
+    Identity of a drug within a user's lists: canonical drug, strength and
+    dosage, so "TAB MIRALIN 5MG" and "miralin 5 mg" are the same drug.
+    """
+    normalized = normalize_drug_name(drug_name or "")
+    return (
+        f"{normalized['canonical_id'] or _normalize(drug_name)}"
+        f"|{normalized['strength'] or ''}"
+        f"|{_normalize(dosage).replace(' ', '')}"
+    )
+
+
+def with_key(drug: dict) -> dict:
+    """Drug with its identity key and normalized canonical id, ingredients, strength and form"""
+    normalized = normalize_drug_name(drug["drug_name"] or "")
+    return {
+        **drug,
+        "drug_key": drug_key(drug["drug_name"], drug["dosage"]),
+        "canonical_id": normalized["canonical_id"],
+        "ingredients": normalized["ingredients"],
+        "strength": normalized["strength"],
+        "form": normalized["form"],
+    }
+
+
+async def add_drugs(user_id: str, drugs: List[dict], active: bool = False) -> tuple:
+    """
+    Add drugs to all_drugs (and active_drugs if active) in one upsert,
+    skipping drugs the user already has. Returns (drugs that were new,
+    active drugs after the update).
+    """
+    unique = {}
+    for drug in drugs:
+        keyed = with_key(drug)
+        unique.setdefault(keyed["drug_key"], keyed)
+    drugs = list(unique.values())
+    if not drugs:
+        return []
+
+    before = await get_drugs_repository().add(user_id, drugs, active) or {}
+    existing_keys = {d.get("drug_key") for d in before.get("all_drugs", [])}
+    added = [drug for drug in drugs if drug["drug_key"] not in existing_keys]
+
+    # The pipeline is deterministic, so the new active list follows from the pre-image
+    active_drugs = before.get("active_drugs", [])
+    if active:
+        active_keys = {d.get("drug_key") for d in active_drugs}
+        activated = [d for d in drugs if d["drug_key"] not in active_keys]
+        active_drugs = active_drugs + activated
+        await schedule_drugs(user_id, activated)
+
+    await counters.increment(counters.DRUGS, user_id, len(added))
+    logger.info(f"Added {len(added)} of {len(drugs)} drugs for user {user_id} (active={active})")
+    return added, active_drugs
+
+
+async def delete_drug(user_id: str, drug: dict) -> Optional[tuple]:
+    """
+    Remove a drug from all_drugs and active_drugs in one update.
+    Returns (removed from all_drugs, removed from active_drugs), or None if
+    the drug is not in all_drugs.
+    """
+    drug = with_key(drug)
+    before = await get_drugs_repository().remove(user_id, drug)
+    if before is None:
+        return None
+
+    removed = tuple(
+        sum(1 for entry in before.get(field, []) if drug_matches(entry, drug))
+        for field in DRUG_LISTS
+    )
+    await counters.increment(counters.DRUGS, user_id, -removed[0])
+    await unschedule_drug(user_id, drug["drug_key"])
+    return removed
+
+
+async def activate_drug(user_id: str, drug: dict) -> Optional[List[dict]]:
+    """
+    Copy a drug's all_drugs entry into active_drugs, if it is in all_drugs
+    and not already active. Returns the active drugs after the update, or
+    None if nothing was activated.
+    """
+    drug = with_key(drug)
+    active_drugs = await get_drugs_repository().activate(user_id, drug)
+    if active_drugs is None:
+        return None
+    # Schedule the activated entry (legacy entries without a key have no reminder)
+    await schedule_drugs(
+        user_id, [d for d in active_drugs if d.get("drug_key") == drug["drug_key"]]
+    )
+    return active_drugs
+
+
+async def deactivate_drug(user_id: str, drug: dict) -> bool:
+    """Remove a drug from active_drugs. Returns whether it was active."""
+    drug = with_key(drug)
+    deactivated = await get_drugs_repository().deactivate(user_id, drug)
+    if deactivated:
+        await unschedule_drug(user_id, drug["drug_key"])
+    return deactivated
+
+
+async def get_drug_state(user_id: str, drug: dict) -> Optional[dict]:
+    """
+    Where a drug currently is, for choosing an error response after a
+    failed mutation: None if the user has no drug document.
+    """
+    drug = with_key(drug)
+    doc = await get_drugs_repository().get(user_id)
+    if doc is None:
+        return None
+    return {
+        field: any(drug_matches(entry, drug) for entry in doc.get(field, []))
+        for field in DRUG_LISTS
+    }
+
+
+async def get_drugs(user_id: str, field: str) -> List[dict]:
+    """Return one of the user's drug lists"""
+    return await get_drugs_repository().get_list(user_id, field)
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
+from typing import Optional
+from auth_dependencies import get_optional_user_id
 from gemini_service import generate_text_from_image
 import logging
 
@@ -7,10 +9,14 @@ router = APIRouter(prefix="/gemini", tags=["Gemini"])
 
 
 @router.post("/upload-image/")
-async def upload_image(file: UploadFile = File(...)):
+async def upload_image(
+    file: UploadFile = File(...),
+    user_id: Optional[str] = Depends(get_optional_user_id),
+):
     """
     Uploads an image, generates text from it using the Gemini API,
-    and returns the generated text.
+    and returns the generated text. With a bearer token the analysis is
+    saved under the caller, so it shows up in their search.
     """
     logger.info("=== GEMINI UPLOAD ENDPOINT CALLED ===")
     logger.info(f"Received file: {file.filename}")
@@ -21,7 +27,7 @@ async def upload_image(file: UploadFile = File(...)):
         if not file:
             raise HTTPException(status_code=400, detail="No file provided")
 
-        result = await generate_text_from_image(file)
+        result = await generate_text_from_image(file, user_id)
         logger.info("Successfully processed file upload")
         return result
 
@@ -3,22 +3,81 @@ import os
 import uuid
 import logging
 from datetime import datetime
+from typing import Optional
 import io
 import json
 import re
-import google.generativeai as genai
-from config import GOOGLE_AI_API_KEY
-from database import get_image_collection, get_gemini_response_collection, get_user_drug_collection
+import asyncio
+import threading
+import time
+from config import GOOGLE_AI_API_KEY, GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET_SECONDS
+from circuit_breaker import CircuitBreaker, CircuitOpen, CLOSED, HALF_OPEN
+import metrics
+import profiling
+import tracing
+from repositories import get_images_repository, get_analyses_repository
+from drug_service import add_drugs
+from interaction_service import check_drugs, interactions_involving
 import random
 import string
+import counters
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure the Gemini API client
-genai.configure(api_key=GOOGLE_AI_API_KEY)
-model = genai.GenerativeModel("gemini-2.0-flash")
+GEMINI_MODEL = "gemini-2.0-flash"
+
+# The Gemini SDK takes about half a second to import, so it is loaded on
+# first use (or by warm_up during startup), not when this module is imported
+_model = None
+_model_lock = threading.Lock()
+
+
+def _gemini():
+    """The Gemini SDK module and configured model, created on first use"""
+    global _model
+    import google.generativeai as genai
+
+    with _model_lock:
+        if _model is None:
+            genai.configure(api_key=GOOGLE_AI_API_KEY)
+            _model = genai.GenerativeModel(GEMINI_MODEL)
+    return genai, _model
+
+
+def warm_up():
+    """Import and configure the Gemini SDK ahead of the first analysis (blocking)"""
+    _gemini()
+
+
+gemini_breaker = CircuitBreaker("gemini", GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET_SECONDS)
+
+# Analyses running on this worker (direct uploads and background processing)
+_in_flight = 0
+
+
+def analyses_in_flight() -> int:
+    return _in_flight
+
+
+GEMINI_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+gemini_requests = metrics.Counter(
+    "gemini_requests_total", "Gemini analysis calls by outcome (success, error, rejected)", ("outcome",)
+)
+gemini_duration = metrics.Histogram(
+    "gemini_request_duration_seconds", "Gemini upload and generate latency", buckets=GEMINI_BUCKETS
+)
+gemini_tokens = metrics.Counter("gemini_tokens_total", "Gemini tokens used (prompt, output)", ("kind",))
+gemini_json_parses = metrics.Counter(
+    "gemini_json_parse_total",
+    "Gemini replies by how their JSON parsed (direct, extracted, failed)",
+    ("result",),
+)
+metrics.CallbackGauge(
+    "gemini_circuit_state", "Gemini circuit: 0 closed, 1 half-open, 2 open", (),
+    lambda: {(): {CLOSED: 0, HALF_OPEN: 1}.get(gemini_breaker.state, 2)},
+)
+metrics.CallbackGauge("gemini_analyses_in_flight", "Image analyses running on this worker", (), lambda: {(): _in_flight})
 
 json_formate = """{"
   "report_type": "prescription",
@@ -105,6 +164,45 @@ json_formate = """{"
 """
 
 
+def _analyze_with_gemini(file_path: str):
+    """Upload an image to Gemini and ask for its JSON extraction (blocking SDK calls)"""
+    genai, model = _gemini()
+    img = genai.upload_file(file_path)
+    logger.info(f"File uploaded to Gemini API successfully")
+    return model.generate_content(
+        [
+            img,
+            f"extract it to json format strictly. only english, translate to english if there are any other language. dosage should be x+x+x formate. if you cant translate keep blank. JSON formate: {json_formate}",
+        ],
+    )
+
+
+async def _call_gemini(file_path: str):
+    """_analyze_with_gemini in a worker thread, through the breaker, with metrics and a span"""
+    with tracing.span("gemini.generate_content", kind=tracing.CLIENT, model=GEMINI_MODEL) as span:
+        started = time.perf_counter()
+        try:
+            response = await gemini_breaker.call(asyncio.to_thread, _analyze_with_gemini, file_path)
+        except CircuitOpen:
+            gemini_requests.inc("rejected")
+            raise
+        except Exception:
+            gemini_requests.inc("error")
+            gemini_duration.observe(time.perf_counter() - started)
+            raise
+        gemini_duration.observe(time.perf_counter() - started)
+        profiling.record_wait("gemini", GEMINI_MODEL, time.perf_counter() - started)
+        gemini_requests.inc("success")
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+            output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+            gemini_tokens.inc("prompt", amount=prompt_tokens)
+            gemini_tokens.inc("output", amount=output_tokens)
+            span.set(prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+        return response
+
+
 def extract_json_from_text(text):
     """
     Extract JSON from text that might contain markdown or other content
@@ -121,10 +219,8 @@ def extract_json_from_text(text):
     json_str = re.sub(r"^[^{]*", "", json_str)  # Remove anything before first '{'
     json_str = re.sub(r"[^}]*$", "", json_str)  # Remove anything after last '}'
 
-    print(
-        "Extracted JSON string:",
-        json_str[:100] + "..." if len(json_str) > 100 else json_str,
-    )
+    # Length only: the text is the patient's extracted medical record
+    logger.debug(f"Extracted JSON string of {len(json_str)} chars")
     return json_str
 
 
@@ -134,20 +230,21 @@ def random_id(length=24):
 
 async def process_and_save_prescriptions(user_id, prescription_data):
     """
-    Process prescription data from Gemini API response and save to user_drugs collection
+    Process prescription data from Gemini API response and save to user_drugs collection.
+    Returns the known interactions between the prescribed and active drugs.
     """
     logger.info(f"Processing prescriptions for user: {user_id}")
     
     if not prescription_data or not isinstance(prescription_data, list):
         logger.warning(f"No valid prescription data to process for user {user_id}")
-        return
+        return []
     
     # Convert prescription items to Drug objects
     drugs = []
     for item in prescription_data:
         # Check if item has all required fields
         if not all(key in item for key in ["drug_name", "dosage", "duration"]):
-            logger.warning(f"Skipping incomplete prescription item: {item}")
+            logger.warning(f"Skipping incomplete prescription item with fields {sorted(item)}")
             continue
             
         # Note: In the JSON response, it uses "instructions" but our model uses "instruction" (singular)
@@ -161,53 +258,33 @@ async def process_and_save_prescriptions(user_id, prescription_data):
     
     if not drugs:
         logger.warning(f"No valid drugs extracted from prescription data for user {user_id}")
-        return
-        
-    # Get user_drugs collection
-    user_drug_collection = get_user_drug_collection()
-    
-    # Check if user already has a document
-    user_drugs_doc = await user_drug_collection.find_one({"user_id": user_id})
-    
-    if user_drugs_doc:
-        # Update existing document
-        # Add new drugs to all_drugs list
-        await user_drug_collection.update_one(
-            {"user_id": user_id},
-            {"$push": {"all_drugs": {"$each": drugs}}}
-        )
-        
-        # Add new drugs to active_drugs list (assuming all new prescriptions are active)
-        await user_drug_collection.update_one(
-            {"user_id": user_id},
-            {"$push": {"active_drugs": {"$each": drugs}}}
-        )
+        return []
         
-        logger.info(f"Updated user_drugs document for user {user_id} with {len(drugs)} new drugs")
-    else:
-        # Create new document
-        new_user_drugs = {
-            "user_id": user_id,
-            "active_drugs": [],
-            "all_drugs": drugs
-        }
-        
-        await user_drug_collection.insert_one(new_user_drugs)
-        logger.info(f"Created new user_drugs document for user {user_id} with {len(drugs)} drugs")
-
+    # New prescriptions are active; drugs the user already has are not duplicated
+    added, active_drugs = await add_drugs(user_id, drugs, active=True)
+    logger.info(f"Saved {len(added)} new drugs of {len(drugs)} prescribed for user {user_id}")
 
+    # Check the new prescriptions against everything the user is taking
+    interactions = interactions_involving(check_drugs(active_drugs), drugs)
+    if interactions:
+        logger.warning(f"Found {len(interactions)} drug interactions for user {user_id}")
+    return interactions
 
 
-async def generate_text_from_image(file: UploadFile):
+async def generate_text_from_image(file: UploadFile, user_id: Optional[str] = None):
     """
     Generates text from an uploaded image file using the Gemini API.
-    No authentication required.
+    No authentication required: the analysis and its prescriptions are
+    stored under user_id when the caller is signed in, otherwise under a
+    random id.
     """
+    global _in_flight
     temp_file_path = None
     logger.info(f"=== GEMINI API ANALYSIS STARTED ===")
     logger.info(f"File: {file.filename}")
     logger.info(f"Content type: {file.content_type}")
 
+    _in_flight += 1
     try:
         # Validate file type
         if not file.content_type or not file.content_type.startswith("image/"):
@@ -234,24 +311,17 @@ async def generate_text_from_image(file: UploadFile):
         logger.info(f"Saving temporary file: {temp_file_path}")
 
         # Save the uploaded file temporarily
-        with open(temp_file_path, "wb") as f:
-            f.write(contents)
+        with tracing.span("image.preprocess", bytes=len(contents)):
+            with open(temp_file_path, "wb") as f:
+                f.write(contents)
         logger.info(f"Temporary file saved successfully: {temp_file_path}")
 
-        # Upload the temporary file to Gemini
+        # Upload the temporary file to Gemini and extract it, off the event loop
         logger.info(f"Uploading file to Gemini API: {temp_file_path}")
-        img = genai.upload_file(temp_file_path)
-        logger.info(f"File uploaded to Gemini API successfully")
-
-        response = model.generate_content(
-            [
-                img,
-                f"extract it to json format strictly. only english, translate to english if there are any other language. dosage should be x+x+x formate. if you cant translate keep blank. JSON formate: {json_formate}",
-            ],
-        )
+        response = await _call_gemini(temp_file_path)
 
         logger.info("Gemini API response received")
-        logger.debug(f"Raw Gemini API Response: {response.text}")
+        logger.debug(f"Raw Gemini API response of {len(response.text)} chars")
 
         # Create the consistent response envelope
         response_envelope = {
@@ -262,6 +332,7 @@ async def generate_text_from_image(file: UploadFile):
             "processed_at": datetime.utcnow().isoformat(),
             "imageId": None,
             "userId": None,
+            "interactions": [],
         }
 
         # Try to parse the response text as JSON
@@ -269,6 +340,7 @@ async def generate_text_from_image(file: UploadFile):
             # First try direct JSON parsing
             try:
                 parsed_json = json.loads(response.text)
+                gemini_json_parses.inc("direct")
                 logger.info("Successfully parsed direct JSON from Gemini response")
                 response_envelope["success"] = True
                 response_envelope["data"] = parsed_json
@@ -280,17 +352,19 @@ async def generate_text_from_image(file: UploadFile):
                 )
                 json_str = extract_json_from_text(response.text)
                 parsed_json = json.loads(json_str)
+                gemini_json_parses.inc("extracted")
                 logger.info("Successfully parsed extracted JSON from Gemini response")
                 response_envelope["success"] = True
                 response_envelope["data"] = parsed_json
 
         except json.JSONDecodeError as json_error:
+            gemini_json_parses.inc("failed")
             logger.error(f"JSON parsing error: {json_error}")
             response_envelope["error"] = f"JSON parsing error: {str(json_error)}"
 
         # Generate IDs for database storage
         image_id = random_id()
-        user_id = random_id()
+        user_id = user_id or random_id()
 
         response_envelope["imageId"] = image_id
         response_envelope["userId"] = user_id
@@ -310,10 +384,10 @@ async def generate_text_from_image(file: UploadFile):
             "completed_at": datetime.utcnow(),
         }
 
-        logger.info(f"Saving to database - image_doc: {image_doc}")
+        logger.info(f"Saving image {image_id} with status {image_doc['status']}")
 
-        image_collection = get_image_collection()
-        await image_collection.insert_one(image_doc)
+        await get_images_repository().insert(image_doc)
+        await counters.increment(counters.IMAGES, user_id)
 
         # Store Gemini API response in gemini_responses collection
         if response_envelope["success"]:
@@ -324,18 +398,18 @@ async def generate_text_from_image(file: UploadFile):
                 "created_at": datetime.utcnow(),
             }
 
-            logger.info(
-                f"Saving gemini response - gemini_response_doc: {gemini_response_doc}"
-            )
+            logger.info(f"Saving Gemini response for image {image_id}")
 
-            gemini_response_collection = get_gemini_response_collection()
-            await gemini_response_collection.insert_one(gemini_response_doc)
+            await get_analyses_repository().insert(gemini_response_doc)
 
 
             # Process prescriptions if they exist in the response
         if response_envelope["data"] and "prescriptions" in response_envelope["data"]:
             logger.info("Processing prescriptions from Gemini API response")
-            await process_and_save_prescriptions(user_id, response_envelope["data"]["prescriptions"])
+            with tracing.span("prescriptions.save"):
+                response_envelope["interactions"] = await process_and_save_prescriptions(
+                    user_id, response_envelope["data"]["prescriptions"]
+                )
         else:
             logger.info("No prescriptions found in Gemini API response")
 
@@ -344,10 +418,17 @@ async def generate_text_from_image(file: UploadFile):
 
     except HTTPException:
         raise
+    except CircuitOpen:
+        logger.warning("Gemini circuit open, rejecting image analysis")
+        raise HTTPException(
+            status_code=503,
+            detail="Image analysis is temporarily unavailable, please retry shortly",
+        )
     except Exception as e:
         logger.error(f"Error in generate_text_from_image: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
     finally:
+        _in_flight -= 1
         # Clean up the temporary file
         if temp_file_path and os.path.exists(temp_file_path):
             try:
@@ -0,0 +1,69 @@
+"""
+Login storm: password verifies inline on the event loop vs on the hash pool.
+
+Runs a burst of concurrent verifies while a 10 ms ticker stands in for
+the worker's other requests, and reports logins per second and how late
+the ticks fired. Calibration runs first unless PASSWORD_HASH_ROUNDS is set.
+
+    python hashing_benchmark.py [logins]
+"""
+import argparse
+import asyncio
+import time
+from password_hashing import (
+    _hash,
+    _verify,
+    calibrate_password_hashing,
+    hash_pool,
+    hashing_stats,
+    verify_password,
+)
+
+
+async def storm(logins: int, inline: bool) -> dict:
+    hashed = _hash("benchmark-password")
+    lags = []
+    done = asyncio.Event()
+
+    async def unrelated_requests():
+        # Stand-in for other endpoints: how late does a 10 ms tick fire?
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - started - 0.01)
+
+    async def login():
+        if inline:
+            _verify("benchmark-password", hashed)
+            await asyncio.sleep(0)
+        else:
+            await verify_password("benchmark-password", hashed)
+
+    probe = asyncio.create_task(unrelated_requests())
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe
+    lags.sort()
+    return {
+        "logins_per_s": round(logins / elapsed, 1),
+        "unrelated_ticks": len(lags),
+        "unrelated_p99_lag_ms": round(lags[int(0.99 * (len(lags) - 1))] * 1000, 1),
+        "unrelated_max_lag_ms": round(lags[-1] * 1000, 1),
+    }
+
+
+async def main(logins: int):
+    await calibrate_password_hashing()
+    print("calibration:", hashing_stats()["calibration"])
+    print("inline:", await storm(logins, inline=True))
+    print(f"{hash_pool.kind} pool x{hash_pool.workers}:", await storm(logins, inline=False))
+    print(hashing_stats())
+    hash_pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent logins inline vs on the hash pool")
+    parser.add_argument("logins", nargs="?", type=int, default=16, help="concurrent verifies per run")
+    asyncio.run(main(parser.parse_args().logins))
@@ -0,0 +1,128 @@
+"""
+Liveness and readiness probes.
+
+``/health/live`` only shows that the process answers requests. A failing
+liveness probe gets the container restarted, so it does not depend on
+Mongo or Gemini.
+
+``/health/ready`` decides whether this worker should receive traffic. It
+returns 503 when any of the following holds, so the load balancer routes
+around an overloaded or disconnected replica until it recovers:
+- Mongo does not answer a ping within READY_MAX_MONGO_PING_MS;
+- the index checks have not run yet (a worker that booted while Mongo
+  was down retries them in the background, see main.prepare_database);
+- the connection pool is saturated past READY_MAX_POOL_SATURATION;
+- the event loop is lagging past READY_MAX_LOOP_LAG_MS;
+- more than READY_MAX_ANALYSES_IN_FLIGHT image analyses run here.
+
+The Gemini circuit and the global analysis backlog (uploads still
+processing) are reported but do not fail readiness. Every replica shares
+them, so taking this one out of rotation would not help.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from config import (
+    REPOSITORY_BACKEND,
+    READY_MAX_MONGO_PING_MS,
+    READY_MAX_POOL_SATURATION,
+    READY_MAX_LOOP_LAG_MS,
+    READY_MAX_ANALYSES_IN_FLIGHT,
+)
+from database import get_client
+from mongo_monitoring import pool_listener
+from gemini_service import gemini_breaker, analyses_in_flight
+from repositories import get_images_repository
+
+logger = logging.getLogger(__name__)
+
+CHECK_TIMEOUT_SECONDS = 2.0
+# Global backlog counts stop here; beyond it the exact number does not matter
+BACKLOG_COUNT_LIMIT = 10_000
+
+# Set once ensure_indexes has succeeded; until then a fresh database may
+# lack the TTL, unique and text indexes
+indexes_ready = False
+
+
+class LoopLagMonitor:
+    """How late a periodic wake-up fires: time the event loop spent blocked"""
+
+    def __init__(self, interval: float = 0.25, window: int = 40):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval) * 1000)
+
+    def stats(self) -> dict:
+        """Lag over the last window (10 s by default), in ms"""
+        if not self.samples:
+            return {"recent_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(self.samples)
+        return {
+            # 90th percentile: one GC pause should not flip readiness
+            "recent_ms": round(ordered[int(0.9 * (len(ordered) - 1))], 1),
+            "max_ms": round(ordered[-1], 1),
+        }
+
+
+loop_lag = LoopLagMonitor()
+
+
+async def _mongo_ping() -> dict:
+    client = get_client()
+    if client is None:
+        return {"ok": False, "error": "not connected"}
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), CHECK_TIMEOUT_SECONDS)
+    except Exception as e:
+        return {"ok": False, "error": str(e) or type(e).__name__}
+    ping_ms = (time.perf_counter() - started) * 1000
+    return {"ok": ping_ms <= READY_MAX_MONGO_PING_MS, "ping_ms": round(ping_ms, 1)}
+
+
+async def _analysis_backlog() -> int:
+    try:
+        return await asyncio.wait_for(
+            get_images_repository().count_processing(BACKLOG_COUNT_LIMIT), CHECK_TIMEOUT_SECONDS
+        )
+    except Exception as e:
+        logger.warning(f"Could not count the analysis backlog: {e}")
+        return -1
+
+
+async def readiness() -> tuple:
+    """(ready, report) for /health/ready"""
+    checks = {}
+    if REPOSITORY_BACKEND == "memory":
+        checks["mongo"] = {"ok": True, "backend": "memory"}
+    else:
+        checks["mongo"] = await _mongo_ping()
+        saturation = pool_listener.saturation()
+        checks["pool"] = {"ok": saturation <= READY_MAX_POOL_SATURATION, "saturation": round(saturation, 3)}
+        checks["indexes"] = {"ok": indexes_ready}
+
+    lag = loop_lag.stats()
+    checks["event_loop"] = {"ok": lag["recent_ms"] <= READY_MAX_LOOP_LAG_MS, **lag}
+
+    in_flight = analyses_in_flight()
+    checks["analyses"] = {
+        "ok": in_flight <= READY_MAX_ANALYSES_IN_FLIGHT,
+        "in_flight": in_flight,
+        # Skipped when Mongo is down rather than waiting out a second timeout
+        "backlog": await _analysis_backlog() if checks["mongo"]["ok"] else None,
+    }
+    # Informational only: shared by all replicas
+    checks["gemini"] = {"ok": True, **gemini_breaker.stats()}
+
+    ready = all(check["ok"] for check in checks.values())
+    if not ready:
+        failing = [name for name, check in checks.items() if not check["ok"]]
+        logger.warning(f"Not ready: {failing}")
+    return ready, {"status": "ready" if ready else "not_ready", "checks": checks}
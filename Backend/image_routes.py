@@ -1,9 +1,11 @@
-from fastapi import APIRouter, File, UploadFile, Query
-from typing import List
+from fastapi import APIRouter, Depends, File, UploadFile, Query
+from typing import List, Optional
+from auth_dependencies import get_optional_user_id
 import logging
 from models import ImageUploadResponse, ImageAnalysisStatus
 from image_service import ImageUploadService
-from database import get_image_collection
+from repositories import get_images_repository
+from responses import ORJSONResponse
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -13,17 +15,22 @@ image_service = ImageUploadService()
 
 
 @router.post("/upload", response_model=ImageUploadResponse)
-async def upload_image(file: UploadFile = File(...)):
+async def upload_image(
+    file: UploadFile = File(...),
+    user_id: Optional[str] = Depends(get_optional_user_id),
+):
     """
     Upload an image file for analysis.
 
     - **file**: Image file to upload (PNG, JPEG, GIF, BMP, WebP)
     - **Returns**: Success status and unique image ID
 
+    With a bearer token the upload and its analysis belong to the caller.
+
     The image will be processed asynchronously. Use the imageId to check analysis status.
     """
     logger.info(f"API POST /upload called with file: {file.filename}")
-    result = await image_service.upload_image(file)
+    result = await image_service.upload_image(file, user_id)
     logger.info(f"API POST /upload response - imageId: {result.imageId}")
     return result
 
@@ -62,7 +69,7 @@ async def list_images(
     logger.info(f"API GET /images called (limit: {limit}, skip: {skip})")
     result = await image_service.list_images(limit, skip)
     logger.info(f"API GET /images response - returned {len(result)} images")
-    return result
+    return ORJSONResponse(result)
     # logger.info(
     #     f"API GET /images called by user: {current_user.email} (limit: {limit}, skip: {skip})"
     # )
@@ -76,20 +83,8 @@ async def list_images(
 @router.get("/images/all")
 async def get_all_images():
     """
-    Returns all image upload documents with all fields, converting ObjectId and datetime for frontend.
+    Returns all image upload documents with all fields, analysis results
+    included. ORJSONResponse writes ObjectIds and datetimes for the frontend.
     """
-    collection = get_image_collection()
-    docs = await collection.find({}).to_list(length=1000)
-    for doc in docs:
-        # Convert ObjectId to string
-        if "_id" in doc:
-            doc["_id"] = str(doc["_id"])
-        # Convert datetime fields to ISO string
-        for dt_field in ["uploaded_at", "completed_at"]:
-            if dt_field in doc and doc[dt_field]:
-                doc[dt_field] = (
-                    doc[dt_field].isoformat()
-                    if hasattr(doc[dt_field], "isoformat")
-                    else str(doc[dt_field])
-                )
-    return {"images": docs}
+    docs = await get_images_repository().list_all(1000)
+    return ORJSONResponse({"images": docs})
@@ -6,12 +6,12 @@ from typing import Optional
 import asyncio
 import logging
 from models import ImageUploadResponse, ImageAnalysisStatus, ImageUploadInDB
-from database import get_image_collection
+from repositories import get_images_repository
+import counters
 from gemini_service import generate_text_from_image
 import mimetypes
+import tracing
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ImageUploadService:
@@ -44,7 +44,7 @@ class ImageUploadService:
         
         logger.info(f"File validation successful: {file.filename} (extension: {file_extension}, mime: {mime_type})")
 
-    async def upload_image(self, file: UploadFile) -> ImageUploadResponse:
+    async def upload_image(self, file: UploadFile, user_id: Optional[str] = None) -> ImageUploadResponse:
         """Upload image and start async processing"""
         logger.info(f"Starting image upload for file: {file.filename}")
         
@@ -78,14 +78,15 @@ class ImageUploadService:
                     detail=f"File too large. Maximum size: {self.max_file_size // (1024*1024)}MB"
                 )
             
-            with open(file_path, "wb") as f:
-                f.write(contents)
+            with tracing.span("image.save", bytes=file_size):
+                with open(file_path, "wb") as f:
+                    f.write(contents)
             logger.info(f"File successfully saved to disk: {file_path}")
             
             # Create database record
             upload_record = ImageUploadInDB(
                 _id=image_id,
-                user_id="anonymous",  # No user authentication
+                user_id=user_id or "anonymous",
                 original_filename=file.filename,
                 file_path=file_path,
                 uploaded_at=datetime.utcnow(),
@@ -93,12 +94,13 @@ class ImageUploadService:
             )
             
             # Save to database
-            collection = get_image_collection()
-            await collection.insert_one(upload_record.model_dump(by_alias=True))
+            await get_images_repository().insert(upload_record.model_dump(by_alias=True))
+            await counters.increment(counters.IMAGES, upload_record.user_id)
             logger.info(f"Database record created for image ID: {image_id}")
             
             # Start async processing (fire and forget)
-            asyncio.create_task(self._process_image_async(image_id, file_path))
+            # The job carries the request's trace context, so its spans join this trace
+            asyncio.create_task(self._process_image_async(image_id, file_path, user_id, tracing.traceparent()))
             logger.info(f"Started async processing task for image ID: {image_id}")
             
             response = ImageUploadResponse(
@@ -120,10 +122,16 @@ class ImageUploadService:
             else:
                 raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
-    async def _process_image_async(self, image_id: str, file_path: str):
+    async def _process_image_async(
+        self, image_id: str, file_path: str, user_id: Optional[str] = None, traceparent: Optional[str] = None
+    ):
         """Process image asynchronously using Gemini API"""
+        with tracing.span("image.process", parent=traceparent, image_id=image_id) as span:
+            await self._process_image(image_id, file_path, user_id, span)
+
+    async def _process_image(self, image_id: str, file_path: str, user_id: Optional[str], span):
         logger.info(f"Starting async processing for image ID: {image_id}")
-        collection = get_image_collection()
+        images = get_images_repository()
         
         try:
             # Create a mock UploadFile object for the gemini service
@@ -131,6 +139,8 @@ class ImageUploadService:
                 def __init__(self, file_path: str):
                     self.filename = os.path.basename(file_path)
                     self._file_path = file_path
+                    # generate_text_from_image only accepts image/* uploads
+                    self.content_type = mimetypes.guess_type(file_path)[0]
                 
                 async def read(self):
                     with open(self._file_path, 'rb') as f:
@@ -139,20 +149,18 @@ class ImageUploadService:
             mock_file = MockUploadFile(file_path)
             logger.info(f"Created mock file object for Gemini API processing: {image_id}")
             
-            # Process with Gemini API (no user required)
+            # Process with Gemini API, under the uploader when signed in
             logger.info(f"Sending image {image_id} to Gemini API for analysis")
-            result = await generate_text_from_image(mock_file)
+            result = await generate_text_from_image(mock_file, user_id)
             logger.info(f"Gemini API analysis completed for image {image_id}")
             
             # Update database with results
-            await collection.update_one(
-                {"_id": image_id},
+            await images.update(
+                image_id,
                 {
-                    "$set": {
-                        "status": "completed",
-                        "analysis_result": result,
-                        "completed_at": datetime.utcnow()
-                    }
+                    "status": "completed",
+                    "analysis_result": result,
+                    "completed_at": datetime.utcnow()
                 }
             )
             logger.info(f"Database updated with successful analysis results for image {image_id}")
@@ -161,27 +169,23 @@ class ImageUploadService:
             # Update database with error
             error_message = str(e)
             logger.error(f"Error processing image {image_id}: {error_message}")
+            span.fail(e)
             
-            await collection.update_one(
-                {"_id": image_id},
+            await images.update(
+                image_id,
                 {
-                    "$set": {
-                        "status": "failed",
-                        "error_message": error_message,
-                        "completed_at": datetime.utcnow()
-                    }
+                    "status": "failed",
+                    "error_message": error_message,
+                    "completed_at": datetime.utcnow()
                 }
             )
             logger.info(f"Database updated with error status for image {image_id}")
-            print(f"Error processing image {image_id}: {error_message}")
 
     async def get_analysis_result(self, image_id: str) -> ImageAnalysisStatus:
         """Get analysis result for an uploaded image"""
         logger.info(f"Fetching analysis result for image ID: {image_id}")
-        collection = get_image_collection()
-        
         # Find the image record
-        record = await collection.find_one({"_id": image_id})
+        record = await get_images_repository().get(image_id)
         
         if not record:
             logger.warning(f"Image not found - image ID: {image_id}")
@@ -205,12 +209,10 @@ class ImageUploadService:
     async def list_images(self, limit: int = 20, skip: int = 0):
         """List uploaded images"""
         logger.info(f"Listing images, limit: {limit}, skip: {skip}")
-        collection = get_image_collection()
-        
-        cursor = collection.find({}).sort("uploaded_at", -1).skip(skip).limit(limit)
+        records = await get_images_repository().list(skip, limit)
         
         images = []
-        async for record in cursor:
+        for record in records:
             images.append({
                 "imageId": record["_id"],
                 "originalFilename": record["original_filename"],
@@ -0,0 +1,185 @@
+"""
+Declarative index specification for every collection.
+
+``INDEXES`` lists the indexes each collection should have, and
+``ensure_indexes`` makes the database match it. Missing indexes are
+created, matching ones are left alone, and indexes in ``OBSOLETE_INDEXES``
+are dropped. Indexes found in neither list are reported, not dropped. The
+app runs this at startup, and ``python indexes.py`` applies it to the
+configured database by hand. query_plans.py checks that the app's queries
+use these indexes.
+"""
+import asyncio
+import logging
+import sys
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from search_service import (
+    LAB_REPORT_SEARCH_FIELDS,
+    ANALYSIS_SEARCH_FIELDS,
+    text_index,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _text_index_model(fields: dict) -> IndexModel:
+    keys, options = text_index(fields)
+    return IndexModel(keys, **options)
+
+
+# Collection name (as in database.py) -> indexes it should have
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("user_email", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING)]),
+    ],
+    # Legacy collection, no longer queried
+    "user": [],
+    "user_readings": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "user_drugs": [
+        # One drug document per user, so concurrent upserts cannot split a user's lists
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "image_uploads": [
+        # Newest-first listing; _id lookups use the built-in _id index
+        IndexModel([("uploaded_at", DESCENDING)]),
+        # Analysis backlog (pending / processing uploads)
+        IndexModel([("status", ASCENDING), ("uploaded_at", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING)]),
+        # Lookups by image id, for analyses stored with an ObjectId _id
+        IndexModel([("image_id", ASCENDING)]),
+    ],
+    "report_analysis_responses": [
+        IndexModel([("user_id", ASCENDING)]),
+        _text_index_model(ANALYSIS_SEARCH_FIELDS),
+    ],
+    "lab_reports": [
+        IndexModel([("user_id", ASCENDING)]),
+        # Typed vital-sign fields parsed at ingest, for per-user range queries
+        IndexModel([("user_id", ASCENDING), ("normalizedVitals.bloodPressure.systolic", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("normalizedVitals.heartRate.value", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("normalizedVitals.glucose.value", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("normalizedVitals.weight.value", ASCENDING)]),
+        _text_index_model(LAB_REPORT_SEARCH_FIELDS),
+    ],
+    "counters": [
+        # Reconciliation's cleanup of stale per-user counters
+        IndexModel([("name", ASCENDING), ("reconciled_at", ASCENDING)]),
+    ],
+    "dose_reminders": [
+        # Global "due" scans and per-user "next doses"
+        IndexModel([("due_at", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("due_at", ASCENDING)]),
+    ],
+    "sessions": [
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "revoked_tokens": [
+        IndexModel([("revoked_at", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "migrations": [],
+    "rate_limits": [
+        # Shared login rate limit windows drop out after two window lengths
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+# Indexes created by earlier versions that must go. The unique indexes on
+# email / username named fields that documents never had, so every user
+# indexed as null and only the first signup could succeed.
+OBSOLETE_INDEXES: Dict[str, List[str]] = {
+    "users": ["email_1", "username_1"],
+}
+
+# Index options compared when deciding whether an existing index matches
+_COMPARED_OPTIONS = ("unique", "expireAfterSeconds", "sparse", "weights")
+
+
+def _spec(model: IndexModel) -> dict:
+    return model.document
+
+
+def _matches(existing: dict, wanted: dict) -> bool:
+    if "weights" in wanted:
+        # Text indexes are stored as _fts/_ftsx keys; compare by name and weights
+        return existing.get("name") == wanted["name"] and existing.get("weights") == wanted.get("weights")
+    if list(existing["key"].items()) != list(wanted["key"].items()):
+        return False
+    return all(existing.get(o) == wanted.get(o) for o in _COMPARED_OPTIONS if o != "weights")
+
+
+async def ensure_collection_indexes(db, name: str) -> dict:
+    """Bring one collection's indexes in line with INDEXES"""
+    collection = db[name]
+    report = {"created": [], "dropped": [], "conflicts": [], "unmanaged": []}
+    existing = {}
+    async for index in collection.list_indexes():
+        existing[index["name"]] = dict(index)
+
+    for obsolete in OBSOLETE_INDEXES.get(name, []):
+        if obsolete in existing:
+            await collection.drop_index(obsolete)
+            existing.pop(obsolete)
+            report["dropped"].append(obsolete)
+
+    missing = []
+    for model in INDEXES.get(name, []):
+        wanted = _spec(model)
+        current = existing.get(wanted["name"])
+        if current is None:
+            missing.append(model)
+        elif not _matches(current, wanted):
+            # Same name, different options: never drop silently, report it
+            report["conflicts"].append(wanted["name"])
+    if missing:
+        report["created"] = await collection.create_indexes(missing)
+
+    managed = {_spec(m)["name"] for m in INDEXES.get(name, [])} | {"_id_"}
+    report["unmanaged"] = [n for n in existing if n not in managed]
+    return report
+
+
+async def ensure_indexes(db) -> Dict[str, dict]:
+    """Apply INDEXES to every collection; failures are logged per collection"""
+    names = list(INDEXES)
+    results = await asyncio.gather(
+        *(ensure_collection_indexes(db, name) for name in names), return_exceptions=True
+    )
+    reports = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.error(f"Index setup failed for {name}: {result}")
+            reports[name] = {"error": str(result)}
+            continue
+        reports[name] = result
+        if result["created"] or result["dropped"]:
+            logger.info(f"Indexes on {name}: created {result['created']}, dropped {result['dropped']}")
+        if result["conflicts"]:
+            logger.warning(f"Indexes on {name} differ from spec: {result['conflicts']}")
+        if result["unmanaged"]:
+            logger.info(f"Unmanaged indexes on {name}: {result['unmanaged']}")
+    return reports
+
+
+async def _main() -> int:
+    from database import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    reports = await ensure_indexes(get_database())
+    await close_mongo_connection()
+    for name, report in reports.items():
+        print(name, report)
+    return 1 if any("error" in r or r.get("conflicts") for r in reports.values()) else 0
+
+
+if __name__ == "__main__":
+    from logging_config import configure_logging
+
+    configure_logging()
+    sys.exit(asyncio.run(_main()))
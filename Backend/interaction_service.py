@@ -0,0 +1,90 @@
+"""
+Drug-drug interaction checks over a user's active drugs.
+
+The interaction dataset (data/drug_interactions.json) is loaded once into a
+dict keyed by the sorted pair of canonical drug ids, so checking a list of n
+drugs is n(n-1)/2 hash lookups with no I/O. A combination product counts as
+its ingredients. Results are cached by the set of ingredient ids, which is
+stable for a user until their active drugs change.
+"""
+import json
+import logging
+from functools import lru_cache
+from itertools import combinations
+from typing import Iterable, List, Optional
+from config import DRUG_INTERACTIONS_PATH
+from drug_normalizer import normalize_drug_name
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_ORDER = {"contraindicated": 0, "major": 1, "moderate": 2, "minor": 3}
+
+
+def _pair(a: str, b: str) -> tuple:
+    return (a, b) if a <= b else (b, a)
+
+
+class InteractionIndex:
+    """Precomputed pair index: (id_a, id_b) sorted -> interaction"""
+
+    def __init__(self, interactions: list):
+        self._pairs = {}
+        for interaction in interactions:
+            a, b = interaction["drugs"]
+            self._pairs[_pair(a, b)] = {
+                "severity": interaction["severity"],
+                "description": interaction["description"],
+            }
+
+    @classmethod
+    def from_file(cls, path: str) -> "InteractionIndex":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        logger.info(f"Loaded {len(data['interactions'])} drug interactions from {path}")
+        return cls(data["interactions"])
+
+    def lookup(self, a: str, b: str) -> Optional[dict]:
+        return self._pairs.get(_pair(a, b))
+
+    def check(self, canonical_ids: Iterable[str]) -> List[dict]:
+        """All interactions between the given drugs, most severe first"""
+        found = []
+        for a, b in combinations(sorted(set(canonical_ids)), 2):
+            interaction = self._pairs.get((a, b))
+            if interaction:
+                found.append({"drugs": [a, b], **interaction})
+        found.sort(key=lambda i: SEVERITY_ORDER.get(i["severity"], len(SEVERITY_ORDER)))
+        return found
+
+
+_index: Optional[InteractionIndex] = None
+
+
+def get_interaction_index() -> InteractionIndex:
+    """Load the interaction dataset on first use"""
+    global _index
+    if _index is None:
+        _index = InteractionIndex.from_file(DRUG_INTERACTIONS_PATH)
+    return _index
+
+
+@lru_cache(maxsize=10_000)
+def _check_set(canonical_ids: frozenset) -> tuple:
+    return tuple(get_interaction_index().check(canonical_ids))
+
+
+def ingredient_ids(drug: dict) -> List[str]:
+    """Canonical ids of a stored drug entry's ingredients (normalized on the fly for legacy entries)"""
+    return drug.get("ingredients") or normalize_drug_name(drug.get("drug_name") or "")["ingredients"]
+
+
+def check_drugs(drugs: List[dict]) -> List[dict]:
+    """Interactions among a list of drug entries (cached by their ingredient id set)"""
+    ids = frozenset(i for drug in drugs for i in ingredient_ids(drug))
+    return list(_check_set(ids))
+
+
+def interactions_involving(interactions: List[dict], drugs: List[dict]) -> List[dict]:
+    """Filter interactions to those that involve at least one of the given drugs"""
+    ids = {i for drug in drugs for i in ingredient_ids(drug)}
+    return [i for i in interactions if ids.intersection(i["drugs"])]
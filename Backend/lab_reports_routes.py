@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from bson import ObjectId
-from database import (
-    get_lab_reports_collection,
-)  # Assumes db is exposed from database.py
+from repositories import get_lab_reports_repository
+import counters
+from vitals import normalize_vital_signs, record_vital_readings
+from responses import ORJSONResponse, output_fields
 import logging
 
 
@@ -38,8 +39,28 @@ class LabReport(BaseModel):
     additionalInfo: AdditionalInfo
 
 
+class BloodPressureValue(BaseModel):
+    systolic: int
+    diastolic: int
+    unit: str = "mmHg"
+
+
+class VitalValue(BaseModel):
+    value: float
+    unit: str
+
+
+class NormalizedVitals(BaseModel):
+    bloodPressure: Optional[BloodPressureValue] = None
+    heartRate: Optional[VitalValue] = None
+    glucose: Optional[VitalValue] = None
+    weight: Optional[VitalValue] = None
+
+
 class LabReportOut(LabReport):
     id: str = Field(default_factory=str, alias="_id")
+    user_id: Optional[str] = None
+    normalizedVitals: Optional[NormalizedVitals] = None
 
 
 router = APIRouter(prefix="/lab-reports", tags=["Lab Reports"])
@@ -52,21 +73,42 @@ router = APIRouter(prefix="/lab-reports", tags=["Lab Reports"])
 #     return db.lab_reports
 
 
-def serialize_lab_report(report):
-    # Defensive: handle missing _id
-    if "_id" in report:
-        report["_id"] = str(report["_id"])
-    return report
+LAB_REPORT_FIELDS = output_fields(LabReportOut)
+
+
+def lab_report_out(report: dict) -> dict:
+    """
+    A stored report in the LabReportOut shape without re-validating it
+    (the request body was validated on the way in); ObjectIds are left to
+    ORJSONResponse
+    """
+    return {field: report.get(field) for field in LAB_REPORT_FIELDS}
+
+
+def build_lab_report_doc(report: LabReport, user_id: Optional[str] = None) -> dict:
+    """Lab report document with typed vitals parsed from the submitted strings"""
+    doc = report.model_dump()
+    doc["normalizedVitals"] = normalize_vital_signs(doc["vitalSigns"])
+    doc["user_id"] = user_id
+    return doc
 
 
 @router.post("/", response_model=LabReportOut)
-async def create_lab_report(report: LabReport):
+async def create_lab_report(
+    report: LabReport,
+    user_id: Optional[str] = Query(None, description="User ID"),
+):
     try:
-        logging.info(f"Creating lab report: {report}")
-        collection = get_lab_reports_collection()
-        result = await collection.insert_one(report.dict())
-        created = await collection.find_one({"_id": result.inserted_id})
-        return serialize_lab_report(created)
+        logging.info(f"Creating lab report for user: {user_id}")
+        doc = build_lab_report_doc(report, user_id)
+        # insert adds the generated _id to doc, so respond from it directly
+        await get_lab_reports_repository().insert(doc)
+        await counters.increment(counters.LAB_REPORTS, user_id)
+        if user_id:
+            await record_vital_readings(
+                user_id, doc["normalizedVitals"], str(doc["_id"])
+            )
+        return ORJSONResponse(lab_report_out(doc))
     except Exception as e:
         logging.error(f"Error creating lab report: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -75,9 +117,8 @@ async def create_lab_report(report: LabReport):
 @router.get("/", response_model=List[LabReportOut])
 async def get_lab_reports():
     try:
-        collection = get_lab_reports_collection()
-        reports = await collection.find().to_list(1000)
-        return [serialize_lab_report(r) for r in reports]
+        reports = await get_lab_reports_repository().list(1000)
+        return ORJSONResponse([lab_report_out(r) for r in reports])
     except Exception as e:
         logging.error(f"Error fetching lab reports: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -86,8 +127,7 @@ async def get_lab_reports():
 @router.get("/count")
 async def get_lab_report_count():
     try:
-        collection = get_lab_reports_collection()
-        count = await collection.count_documents({})
+        count = await counters.get_count(counters.LAB_REPORTS)
         return {"count": count}
     except Exception as e:
         logging.error(f"Error counting lab reports: {e}")
@@ -97,13 +137,12 @@ async def get_lab_report_count():
 @router.get("/health", response_model=str)
 async def get_lab_report_health():
     try:
-        collection = get_lab_reports_collection()
-        if collection is None:
+        repository = get_lab_reports_repository()
+        if repository is None:
             raise HTTPException(
-                status_code=500, detail="Lab reports collection not found"
+                status_code=500, detail="Lab reports repository not found"
             )
 
-        print("Fetching lab reports for health check")
         return "Lab reports service is healthy"
 
     except HTTPException:
@@ -117,11 +156,12 @@ async def get_lab_report_health():
 @router.get("/{report_id}", response_model=LabReportOut)
 async def get_lab_report(report_id: str):
     try:
-        collection = get_lab_reports_collection()
-        report = await collection.find_one({"_id": ObjectId(report_id)})
+        report = await get_lab_reports_repository().get(ObjectId(report_id))
         if not report:
             raise HTTPException(status_code=404, detail="Lab report not found")
-        return serialize_lab_report(report)
+        return ORJSONResponse(lab_report_out(report))
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error fetching lab report: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -130,14 +170,18 @@ async def get_lab_report(report_id: str):
 @router.put("/{report_id}", response_model=LabReportOut)
 async def update_lab_report(report_id: str, report: LabReport):
     try:
-        collection = get_lab_reports_collection()
-        result = await collection.update_one(
-            {"_id": ObjectId(report_id)}, {"$set": report.dict()}
+        updated = await get_lab_reports_repository().update(
+            ObjectId(report_id),
+            {
+                **report.model_dump(),
+                "normalizedVitals": normalize_vital_signs(report.vitalSigns.model_dump()),
+            },
         )
-        if result.matched_count == 0:
+        if updated is None:
             raise HTTPException(status_code=404, detail="Lab report not found")
-        updated = await collection.find_one({"_id": ObjectId(report_id)})
-        return serialize_lab_report(updated)
+        return ORJSONResponse(lab_report_out(updated))
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error updating lab report: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -146,11 +190,13 @@ async def update_lab_report(report_id: str, report: LabReport):
 @router.delete("/{report_id}")
 async def delete_lab_report(report_id: str):
     try:
-        collection = get_lab_reports_collection()
-        result = await collection.delete_one({"_id": ObjectId(report_id)})
-        if result.deleted_count == 0:
+        deleted = await get_lab_reports_repository().delete(ObjectId(report_id))
+        if deleted is None:
             raise HTTPException(status_code=404, detail="Lab report not found")
+        await counters.increment(counters.LAB_REPORTS, deleted.get("user_id"), -1)
         return {"message": "Lab report deleted"}
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error deleting lab report: {e}")
         raise HTTPException(status_code=500, detail=str(e))
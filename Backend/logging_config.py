@@ -0,0 +1,235 @@
+"""
+The one logging setup for the app and its scripts; modules just call
+``logging.getLogger(__name__)``.
+
+``configure_logging()`` puts a QueueHandler on the root logger. Records
+are queued by the calling thread (usually the event loop), and a
+QueueListener thread formats them and writes to stderr, so a slow
+terminal or log shipper never blocks a request.
+
+On the caller side, before a record is queued:
+- ``request_id`` is attached from the context variable set by
+  RequestIdMiddleware (background tasks inherit it), and ``trace_id``
+  from the current tracing span;
+- records below WARNING are sampled per logger (LOG_SAMPLE_RATES);
+- dict arguments and ``extra`` fields have PHI keys (analysis results,
+  prescriptions, vitals, tokens, ...) replaced with "[redacted]".
+
+On the listener side, the formatted message is scrubbed of e-mail
+addresses, phone numbers and JWTs as a last line of defence. Output is
+one JSON object per line (LOG_FORMAT=json) or plain text (LOG_FORMAT=text).
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from config import LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATES
+import tracing
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+REDACTED = "[redacted]"
+# Payload keys that carry patient data or credentials
+PHI_KEYS = {
+    "analysis_result", "data", "raw_text", "patient", "prescriptions", "lab_results",
+    "diagnosis", "complaints", "examination", "allergies", "past_medical_history",
+    "vitalSigns", "additionalInfo", "healthcareInfo", "normalizedVitals", "contact",
+    "password", "access_token", "refresh_token", "token",
+}
+_SCRUBBERS = (
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "[email]"),
+    # Bangladeshi mobile numbers, with or without the country code
+    (re.compile(r"(?<!\d)(?:\+?88)?01[3-9]\d{8}(?!\d)"), "[phone]"),
+    (re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]+"), "[token]"),
+)
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "trace_id"}
+
+_listener = None
+
+
+def redact(value):
+    """Copy of a payload with PHI keys replaced, at any depth"""
+    if isinstance(value, dict):
+        return {k: REDACTED if k in PHI_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(v) for v in value)
+    return value
+
+
+def scrub(text: str) -> str:
+    for pattern, replacement in _SCRUBBERS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """"httpx=0.1,image_routes=0.5" -> {"httpx": 0.1, "image_routes": 0.5}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class ContextFilter(logging.Filter):
+    """Sample, attach the request id and redact payloads, on the calling thread"""
+
+    def __init__(self, sample_rates: dict):
+        super().__init__()
+        self.sample_rates = sample_rates
+        self._rate_cache = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._rate_cache.get(name)
+        if rate is None:
+            # The closest configured ancestor ("uvicorn" covers "uvicorn.access")
+            rate, probe = 1.0, name
+            while probe:
+                if probe in self.sample_rates:
+                    rate = self.sample_rates[probe]
+                    break
+                probe = probe.rpartition(".")[0]
+            self._rate_cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            rate = self._rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        record.request_id = request_id_var.get()
+        span = tracing.current_span()
+        record.trace_id = span.trace_id if span is not None else None
+        if isinstance(record.args, (dict, tuple)) and record.args:
+            record.args = redact(record.args)
+        for key in set(vars(record)) - _RECORD_ATTRS:
+            value = getattr(record, key)
+            if isinstance(value, (dict, list, tuple)):
+                setattr(record, key, redact(value))
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Merge the arguments now: they may change before the listener runs.
+        # This is the root logger's only handler, so the record is not copied
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": scrub(record.getMessage()),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for key in set(vars(record)) - _RECORD_ATTRS:
+            entry[key] = getattr(record, key)
+        if record.exc_text:
+            entry["exc"] = scrub(record.exc_text)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        if getattr(record, "request_id", None):
+            text = f"[{record.request_id}] {text}"
+        return scrub(text)
+
+
+def configure_logging(stream=None, level: str = LOG_LEVEL, fmt: str = LOG_FORMAT,
+                      sample_rates: str = LOG_SAMPLE_RATES):
+    """(Re)configure the root logger; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter(parse_sample_rates(sample_rates)))
+
+    # Fields the formatters never output; skipping them makes records cheaper
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level.upper())
+    # Uvicorn installs its own handlers; send its records through ours instead
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+
+class RequestIdMiddleware:
+    """Tag each request's log records and response with an X-Request-ID"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                incoming = value.decode("latin-1")
+                # Only trust ids that cannot inject into log lines
+                if _REQUEST_ID.fullmatch(incoming):
+                    request_id = incoming
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode())]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
@@ -1,7 +1,33 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from database import connect_to_mongo, close_mongo_connection
+import asyncio
+from database import connect_to_mongo, close_mongo_connection, get_database
+from indexes import ensure_indexes
+from migrations import run_pending_migrations
+from mongo_monitoring import mongo_stats
+import health
+from health import loop_lag, readiness
+import metrics
+from responses import ORJSONResponse
+import profiling
+import tracing
+from counters import run_reconciliation_loop
+from reminder_scheduler import run_reminder_loop
+from password_hashing import hash_pool, calibrate_password_hashing
+from session_service import run_revocation_sync_loop
+from config import (
+    COUNTER_RECONCILE_INTERVAL_SECONDS,
+    REVOCATION_SYNC_INTERVAL_SECONDS,
+    REPOSITORY_BACKEND,
+    MIGRATIONS_ON_STARTUP,
+    GEMINI_WARM_UP,
+    METRICS_ENABLED,
+    ADMIN_TOKEN,
+    TRACING_ENABLED,
+)
+import gemini_service
 from gemini_routes import router as gemini_router
 from image_routes import router as image_router
 
@@ -12,31 +38,98 @@ from auth_routes import router as auth_router
 from lab_reports_routes import router as lab_reports_router
 # from report_analysis_routes import router as report_analysis_router
 from user_drugs import router as user_drugs_router
+from search_routes import router as search_router
+from admin_routes import router as admin_router, require_admin
 
-import sys
 import logging
-
-print("PYTHON EXECUTABLE:", sys.executable)
-try:
-    import google.generativeai
-
-    print("google.generativeai import SUCCESS")
-except Exception as e:
-    print("google.generativeai import FAIL:", e)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+from logging_config import configure_logging, RequestIdMiddleware
+
+configure_logging()
+
+
+async def warm_up_gemini():
+    """Load the Gemini SDK off the event loop once the app is serving"""
+    try:
+        await asyncio.to_thread(gemini_service.warm_up)
+        logging.info("Gemini SDK loaded")
+    except Exception as e:
+        logging.warning(f"Gemini SDK warm-up failed, will retry on first use: {e}")
+
+
+# Backoff cap between index check attempts while Mongo is unreachable
+PREPARE_RETRY_MAX_SECONDS = 60
+
+
+async def ensure_database_indexes() -> bool:
+    """Run the index checks; True (and readiness unblocked) if every collection succeeded"""
+    try:
+        # One ping rather than a timeout per collection while Mongo is down
+        await get_database().command("ping")
+        reports = await ensure_indexes(get_database())
+    except Exception as e:
+        logging.warning(f"Index checks failed: {e}")
+        return False
+    if any("error" in report for report in reports.values()):
+        return False
+    health.indexes_ready = True
+    return True
+
+
+async def prepare_database():
+    """
+    Index checks until they succeed, then migrations. A worker that booted
+    while Mongo was down gets its indexes and migrations once Mongo is
+    back; /health/ready stays 503 until the indexes are in place.
+    """
+    delay = 1
+    while not health.indexes_ready and not await ensure_database_indexes():
+        logging.warning(f"Retrying index checks in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, PREPARE_RETRY_MAX_SECONDS)
+    if MIGRATIONS_ON_STARTUP:
+        # Throttled background batches; reads upgrade outdated documents meanwhile
+        await run_pending_migrations(get_database())
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    await connect_to_mongo()
+    await calibrate_password_hashing()
+    warm_up_task = asyncio.create_task(warm_up_gemini()) if GEMINI_WARM_UP else None
+    loop_lag_task = asyncio.create_task(loop_lag.run())
+    if REPOSITORY_BACKEND == "memory":
+        # No Mongo: repositories keep data in process, Mongo-only jobs stay off
+        logging.warning("Using in-memory repositories; data is not persisted")
+        yield
+        if warm_up_task:
+            warm_up_task.cancel()
+        loop_lag_task.cancel()
+        hash_pool.shutdown()
+        return
+    # Serve even if Mongo is down; /health/ready stays 503 until it is back
+    if await connect_to_mongo():
+        # Indexes before the first request whenever Mongo is there for it
+        await ensure_database_indexes()
+    else:
+        logging.warning("MongoDB unreachable at startup; index checks and migrations wait for it")
+    database_task = asyncio.create_task(prepare_database())
+    reconcile_task = asyncio.create_task(
+        run_reconciliation_loop(COUNTER_RECONCILE_INTERVAL_SECONDS)
+    )
+    reminder_task = asyncio.create_task(run_reminder_loop())
+    revocation_task = asyncio.create_task(
+        run_revocation_sync_loop(REVOCATION_SYNC_INTERVAL_SECONDS)
+    )
     yield
     # Shutdown
+    database_task.cancel()
+    if warm_up_task:
+        warm_up_task.cancel()
+    loop_lag_task.cancel()
+    reconcile_task.cancel()
+    reminder_task.cancel()
+    revocation_task.cancel()
+    hash_pool.shutdown()
     await close_mongo_connection()
 
 
@@ -45,6 +138,7 @@ app = FastAPI(
     description="Backend API for medwise application with image processing",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware with proper credentials support
@@ -55,6 +149,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if ADMIN_TOKEN:
+    # Added before the request-id and metrics middleware, so it runs inside them
+    app.add_middleware(profiling.ProfileMiddleware, token=ADMIN_TOKEN)
+if TRACING_ENABLED:
+    app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(RequestIdMiddleware)
+if METRICS_ENABLED:
+    # Added last, so it wraps CORS and times the whole request
+    app.add_middleware(metrics.MetricsMiddleware)
 
 # Include routes
 app.include_router(auth_router)
@@ -64,6 +167,8 @@ app.include_router(readings_route)
 app.include_router(lab_reports_router)
 # app.include_router(report_analysis_router)
 app.include_router(user_drugs_router)
+app.include_router(search_router)
+app.include_router(admin_router)
 
 
 @app.get("/")
@@ -83,6 +188,33 @@ async def health_check():
     }
 
 
+@app.get("/health/live")
+async def liveness():
+    """The process is up and serving; no dependency checks"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Whether this worker should get traffic: 503 with the failing checks if not"""
+    ready, report = await readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/health/db", dependencies=[Depends(require_admin)])
+async def database_health():
+    """Mongo connection pool occupancy, checkout waits and command latency (admin token)"""
+    return mongo_stats()
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,233 @@
+"""
+In-memory repositories with the semantics of the Motor ones in
+repositories.py, selected with REPOSITORY_BACKEND=memory.
+
+Documents are deep-copied on the way in and out, as a round trip through
+BSON would, so callers cannot mutate stored state by accident. Datetimes
+are truncated to milliseconds like BSON dates. Each method finishes
+without awaiting anything, so within one event loop it is as atomic as
+the single Mongo update it stands in for.
+
+Everything is per process and lost on restart: use it for tests, local
+runs and benchmarks, never for real data.
+"""
+import copy
+from datetime import datetime
+from typing import Dict, List, Optional
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from repositories import READING_LISTS, DRUG_LISTS, PROCESSING_STATUSES, drug_matches, image_document
+from migrations import stamp
+
+
+def _bson(value):
+    """Deep copy of value as Mongo would store it (datetimes at ms precision)"""
+    if isinstance(value, dict):
+        return {k: _bson(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_bson(v) for v in value]
+    if isinstance(value, datetime):
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return copy.deepcopy(value)
+
+
+class UsersRepository:
+    def __init__(self):
+        self._by_id: Dict[str, dict] = {}
+        self._id_by_email: Dict[str, str] = {}
+
+    async def find_by_email(self, user_email: str) -> Optional[dict]:
+        user_id = self._id_by_email.get(user_email)
+        return None if user_id is None else _bson(self._by_id[user_id])
+
+    async def find_by_id(self, user_id: str) -> Optional[dict]:
+        user = self._by_id.get(user_id)
+        return None if user is None else _bson(user)
+
+    async def insert(self, user_doc: dict):
+        # Same unique indexes as indexes.py
+        if user_doc["user_email"] in self._id_by_email or user_doc["user_id"] in self._by_id:
+            raise DuplicateKeyError("duplicate user_email or user_id")
+        user_doc.setdefault("_id", ObjectId())
+        self._by_id[user_doc["user_id"]] = _bson(user_doc)
+        self._id_by_email[user_doc["user_email"]] = user_doc["user_id"]
+
+    async def replace_password_hash(self, user_id: str, old_hash: str, new_hash: str) -> bool:
+        user = self._by_id.get(user_id)
+        if user is None or user["password"] != old_hash:
+            return False
+        user["password"] = new_hash
+        return True
+
+
+class ReadingsRepository:
+    def __init__(self):
+        self._docs: Dict[str, dict] = {}
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        doc = self._docs.get(user_id)
+        return None if doc is None else _bson(doc)
+
+    async def push(self, user_id: str, readings: dict):
+        doc = self._docs.get(user_id)
+        if doc is None:
+            doc = stamp("user_readings", {"_id": ObjectId(), "user_id": user_id, **{field: [] for field in READING_LISTS}})
+            self._docs[user_id] = doc
+        for field, reading in readings.items():
+            doc.setdefault(field, []).append(_bson(reading))
+
+    async def pull_by_date(self, user_id: str, field: str, date) -> bool:
+        doc = self._docs.get(user_id)
+        if doc is None:
+            return False
+        kept = [r for r in doc.get(field, []) if r.get("date") != date]
+        removed = len(kept) != len(doc.get(field, []))
+        if removed:
+            doc[field] = kept
+        return removed
+
+
+class LabReportsRepository:
+    def __init__(self):
+        # Insertion ordered, like a natural-order find()
+        self._docs: Dict[ObjectId, dict] = {}
+
+    async def insert(self, doc: dict) -> dict:
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"duplicate _id {doc['_id']}")
+        self._docs[doc["_id"]] = _bson(stamp("lab_reports", doc))
+        return doc
+
+    async def list(self, limit: int = 1000) -> List[dict]:
+        return [_bson(doc) for doc in list(self._docs.values())[:limit]]
+
+    async def get(self, report_id: ObjectId) -> Optional[dict]:
+        doc = self._docs.get(report_id)
+        return None if doc is None else _bson(doc)
+
+    async def update(self, report_id: ObjectId, fields: dict) -> Optional[dict]:
+        doc = self._docs.get(report_id)
+        if doc is None:
+            return None
+        doc.update(_bson(fields))
+        return _bson(doc)
+
+    async def delete(self, report_id: ObjectId) -> Optional[dict]:
+        doc = self._docs.pop(report_id, None)
+        if doc is None:
+            return None
+        deleted = {"_id": report_id}
+        if "user_id" in doc:
+            deleted["user_id"] = doc["user_id"]
+        return deleted
+
+
+def _append_missing(entries: List[dict], drugs: List[dict]) -> List[dict]:
+    keys = {entry["drug_key"] for entry in entries if "drug_key" in entry}
+    return entries + [_bson(drug) for drug in drugs if drug["drug_key"] not in keys]
+
+
+class DrugsRepository:
+    def __init__(self):
+        self._docs: Dict[str, dict] = {}
+
+    async def add(self, user_id: str, drugs: List[dict], active: bool) -> Optional[dict]:
+        doc = self._docs.get(user_id)
+        before = None
+        if doc is None:
+            doc = stamp("user_drugs", {"_id": ObjectId(), "user_id": user_id})
+            self._docs[user_id] = doc
+        else:
+            # Pre-image projected to all_drugs.drug_key and active_drugs
+            before = {}
+            if "all_drugs" in doc:
+                before["all_drugs"] = [
+                    {"drug_key": entry["drug_key"]} if "drug_key" in entry else {}
+                    for entry in doc["all_drugs"]
+                ]
+            if "active_drugs" in doc:
+                before["active_drugs"] = _bson(doc["active_drugs"])
+        doc["all_drugs"] = _append_missing(doc.get("all_drugs", []), drugs)
+        if active:
+            doc["active_drugs"] = _append_missing(doc.get("active_drugs", []), drugs)
+        else:
+            doc.setdefault("active_drugs", [])
+        return before
+
+    async def remove(self, user_id: str, drug: dict) -> Optional[dict]:
+        doc = self._docs.get(user_id)
+        if doc is None or not any(drug_matches(e, drug) for e in doc.get("all_drugs", [])):
+            return None
+        before = {field: _bson(doc[field]) for field in DRUG_LISTS if field in doc}
+        for field in DRUG_LISTS:
+            if field in doc:
+                doc[field] = [e for e in doc[field] if not drug_matches(e, drug)]
+        return before
+
+    async def activate(self, user_id: str, drug: dict) -> Optional[List[dict]]:
+        doc = self._docs.get(user_id)
+        if doc is None:
+            return None
+        entry = next((e for e in doc.get("all_drugs", []) if drug_matches(e, drug)), None)
+        active = doc.get("active_drugs", [])
+        if entry is None or any(drug_matches(e, drug) for e in active):
+            return None
+        doc["active_drugs"] = active + [_bson(entry)]
+        return _bson(doc["active_drugs"])
+
+    async def deactivate(self, user_id: str, drug: dict) -> bool:
+        doc = self._docs.get(user_id)
+        if doc is None or not any(drug_matches(e, drug) for e in doc.get("active_drugs", [])):
+            return False
+        doc["active_drugs"] = [e for e in doc["active_drugs"] if not drug_matches(e, drug)]
+        return True
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        doc = self._docs.get(user_id)
+        if doc is None:
+            return None
+        return {field: _bson(doc[field]) for field in DRUG_LISTS if field in doc}
+
+    async def get_list(self, user_id: str, field: str) -> List[dict]:
+        return _bson(self._docs.get(user_id, {}).get(field, []))
+
+
+class ImagesRepository:
+    def __init__(self):
+        self._docs: Dict[str, dict] = {}
+
+    async def insert(self, doc: dict):
+        doc = image_document(doc)
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"duplicate _id {doc['_id']}")
+        self._docs[doc["_id"]] = _bson(doc)
+
+    async def update(self, image_id: str, fields: dict):
+        doc = self._docs.get(image_id)
+        if doc is not None:
+            doc.update(_bson(fields))
+
+    async def get(self, image_id: str) -> Optional[dict]:
+        doc = self._docs.get(image_id)
+        return None if doc is None else _bson(doc)
+
+    async def list(self, skip: int, limit: int) -> List[dict]:
+        newest_first = sorted(self._docs.values(), key=lambda d: d["uploaded_at"], reverse=True)
+        return [_bson(doc) for doc in newest_first[skip:skip + limit]]
+
+    async def list_all(self, limit: int = 1000) -> List[dict]:
+        newest_first = sorted(self._docs.values(), key=lambda d: d["uploaded_at"], reverse=True)
+        return [_bson(doc) for doc in newest_first[:limit]]
+
+    async def count_processing(self, limit: int) -> int:
+        return min(limit, sum(1 for doc in self._docs.values() if doc.get("status") in PROCESSING_STATUSES))
+
+
+class AnalysesRepository:
+    def __init__(self):
+        self._docs: List[dict] = []
+
+    async def insert(self, doc: dict):
+        doc.setdefault("_id", ObjectId())
+        self._docs.append(_bson(doc))
@@ -0,0 +1,228 @@
+"""
+Prometheus metrics, served in the text exposition format on /metrics.
+
+A small registry instead of prometheus_client: counters, gauges and
+histograms with fixed label names, plus callback gauges read at scrape
+time. Updates take an uncontended lock and a dict lookup; the cost is
+rendered only when /metrics is scraped. metrics_benchmark.py measures
+the per-request overhead of the middleware.
+
+Recorded here:
+- HTTP: ``MetricsMiddleware`` counts requests by method, route template
+  and status, and observes latency per route. It also tracks requests in
+  flight. Unmatched paths share one label so scanners cannot blow up
+  cardinality.
+- Mongo: ``command_metrics`` (a pymongo CommandListener registered in
+  database.py) observes latency and counts failures per command name.
+  Pool occupancy is read from mongo_monitoring at scrape time.
+
+Gemini call metrics are defined in gemini_service.py.
+"""
+import bisect
+import threading
+import time
+from pymongo import monitoring
+from mongo_monitoring import pool_listener
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; HTTP handlers and Mongo commands sit in the ms range
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value) -> str:
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        # Mongo listeners report from Motor's executor threads
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _series(self, key: tuple, extra: tuple = ()) -> str:
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def _samples(self):
+        """(suffix, label values, extra label pairs, value) per sample"""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            yield "", key, (), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{self._series(key, extra)} {_format(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class CallbackGauge(_Metric):
+    """Gauge whose values come from read() at scrape time: {label values: value}"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labels: tuple, read):
+        super().__init__(name, description, labels)
+        self.read = read
+
+    def _samples(self):
+        for key, value in sorted(self.read().items()):
+            yield "", key, (), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket counts (last one is +Inf) and the running sum
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+        for key, (counts, total) in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", key, (("le", _format(float(bound))),), cumulative
+            yield "_sum", key, (), total
+            yield "_count", key, (), cumulative
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text format"""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# HTTP
+
+UNMATCHED = "<unmatched>"
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status")
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route", ("method", "route")
+)
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests being handled", ("method",))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware task or body buffering)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        # Stays 500 if the app raises before starting a response
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec(method)
+            # FastAPI puts the matched APIRoute in the (shared) scope while routing
+            route = scope.get("route")
+            path = route.path if route is not None else UNMATCHED
+            http_requests.inc(method, path, str(status))
+            http_request_duration.observe(elapsed, method, path)
+
+
+# Mongo
+
+mongo_command_duration = Histogram(
+    "mongodb_command_duration_seconds", "Mongo command latency by command name", ("command",)
+)
+mongo_command_failures = Counter(
+    "mongodb_command_failures_total", "Failed Mongo commands by command name", ("command",)
+)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_command_duration.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        mongo_command_duration.observe(event.duration_micros / 1e6, event.command_name)
+        mongo_command_failures.inc(event.command_name)
+
+
+command_metrics = CommandMetrics()
+
+
+def _pool_values(field: str):
+    return lambda: {(server,): stats[field] for server, stats in pool_listener.stats().items()}
+
+
+CallbackGauge("mongodb_pool_connections_open", "Open pooled connections", ("server",), _pool_values("open"))
+CallbackGauge("mongodb_pool_connections_checked_out", "Connections in use", ("server",), _pool_values("checked_out"))
+CallbackGauge("mongodb_pool_waiters", "Callers waiting for a connection", ("server",), _pool_values("waiting"))
@@ -0,0 +1,42 @@
+"""
+Per-request cost of MetricsMiddleware around a trivial ASGI app, and the
+time to render /metrics.
+
+    python metrics_benchmark.py [requests]
+"""
+import argparse
+import asyncio
+import time
+from metrics import MetricsMiddleware, render
+
+
+async def bare(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def noop(message):
+    pass
+
+
+async def per_request_us(app, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        await app({"type": "http", "method": "GET", "path": "/"}, None, noop)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+async def main(n: int):
+    base = await per_request_us(bare, n)
+    wrapped = await per_request_us(MetricsMiddleware(bare), n)
+    print(f"bare ASGI app:           {base:.2f} us/request")
+    print(f"with MetricsMiddleware: {wrapped:.2f} us/request (+{wrapped - base:.2f} us)")
+    started = time.perf_counter()
+    body = render()
+    print(f"render: {(time.perf_counter() - started) * 1000:.2f} ms for {len(body)} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MetricsMiddleware overhead per request")
+    parser.add_argument("requests", nargs="?", type=int, default=200_000, help="requests per measurement")
+    asyncio.run(main(parser.parse_args().requests))
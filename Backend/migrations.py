@@ -0,0 +1,318 @@
+"""
+Versioned document schema migrations.
+
+Each document carries a ``schema_version``; a missing one means version 0.
+``MIGRATIONS`` lists, per collection, the upgrades from one version to the
+next. Each upgrade is a pure function from a document to the fields it
+rewrites, so the same code serves two paths:
+
+- Lazy upgrade on read: the Motor repositories pass what they read through
+  ``upgrade_document``, so routes always see the current shape, even for
+  documents the background runner has not reached yet.
+- Background runner: ``run_pending_migrations`` walks each collection in
+  ``_id`` order. It reads MIGRATION_BATCH_SIZE outdated documents at a
+  time and writes them back with one unordered ``bulk_write``, then sleeps
+  to stay within MIGRATION_DUTY_CYCLE. Progress is checkpointed in the
+  ``migrations`` collection after every batch, so a restart resumes where
+  it stopped. A lease keeps several workers from running the same
+  migration at once.
+
+Every write is guarded by the values the upgrade read. A document changed
+by the app in the meantime is skipped and picked up by a later sweep, so
+the runner never overwrites a concurrent write. Documents created by the
+app are stamped with the current version (``stamp``).
+
+    python migrations.py            # run pending migrations now
+    python migrations.py --status   # checkpoints and outdated document counts
+"""
+import asyncio
+import logging
+import os
+import socket
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from config import MIGRATION_BATCH_SIZE, MIGRATION_DUTY_CYCLE
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 60
+# Passes over a collection after the checkpointed scan reaches the end:
+# they pick up skipped documents and _id types the scan's range excluded
+MAX_SWEEPS = 5
+
+
+class Migration:
+    """Upgrade of one collection's documents from version - 1 to version"""
+
+    def __init__(self, collection: str, version: int, description: str,
+                 fields: List[str], upgrade: Callable[[dict], dict]):
+        self.collection = collection
+        self.version = version
+        self.description = description
+        # Fields upgrade reads and returns; writes are guarded on their values
+        self.fields = fields
+        self.upgrade = upgrade
+
+    @property
+    def name(self) -> str:
+        return f"{self.collection}:{self.version}"
+
+
+def _readings_lists(doc: dict) -> dict:
+    return {
+        field: doc.get(field) or []
+        for field in ("blood_pressure_readings", "glucose_readings")
+    }
+
+
+def _drug_keys(doc: dict) -> dict:
+    from drug_service import with_key
+
+    def keyed(entries):
+        return [
+            with_key(entry) if "drug_key" not in entry and "drug_name" in entry and "dosage" in entry else entry
+            for entry in entries
+        ]
+    return {field: keyed(doc[field]) for field in ("all_drugs", "active_drugs") if field in doc}
+
+
+def _drug_keys_rederived(doc: dict) -> dict:
+    # Matching rules changed: fuzzy and leading-word matches used to give
+    # distinct drugs one key, then exact-only matching split misspellings off
+    from drug_service import with_key
+
+    def rekeyed(entries):
+        return [
+            with_key(entry) if "drug_name" in entry and "dosage" in entry else entry
+            for entry in entries
+        ]
+    return {field: rekeyed(doc[field]) for field in ("all_drugs", "active_drugs") if field in doc}
+
+
+def _image_id(doc: dict) -> dict:
+    # Uploads stored their id as _id, analyses as image_id on an ObjectId _id
+    return {
+        "image_id": doc.get("image_id") or doc["_id"],
+        "analysis_result": doc.get("analysis_result"),
+        "error_message": doc.get("error_message"),
+        "completed_at": doc.get("completed_at"),
+    }
+
+
+def _lab_report_owner(doc: dict) -> dict:
+    # Reports created without a user are stored with an explicit null owner
+    return {"user_id": doc.get("user_id")}
+
+
+def _lab_report_vitals(doc: dict) -> dict:
+    from vitals import normalize_vital_signs
+    if doc.get("normalizedVitals") is not None:
+        return {"normalizedVitals": doc["normalizedVitals"]}
+    return {"normalizedVitals": normalize_vital_signs(doc.get("vitalSigns") or {})}
+
+
+MIGRATIONS: Dict[str, List[Migration]] = {
+    "user_readings": [
+        Migration("user_readings", 1, "both reading lists exist",
+                  ["blood_pressure_readings", "glucose_readings"], _readings_lists),
+    ],
+    "user_drugs": [
+        Migration("user_drugs", 1, "drug_key on every drug entry",
+                  ["all_drugs", "active_drugs"], _drug_keys),
+        Migration("user_drugs", 2, "drug_key and canonical_id re-derived with exact-only matching",
+                  ["all_drugs", "active_drugs"], _drug_keys_rederived),
+        Migration("user_drugs", 3, "drug_key, canonical_id and ingredients from edit-distance matching",
+                  ["all_drugs", "active_drugs"], _drug_keys_rederived),
+    ],
+    "image_uploads": [
+        Migration("image_uploads", 1, "image_id and result fields on every upload",
+                  ["image_id", "analysis_result", "error_message", "completed_at"], _image_id),
+    ],
+    "lab_reports": [
+        Migration("lab_reports", 1, "explicit user_id", ["user_id"], _lab_report_owner),
+        Migration("lab_reports", 2, "normalizedVitals parsed from vitalSigns",
+                  ["vitalSigns", "normalizedVitals"], _lab_report_vitals),
+    ],
+}
+
+CURRENT_VERSIONS: Dict[str, int] = {
+    name: max(m.version for m in migrations) for name, migrations in MIGRATIONS.items()
+}
+
+
+def stamp(collection: str, doc: dict) -> dict:
+    """Mark a newly created document as current"""
+    version = CURRENT_VERSIONS.get(collection)
+    if version:
+        doc["schema_version"] = version
+    return doc
+
+
+def upgrade_document(collection: str, doc):
+    """
+    Bring a document read from collection to the current shape, in place.
+    Projected documents are fine: upgrades only touch the fields present.
+    """
+    if doc is None:
+        return doc
+    version = doc.get("schema_version", 0)
+    if version >= CURRENT_VERSIONS.get(collection, 0):
+        return doc
+    for migration in MIGRATIONS[collection]:
+        if migration.version > version:
+            doc.update(migration.upgrade(doc))
+    doc["schema_version"] = CURRENT_VERSIONS[collection]
+    return doc
+
+
+def _outdated(version: int) -> dict:
+    return {"$or": [{"schema_version": {"$lt": version}}, {"schema_version": {"$exists": False}}]}
+
+
+def _guarded_update(migration: Migration, doc: dict) -> UpdateOne:
+    """Write the upgrade only if the document still holds the values it was computed from"""
+    guard = {"_id": doc["_id"]}
+    for field in ["schema_version", *migration.fields]:
+        guard[field] = doc[field] if field in doc else {"$exists": False}
+    changes = migration.upgrade(doc)
+    return UpdateOne(guard, {"$set": {**changes, "schema_version": migration.version}})
+
+
+class Runner:
+    """Runs migrations against one database, one lease-holding worker at a time"""
+
+    def __init__(self, db, batch_size: int = MIGRATION_BATCH_SIZE, duty_cycle: float = MIGRATION_DUTY_CYCLE):
+        self.db = db
+        self.batch_size = batch_size
+        self.duty_cycle = min(1.0, max(0.01, duty_cycle))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def _acquire(self, migration: Migration) -> dict:
+        """Take the migration's lease; returns its checkpoint, or None if another worker holds it"""
+        now = datetime.utcnow()
+        try:
+            return await self.db.migrations.find_one_and_update(
+                {
+                    "_id": migration.name,
+                    "$or": [
+                        {"lease_until": {"$lt": now}},
+                        {"lease_until": {"$exists": False}},
+                        {"owner": self.owner},
+                    ],
+                },
+                {
+                    "$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=LEASE_SECONDS)},
+                    "$setOnInsert": {"description": migration.description, "started_at": now,
+                                     "migrated": 0, "skipped": 0},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            return None
+
+    async def _checkpoint(self, migration: Migration, last_id, migrated: int, skipped: int):
+        await self.db.migrations.update_one(
+            {"_id": migration.name, "owner": self.owner},
+            {
+                "$set": {"last_id": last_id, "lease_until": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)},
+                "$inc": {"migrated": migrated, "skipped": skipped},
+            },
+        )
+
+    async def run(self, migration: Migration) -> bool:
+        """Run one migration to completion. Returns whether it is complete."""
+        checkpoint = await self._acquire(migration)
+        if checkpoint is None:
+            logger.info(f"Migration {migration.name} is running on another worker")
+            return False
+        if checkpoint.get("completed_at"):
+            return True
+
+        collection = self.db[migration.collection]
+        last_id = checkpoint.get("last_id")
+        sweeps = 0
+        logger.info(f"Running migration {migration.name} ({migration.description}) from {last_id}")
+        while True:
+            query = _outdated(migration.version)
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            started = time.perf_counter()
+            docs = await collection.find(query).sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not docs:
+                if last_id is None:
+                    break
+                # End of the range scan: sweep again from the start
+                last_id = None
+                sweeps += 1
+                if sweeps > MAX_SWEEPS:
+                    logger.warning(f"Migration {migration.name} stopped with documents still outdated")
+                    await self._checkpoint(migration, None, 0, 0)
+                    return False
+                continue
+            result = await collection.bulk_write([_guarded_update(migration, d) for d in docs], ordered=False)
+            last_id = docs[-1]["_id"]
+            await self._checkpoint(migration, last_id, result.modified_count, len(docs) - result.matched_count)
+            # Throttle: busy for at most duty_cycle of the wall time
+            busy = time.perf_counter() - started
+            await asyncio.sleep(busy * (1 - self.duty_cycle) / self.duty_cycle)
+
+        await self.db.migrations.update_one(
+            {"_id": migration.name, "owner": self.owner},
+            {"$set": {"completed_at": datetime.utcnow(), "lease_until": datetime.utcnow()}},
+        )
+        logger.info(f"Migration {migration.name} complete")
+        return True
+
+
+async def run_pending_migrations(db, batch_size: int = MIGRATION_BATCH_SIZE, duty_cycle: float = MIGRATION_DUTY_CYCLE):
+    """Run every migration in version order; a collection stops at its first incomplete one"""
+    runner = Runner(db, batch_size, duty_cycle)
+    for name, migrations in MIGRATIONS.items():
+        for migration in migrations:
+            try:
+                if not await runner.run(migration):
+                    break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Migration {migration.name} failed: {e}")
+                break
+
+
+async def migration_status(db) -> Dict[str, dict]:
+    """Checkpoint and count of outdated documents per migration"""
+    status = {}
+    for migrations in MIGRATIONS.values():
+        for migration in migrations:
+            checkpoint = await db.migrations.find_one({"_id": migration.name}) or {}
+            outdated = await db[migration.collection].count_documents(_outdated(migration.version))
+            status[migration.name] = {
+                "description": migration.description,
+                "outdated": outdated,
+                "migrated": checkpoint.get("migrated", 0),
+                "skipped": checkpoint.get("skipped", 0),
+                "completed_at": checkpoint.get("completed_at"),
+            }
+    return status
+
+
+if __name__ == "__main__":
+    from database import connect_to_mongo, close_mongo_connection, get_database
+    from logging_config import configure_logging
+
+    async def main(argv: List[str]):
+        await connect_to_mongo()
+        db = get_database()
+        if "--status" not in argv:
+            await run_pending_migrations(db)
+        for name, state in (await migration_status(db)).items():
+            print(name, state)
+        await close_mongo_connection()
+
+    configure_logging()
+    asyncio.run(main(sys.argv[1:]))
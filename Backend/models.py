@@ -181,6 +181,12 @@ class Drug(BaseModel):
     dosage: str
     instruction: str  # Note: singular form as requested
     duration: str
+    # Set by the server from drug_name/dosage (see drug_service.with_key)
+    drug_key: Optional[str] = None
+    canonical_id: Optional[str] = None
+    ingredients: Optional[List[str]] = None
+    strength: Optional[str] = None
+    form: Optional[str] = None
 
 
 class UserDrugs(BaseModel):
@@ -199,9 +205,21 @@ class SignupResponse(BaseModel):
     access_token: str
     token_type: str
     user: UserResponse
+    refresh_token: Optional[str] = None
 
 
 class LoginResponse(BaseModel):
     access_token: str
     token_type: str
     user: UserResponse
+    refresh_token: Optional[str] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class RefreshResponse(BaseModel):
+    access_token: str
+    refresh_token: Optional[str] = None
+    token_type: str
@@ -0,0 +1,212 @@
+"""
+Connection pool and command metrics for the Mongo client.
+
+``pool_listener`` (CMAP events) tracks, per server:
+- connections open and checked out;
+- callers waiting for a connection;
+- checkout wait times, with timeouts counted separately.
+Saturation is checked-out connections over MONGO_MAX_POOL_SIZE. When it
+stays near 1 and checkout waits grow, the pool is too small for the
+worker's concurrency.
+
+``command_listener`` records latency per command name (find, insert,
+update, aggregate, ...) and counts failures. Neither listener logs command
+bodies, which may carry patient data.
+
+``write_clock`` remembers the newest operationTime / $clusterTime seen in
+write replies. Causally consistent read sessions start from it (see
+read_routing.py), so reads routed to secondaries see this worker's writes.
+
+All three are passed to the client via ``event_listeners`` in database.py.
+``mongo_stats()`` returns a snapshot.
+"""
+import logging
+import threading
+from collections import defaultdict, deque
+from pymongo import monitoring
+from config import MONGO_MAX_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+SAMPLES = 1000
+
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"count": 0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "p50": round(pick(0.5), 2),
+        "p99": round(pick(0.99), 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Per-server pool occupancy and checkout wait times (ms)"""
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        # Events arrive on Motor's executor threads
+        self._lock = threading.Lock()
+        self.open = defaultdict(int)
+        self.checked_out = defaultdict(int)
+        self.waiting = defaultdict(int)
+        self.peak_checked_out = defaultdict(int)
+        self.checkout_failures = defaultdict(int)
+        self.wait_ms = defaultdict(lambda: deque(maxlen=SAMPLES))
+
+    @staticmethod
+    def _server(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open[self._server(event)] += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open[self._server(event)] -= 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting[self._server(event)] += 1
+
+    def connection_checked_out(self, event):
+        server = self._server(event)
+        with self._lock:
+            self.waiting[server] -= 1
+            self.checked_out[server] += 1
+            self.peak_checked_out[server] = max(self.peak_checked_out[server], self.checked_out[server])
+            self.wait_ms[server].append(event.duration * 1000)
+
+    def connection_check_out_failed(self, event):
+        server = self._server(event)
+        with self._lock:
+            self.waiting[server] -= 1
+            self.checkout_failures[server] += 1
+            self.wait_ms[server].append(event.duration * 1000)
+        logger.warning(f"Mongo connection checkout failed on {server}: {event.reason}")
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out[self._server(event)] -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        logger.warning(f"Mongo connection pool cleared for {self._server(event)}")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            servers = set(self.open) | set(self.checked_out)
+            return {
+                server: {
+                    "open": self.open[server],
+                    "checked_out": self.checked_out[server],
+                    "peak_checked_out": self.peak_checked_out[server],
+                    "waiting": self.waiting[server],
+                    "saturation": round(self.checked_out[server] / self.max_pool_size, 3),
+                    "checkout_failures": self.checkout_failures[server],
+                    "checkout_wait_ms": _percentiles(self.wait_ms[server]),
+                }
+                for server in sorted(servers)
+            }
+
+    def saturation(self) -> float:
+        """Highest checked-out / max pool size across servers"""
+        with self._lock:
+            return max((n / self.max_pool_size for n in self.checked_out.values()), default=0.0)
+
+
+class CommandStats(monitoring.CommandListener):
+    """Latency per command name (ms) and failure counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency_ms = defaultdict(lambda: deque(maxlen=SAMPLES))
+        self.failures = defaultdict(int)
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        with self._lock:
+            self.latency_ms[event.command_name].append(event.duration_micros / 1000)
+
+    def failed(self, event):
+        with self._lock:
+            self.latency_ms[event.command_name].append(event.duration_micros / 1000)
+            self.failures[event.command_name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {**_percentiles(samples), "failures": self.failures[name]}
+                for name, samples in sorted(self.latency_ms.items())
+            }
+
+
+class WriteClock(monitoring.CommandListener):
+    """Newest (operationTime, $clusterTime) returned by a write on this worker"""
+
+    WRITE_COMMANDS = {"insert", "update", "delete", "findAndModify"}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operation_time = None
+        self.cluster_time = None
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name not in self.WRITE_COMMANDS:
+            return
+        # Replica sets only; standalone servers return neither field
+        operation_time = event.reply.get("operationTime")
+        if operation_time is None:
+            return
+        with self._lock:
+            if self.operation_time is None or operation_time > self.operation_time:
+                self.operation_time = operation_time
+                self.cluster_time = event.reply.get("$clusterTime")
+
+    def failed(self, event):
+        pass
+
+    def advance(self, session):
+        """Make a causally consistent session read after this worker's writes"""
+        with self._lock:
+            operation_time, cluster_time = self.operation_time, self.cluster_time
+        if cluster_time is not None:
+            session.advance_cluster_time(cluster_time)
+        if operation_time is not None:
+            session.advance_operation_time(operation_time)
+
+
+pool_listener = PoolStats(MONGO_MAX_POOL_SIZE)
+command_listener = CommandStats()
+write_clock = WriteClock()
+
+
+def mongo_stats() -> dict:
+    """Pool occupancy, checkout waits and per-command latency"""
+    return {
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "pools": pool_listener.stats(),
+        "commands": command_listener.stats(),
+    }
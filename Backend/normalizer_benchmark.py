@@ -0,0 +1,49 @@
+"""
+Drug-name normalization throughput.
+
+Normalizes generated prescription text: a dictionary name with a random
+dosage form and strength, and a dropped letter in 40% of names of five
+letters or more. Reports names per second and how many were matched to
+an entry or only got a suggestion.
+
+    python normalizer_benchmark.py [names]
+"""
+import argparse
+import random
+import time
+from drug_normalizer import get_normalizer
+
+FORMS = ["TAB", "Tab.", "CAP", "Syp", "", "inj."]
+STRENGTHS = ["5MG", "500 mg", "250mg/5ml", "", "10 mg", "0.5mg"]
+
+
+def _typo(name: str) -> str:
+    if len(name) < 5 or random.random() < 0.6:
+        return name
+    i = random.randrange(1, len(name) - 1)
+    return name[:i] + name[i + 1:]
+
+
+def main(count: int):
+    normalizer = get_normalizer()
+    names = list(normalizer._names)
+    random.seed(42)
+    samples = [
+        f"{random.choice(FORMS)} {_typo(random.choice(names)).upper()} {random.choice(STRENGTHS)}"
+        for _ in range(count)
+    ]
+
+    started = time.perf_counter()
+    results = [normalizer.normalize(sample) for sample in samples]
+    elapsed = time.perf_counter() - started
+    matched = sum(1 for result in results if result["matched"])
+    suggested = sum(1 for result in results if result["suggestion"])
+    print(f"Normalized {count} names in {elapsed:.2f}s "
+          f"({count / elapsed:,.0f} names/s, {elapsed / count * 1e6:.1f} µs/name), "
+          f"{matched / count:.1%} matched, {suggested / count:.1%} suggested")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drug-name normalization throughput")
+    parser.add_argument("names", nargs="?", type=int, default=100_000, help="names to normalize")
+    main(parser.parse_args().names)
@@ -0,0 +1,240 @@
+"""Password hashing on a bounded pool off the event loop, with the cost calibrated at startup"""
+import asyncio
+import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from passlib.hash import argon2
+from config import (
+    PASSWORD_HASH_EXECUTOR,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_QUEUE,
+    PASSWORD_HASH_SCHEME,
+    PASSWORD_HASH_ROUNDS,
+    PASSWORD_HASH_TARGET_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Cost floors: bcrypt rounds are log2 (each step doubles the time), argon2
+# rounds are its time_cost (linear) at a fixed memory cost
+MIN_ROUNDS = {"bcrypt": 10, "argon2": 2}
+MAX_ROUNDS = {"bcrypt": 16, "argon2": 10}
+DEFAULT_ROUNDS = {"bcrypt": 12, "argon2": 3}
+ARGON2_MEMORY_KIB = 19456
+
+
+def _available_schemes() -> list:
+    return ["bcrypt", "argon2"] if argon2.has_backend() else ["bcrypt"]
+
+
+def _resolve_scheme(scheme: str) -> str:
+    if scheme not in _available_schemes():
+        logger.warning(f"Password hash scheme {scheme!r} unavailable, using bcrypt")
+        return "bcrypt"
+    return scheme
+
+
+@lru_cache(maxsize=8)
+def _context(scheme: str, rounds: int) -> CryptContext:
+    """Context hashing with scheme at rounds; other schemes and lower costs need update"""
+    schemes = [scheme] + [s for s in _available_schemes() if s != scheme]
+    settings = {
+        f"{scheme}__default_rounds": rounds,
+        f"{scheme}__min_rounds": rounds,
+    }
+    if scheme == "argon2":
+        settings.update(argon2__memory_cost=ARGON2_MEMORY_KIB, argon2__parallelism=1)
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+
+# Active hash settings (scheme, rounds); replaced by calibrate_password_hashing()
+hash_settings: Tuple[str, int] = (
+    _resolve_scheme(PASSWORD_HASH_SCHEME),
+    PASSWORD_HASH_ROUNDS or DEFAULT_ROUNDS[_resolve_scheme(PASSWORD_HASH_SCHEME)],
+)
+calibration: Optional[dict] = None
+
+
+def _verify(plain_password: str, hashed_password: str, settings: Optional[Tuple[str, int]] = None) -> bool:
+    return _context(*(settings or hash_settings)).verify(plain_password, hashed_password)
+
+
+def _verify_and_update(
+    plain_password: str, hashed_password: str, settings: Tuple[str, int]
+) -> Tuple[bool, Optional[str]]:
+    return _context(*settings).verify_and_update(plain_password, hashed_password)
+
+
+def _hash(password: str, settings: Optional[Tuple[str, int]] = None) -> str:
+    return _context(*(settings or hash_settings)).hash(password)
+
+
+def _time_hash(scheme: str, rounds: int) -> float:
+    """Best of two hash timings in ms (hash and verify cost the same)"""
+    context = _context(scheme, rounds)
+    timings = []
+    for _ in range(2):
+        started = time.perf_counter()
+        context.hash("calibration-password")
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def _calibrate(scheme: str, target_ms: float) -> dict:
+    """Highest cost whose hash time stays within target_ms (never below the floor)"""
+    rounds = MIN_ROUNDS[scheme]
+    measured = _time_hash(scheme, rounds)
+    while rounds < MAX_ROUNDS[scheme]:
+        # bcrypt doubles per round, argon2 grows linearly with time_cost
+        growth = 2.0 if scheme == "bcrypt" else (rounds + 1) / rounds
+        if measured * growth > target_ms:
+            break
+        rounds += 1
+        measured = _time_hash(scheme, rounds)
+    return {
+        "scheme": scheme,
+        "rounds": rounds,
+        "measured_ms": round(measured, 1),
+        "target_ms": target_ms,
+    }
+
+
+class HashPoolOverloaded(Exception):
+    """Raised when too many hashing calls are already waiting"""
+
+
+class HashPool:
+    """Bounded-concurrency executor for CPU-heavy password hashing"""
+
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_times = deque(maxlen=1000)
+        self._run_times = {}
+
+    def _ensure_started(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash"
+                )
+            self._semaphore = asyncio.Semaphore(self.workers)
+            logger.info(f"Started password hash pool: {self.kind} x{self.workers}")
+
+    async def run(self, fn, *args):
+        self._ensure_started()
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HashPoolOverloaded("Password hashing queue is full")
+
+        enqueued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        self._wait_times.append(started - enqueued)
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            op = fn.__name__.strip("_")
+            self._run_times.setdefault(op, deque(maxlen=1000)).append(
+                time.perf_counter() - started
+            )
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        """Pool occupancy and recent queue-wait / run-time percentiles (ms)"""
+        def percentiles(samples):
+            if not samples:
+                return {"p50": 0.0, "p99": 0.0, "max": 0.0}
+            ordered = sorted(samples)
+            pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+            return {
+                "p50": round(pick(0.5) * 1000, 2),
+                "p99": round(pick(0.99) * 1000, 2),
+                "max": round(ordered[-1] * 1000, 2),
+            }
+
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_ms": percentiles(self._wait_times),
+            "run_time_ms": {op: percentiles(t) for op, t in self._run_times.items()},
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._semaphore = None
+
+
+hash_pool = HashPool(
+    PASSWORD_HASH_EXECUTOR,
+    PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+    PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+async def calibrate_password_hashing():
+    """Pick the hash cost on the pool's hardware (skipped when PASSWORD_HASH_ROUNDS is set)"""
+    global hash_settings, calibration
+    scheme = hash_settings[0]
+    if PASSWORD_HASH_ROUNDS:
+        logger.info(f"Password hashing: {scheme} at fixed rounds {PASSWORD_HASH_ROUNDS}")
+        return
+    try:
+        calibration = await hash_pool.run(_calibrate, scheme, PASSWORD_HASH_TARGET_MS)
+    except Exception as e:
+        # A broken hashing backend must not keep the rest of the API from starting
+        logger.error(f"Password hash calibration failed, keeping {scheme} at rounds {hash_settings[1]}: {e}")
+        return
+    hash_settings = (scheme, calibration["rounds"])
+    logger.info(f"Password hashing calibrated: {calibration}")
+
+
+def hashing_stats() -> dict:
+    """Active hash settings, startup calibration and pool timings"""
+    scheme, rounds = hash_settings
+    return {"scheme": scheme, "rounds": rounds, "calibration": calibration, **hash_pool.stats()}
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash"""
+    return await hash_pool.run(_verify, plain_password, hashed_password, hash_settings)
+
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Verify a password; also returns a new hash if the stored one is outdated"""
+    return await hash_pool.run(_verify_and_update, plain_password, hashed_password, hash_settings)
+
+
+async def get_password_hash(password: str) -> str:
+    """Generate password hash"""
+    return await hash_pool.run(_hash, password, hash_settings)
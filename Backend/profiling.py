@@ -0,0 +1,205 @@
+"""
+Opt-in profiling for finding where a slow request spends its time.
+Nothing here is installed unless ADMIN_TOKEN is set.
+
+Per request: send ``X-Profile: <ADMIN_TOKEN>``. ProfileMiddleware runs
+that request under cProfile and records a breakdown:
+- wall time;
+- CPU time on the event loop thread (validation, serialization, service
+  code);
+- every Mongo command the request issued, with its server round trip
+  time. Motor copies the context into its executor threads, so
+  command_timer can attribute commands to the request;
+- Gemini calls (see gemini_service._call_gemini).
+The response carries ``X-Profile-Id``. The profile, with a call tree
+sorted by cumulative time, is at GET /admin/profiles/{id}. cProfile sees
+everything on the loop thread while the request runs, so profile on a
+quiet worker. Only one request is profiled at a time.
+
+Sampling: ``SamplingProfiler`` is a thread that snapshots every thread's
+stack at a fixed interval (``sys._current_frames``) and counts identical
+stacks. GET /admin/profiler/collapsed samples a window and returns the
+counts as collapsed stacks ("frame;frame;frame count"), which
+flamegraph.pl, speedscope or inferno render directly. The thread only
+exists while a window is being sampled.
+"""
+import asyncio
+import cProfile
+import contextvars
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from pymongo import monitoring
+
+# Recent per-request profiles, newest last
+PROFILES_KEPT = 20
+CALL_TREE_LINES = 60
+
+_current = contextvars.ContextVar("profile", default=None)
+profiles = deque(maxlen=PROFILES_KEPT)
+_profile_lock = threading.Lock()
+
+
+def record_wait(kind: str, name: str, seconds: float):
+    """Add an off-loop wait (Mongo command, Gemini call) to the request being profiled"""
+    profile = _current.get()
+    if profile is not None:
+        # list.append is atomic; Mongo events arrive on executor threads
+        profile["waits"].append({"kind": kind, "name": name, "ms": round(seconds * 1000, 3)})
+
+
+class CommandTimer(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record_wait("mongo", event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        record_wait("mongo", f"{event.command_name} (failed)", event.duration_micros / 1e6)
+
+
+command_timer = CommandTimer()
+
+
+def _call_tree(profiler: cProfile.Profile) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(CALL_TREE_LINES)
+    return out.getvalue()
+
+
+def _summary(profile: dict) -> dict:
+    return {k: profile[k] for k in ("id", "method", "path", "status", "wall_ms", "loop_cpu_ms", "wait_ms")}
+
+
+def list_profiles() -> list:
+    return [_summary(profile) for profile in reversed(profiles)]
+
+
+def get_profile(profile_id: str):
+    return next((profile for profile in profiles if profile["id"] == profile_id), None)
+
+
+class ProfileMiddleware:
+    """Profile requests that carry ``X-Profile: <token>``; others only pay a header scan"""
+
+    def __init__(self, app, token: str):
+        self.app = app
+        self.token = token.encode()
+
+    def _requested(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return hmac.compare_digest(value, self.token)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+        if not _profile_lock.acquire(blocking=False):
+            # Another request is being profiled; serve this one normally
+            await self.app(scope, receive, send)
+            return
+
+        profile = {
+            "id": uuid.uuid4().hex[:12],
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": None,
+            "waits": [],
+        }
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile["status"] = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile["id"].encode())]
+            await send(message)
+
+        profiler = cProfile.Profile()
+        token = _current.set(profile)
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.disable()
+            profile["wall_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            profile["loop_cpu_ms"] = round((time.thread_time() - cpu_started) * 1000, 3)
+            _current.reset(token)
+            _profile_lock.release()
+            waits = {}
+            for wait in profile["waits"]:
+                waits[wait["kind"]] = round(waits.get(wait["kind"], 0.0) + wait["ms"], 3)
+            profile["wait_ms"] = waits
+            profile["call_tree"] = _call_tree(profiler)
+            profiles.append(profile)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Counts identical stacks of every thread, sampled every ``interval`` seconds"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format flamegraph tools read, hottest first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+_sampling = threading.Lock()
+
+
+async def sample(seconds: float, interval: float) -> SamplingProfiler:
+    """Sample all threads for ``seconds``; one window at a time (RuntimeError if busy)"""
+    if not _sampling.acquire(blocking=False):
+        raise RuntimeError("A sampling window is already running")
+    try:
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+        return profiler
+    finally:
+        _sampling.release()
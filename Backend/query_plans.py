@@ -0,0 +1,336 @@
+"""
+Query plan check: every query the app sends must be served by an index.
+
+The queries are not listed by hand. The check points database.py at a
+scratch ``medwise_plan_check`` database and seeds it. It then calls every
+public method of the Motor repositories, with arguments picked by parameter
+name from SAMPLE_ARGS, and the Mongo-only services in SERVICE_CALLS. A
+command listener records the find, count, aggregate, update, delete and
+findAndModify commands they send. Each distinct shape (collection, command,
+filter keys, sort) is then explain()ed and fails on a COLLSCAN, as does a
+call that raises.
+Counter reconciliation aggregates whole collections on purpose and is
+allowed to scan.
+
+Run it in CI against a local mongod (tests/test_query_plans.py does, when
+MONGODB_TEST_URI is set), or by hand:
+
+    MONGODB_URI=mongodb://localhost:27017 python query_plans.py
+
+The scratch database is dropped afterwards.
+"""
+import asyncio
+import copy
+import inspect
+import logging
+import sys
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+from bson import ObjectId
+from pymongo import monitoring
+
+NOW = datetime(2026, 1, 1)
+USERS = 20
+
+# Commands whose plans are checked; inserts, getMores and admin commands are not
+EXPLAINED_COMMANDS = {"find", "count", "distinct", "aggregate", "update", "delete", "findAndModify"}
+# Per-connection fields that do not belong in the command passed to explain
+_SESSION_FIELDS = {"lsid", "txnNumber", "$clusterTime", "$db", "$readPreference", "readConcern",
+                   "writeConcern", "startTransaction", "autocommit", "apiVersion", "apiStrict",
+                   "apiDeprecationErrors"}
+# Sources allowed to read whole collections
+FULL_SCAN_SOURCES = {"counters.reconcile_counters"}
+
+DRUG = {"drug_key": "paracetamol|500 mg|1+0+1", "drug_name": "Napa 500mg", "dosage": "1+0+1",
+        "instruction": "after meal", "duration": "7 days"}
+
+# Repository method argument values, by parameter name
+SAMPLE_ARGS = {
+    "user_id": lambda: "user0",
+    "user_email": lambda: "user0@example.com",
+    "user_doc": lambda: {"user_id": f"plan-{uuid.uuid4().hex}", "user_email": f"{uuid.uuid4().hex}@example.com"},
+    "old_hash": lambda: "old-hash",
+    "new_hash": lambda: "new-hash",
+    "readings": lambda: {"glucose_readings": {"value": 5.4, "date": NOW}},
+    "field": lambda: "glucose_readings",
+    "date": lambda: NOW,
+    "doc": lambda: {"_id": f"plan-{uuid.uuid4().hex}", "user_id": "user0", "uploaded_at": NOW},
+    "report_id": lambda: ObjectId(),
+    "image_id": lambda: "image0",
+    "fields": lambda: {"status": "completed"},
+    "drug": lambda: dict(DRUG),
+    "drugs": lambda: [dict(DRUG)],
+    "active": lambda: True,
+    "skip": lambda: 0,
+    "limit": lambda: 20,
+}
+
+
+class QueryRecorder(monitoring.CommandListener):
+    """Records the commands sent while ``source`` is set"""
+
+    def __init__(self):
+        self.source = None
+        self.commands = []
+
+    def started(self, event):
+        if self.source is None or event.command_name not in EXPLAINED_COMMANDS:
+            return
+        command = {k: copy.deepcopy(v) for k, v in event.command.items() if k not in _SESSION_FIELDS}
+        # Bulk writes carry several statements; explain takes one at a time
+        for key in ("updates", "deletes"):
+            if key in command:
+                for statement in command[key]:
+                    self.commands.append((self.source, {**command, key: [statement]}))
+                return
+        self.commands.append((self.source, command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def _repository_classes():
+    import repositories
+
+    return [repositories.UsersRepository, repositories.ReadingsRepository, repositories.LabReportsRepository,
+            repositories.DrugsRepository, repositories.ImagesRepository, repositories.AnalysesRepository]
+
+
+def repository_calls() -> list:
+    """(source, coroutine function) for every public method of the Motor repositories"""
+    calls = []
+    for cls in _repository_classes():
+        repository = cls()
+        for name, method in inspect.getmembers(repository, inspect.iscoroutinefunction):
+            if name.startswith("_"):
+                continue
+            params = [p for p in inspect.signature(method).parameters.values() if p.default is p.empty]
+            missing = [p.name for p in params if p.name not in SAMPLE_ARGS]
+            if missing:
+                raise KeyError(f"{cls.__name__}.{name}: no SAMPLE_ARGS for {missing}")
+
+            def call(method=method, params=params):
+                return method(*(SAMPLE_ARGS[p.name]() for p in params))
+
+            calls.append((f"{cls.__name__}.{name}", call))
+    return calls
+
+
+async def _sessions():
+    import session_service
+
+    _, refresh_token = await session_service.create_session("user0")
+    await session_service.rotate_session(refresh_token)
+    await session_service.rotate_session(refresh_token)
+    await session_service.revoke_refresh_token(refresh_token)
+    await session_service.revoke_session(refresh_token.partition(".")[0], "user0")
+
+
+async def _revocations():
+    import session_service
+
+    revocations = session_service.RevocationList(1000)
+    revocations.add("jti0")
+    await revocations.is_revoked("jti0")
+    await revocations.sync()
+    await revocations.sync()
+
+
+async def _reminders():
+    import reminder_scheduler
+
+    await reminder_scheduler.schedule_drugs("user0", [DRUG])
+    await reminder_scheduler.get_next_doses("user0")
+    await reminder_scheduler.get_due_doses("user0", NOW)
+    await reminder_scheduler.load_due_reminders(NOW)
+    await reminder_scheduler.mark_dose_taken("user0", DRUG["drug_key"])
+    await reminder_scheduler.unschedule_drug("user0", DRUG["drug_key"])
+
+
+async def _rate_limits():
+    from rate_limiter import MongoWindowStore
+
+    store = MongoWindowStore(60)
+    now = NOW.timestamp()
+    await store.peek("ip:127.0.0.1", 10, now)
+    await store.hit("ip:127.0.0.1", 10, now)
+    await store.add("failures:user0@example.com", now)
+
+
+async def _counters():
+    import counters
+
+    await counters.increment(counters.DRUGS, "user0")
+    await counters.get_count(counters.DRUGS, "user0")
+
+
+async def _reconcile():
+    import counters
+
+    await counters.reconcile_counters()
+
+
+async def _search():
+    import search_service
+
+    await search_service.search("user0", "fever")
+
+
+# Services that query Motor collections directly
+SERVICE_CALLS = [
+    ("session_service.sessions", _sessions),
+    ("session_service.RevocationList", _revocations),
+    ("reminder_scheduler", _reminders),
+    ("rate_limiter.MongoWindowStore", _rate_limits),
+    ("counters", _counters),
+    ("counters.reconcile_counters", _reconcile),
+    ("search_service.search", _search),
+]
+
+
+def seed_documents(n: int = 200) -> Dict[str, List[dict]]:
+    """Small synthetic data set, enough for the planner to choose between plans"""
+    docs = {"users": [], "image_uploads": [], "lab_reports": [], "report_analysis_responses": [],
+            "counters": [], "dose_reminders": [], "revoked_tokens": [], "sessions": [],
+            "user_readings": [], "user_drugs": []}
+    for i in range(n):
+        user_id = f"user{i % USERS}"
+        when = NOW - timedelta(minutes=i)
+        docs["users"].append({"user_id": f"user{i}", "user_email": f"user{i}@example.com", "created_at": when})
+        docs["image_uploads"].append({"_id": f"image{i}", "image_id": f"image{i}", "user_id": user_id, "status": "completed", "uploaded_at": when})
+        docs["lab_reports"].append({
+            "user_id": user_id,
+            "basicInfo": {"title": f"report {i} fever"},
+            "normalizedVitals": {"heartRate": {"value": 60 + i % 60}},
+        })
+        docs["report_analysis_responses"].append({"user_id": user_id, "data": {"diagnosis": "fever"}})
+        docs["counters"].append({"_id": f"drugs:user{i}", "name": "drugs", "user_id": f"user{i}", "reconciled_at": when})
+        docs["dose_reminders"].append({"_id": f"{user_id}:{i}", "user_id": user_id, "due_at": when, "quantity": 1, "slots": []})
+        docs["revoked_tokens"].append({"_id": f"jti{i}", "revoked_at": when, "expires_at": when + timedelta(hours=1)})
+        docs["sessions"].append({"_id": f"session{i}", "user_id": user_id, "refresh_hash": "x", "revoked_at": None, "expires_at": NOW + timedelta(days=30)})
+    for i in range(USERS):
+        docs["user_readings"].append({"user_id": f"user{i}", "blood_pressure_readings": [], "glucose_readings": []})
+        docs["user_drugs"].append({"user_id": f"user{i}", "all_drugs": [dict(DRUG)], "active_drugs": []})
+    return docs
+
+
+def _shape(value):
+    """A filter or sort with its values blanked, so queries differing only in values compare equal"""
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_shape(v) for v in value[:1]]
+    return 1
+
+
+def _describe(command: dict) -> tuple:
+    """(collection, command name, filter, sort) of a recorded command"""
+    name = next(iter(command))
+    if name in ("update", "delete"):
+        statement = command["updates" if name == "update" else "deletes"][0]
+        query, sort = statement.get("q", {}), None
+    elif name == "aggregate":
+        first = command["pipeline"][0] if command["pipeline"] else {}
+        query, sort = first.get("$match", {}), None
+    elif name == "findAndModify":
+        query, sort = command.get("query", {}), command.get("sort")
+    else:
+        query, sort = command.get("filter", command.get("query", {})), command.get("sort")
+    return command[name], name, query, sort
+
+
+def _stages(node):
+    """Every stage name in an explain() result"""
+    if isinstance(node, dict):
+        if isinstance(node.get("stage"), str):
+            yield node["stage"]
+        for key, value in node.items():
+            if key not in ("rejectedPlans", "command"):
+                yield from _stages(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _stages(item)
+
+
+async def record_queries(recorder: QueryRecorder) -> List[str]:
+    """Run every repository and service query once; returns the calls that raised"""
+    errors = []
+    for source, call in repository_calls() + SERVICE_CALLS:
+        recorder.source = source
+        try:
+            await call()
+        except Exception as e:
+            # What the call sent so far is still checked
+            errors.append(f"{source}: raised {e!r}")
+        finally:
+            recorder.source = None
+    return errors
+
+
+async def check_query_plans(db, recorder: QueryRecorder) -> List[str]:
+    """
+    Record the app's queries against db (which database.py must point at),
+    explain() each shape, and return descriptions of those that COLLSCAN
+    and of calls that raised
+    """
+    failures = await record_queries(recorder)
+    seen = set()
+    for source, command in recorder.commands:
+        collection, name, query, sort = _describe(command)
+        key = (source, repr(_shape(command)))
+        if key in seen:
+            continue
+        seen.add(key)
+        explained = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        stages = set(_stages(explained.get("queryPlanner", explained)))
+        scans = "COLLSCAN" in stages
+        status = "ok" if not scans else "scan" if source in FULL_SCAN_SOURCES else "COLLSCAN"
+        print(f"{status:8} {source}: {collection}.{name} {_shape(query)} sort={sort} -> {sorted(stages)}")
+        if status == "COLLSCAN":
+            failures.append(f"{source}: {collection}.{name} {_shape(query)}")
+    return failures
+
+
+async def run_plan_check(uri: str) -> List[str]:
+    """Seed a scratch database at uri, check every query plan, drop the database"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    import database
+    from indexes import ensure_indexes
+
+    recorder = QueryRecorder()
+    client = AsyncIOMotorClient(uri, event_listeners=[recorder])
+    db = client.medwise_plan_check
+    previous = database.client, database.db
+    database.client, database.db = client, db
+    try:
+        await client.drop_database(db.name)
+        for name, docs in seed_documents().items():
+            await db[name].insert_many(docs)
+        await ensure_indexes(db)
+        return await check_query_plans(db, recorder)
+    finally:
+        database.client, database.db = previous
+        await client.drop_database(db.name)
+        client.close()
+
+
+async def main() -> int:
+    from config import MONGODB_URI
+
+    failures = await run_plan_check(MONGODB_URI)
+    if failures:
+        print(f"{len(failures)} failure(s):")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("All query shapes use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,257 @@
+"""Sliding-window throttling of login attempts, before any user lookup or hashing"""
+import ipaddress
+import logging
+import math
+import time
+from datetime import datetime
+from typing import Optional
+from cachetools import TTLCache
+from fastapi import Request
+from pymongo.errors import DuplicateKeyError
+from config import (
+    LOGIN_RATE_LIMIT_STORE,
+    LOGIN_RATE_LIMIT_WINDOW_SECONDS,
+    LOGIN_RATE_LIMIT_PER_IP,
+    LOGIN_RATE_LIMIT_PER_EMAIL,
+    LOGIN_FAILURE_LIMIT_PER_EMAIL,
+    TRUSTED_PROXIES,
+)
+from database import get_rate_limits_collection
+
+logger = logging.getLogger(__name__)
+
+
+def _networks(proxies: list) -> list:
+    networks = []
+    for proxy in proxies:
+        if proxy == "*":
+            continue
+        try:
+            networks.append(ipaddress.ip_network(proxy, strict=False))
+        except ValueError:
+            logger.warning(f"Ignoring invalid TRUSTED_PROXIES entry {proxy!r}")
+    return networks
+
+
+_TRUST_ANY_PEER = "*" in TRUSTED_PROXIES
+_TRUSTED_NETWORKS = _networks(TRUSTED_PROXIES)
+
+
+def _is_trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _TRUSTED_NETWORKS)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    The client's IP. X-Forwarded-For is only believed as far as trusted
+    proxies (TRUSTED_PROXIES) appended to it: walking it from the right,
+    the first address that is not a trusted proxy is the client.
+    """
+    peer = request.client.host if request.client else None
+    if peer is None or not (_TRUST_ANY_PEER or _is_trusted(peer)):
+        return peer
+    forwarded = [
+        address.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for address in header.split(",")
+        if address.strip()
+    ]
+    for address in reversed(forwarded):
+        if not _is_trusted(address):
+            return address
+    return forwarded[0] if forwarded else peer
+
+
+def _sliding_count(previous: int, current: int, elapsed_fraction: float) -> float:
+    return previous * (1.0 - elapsed_fraction) + current
+
+
+def _retry_after(previous: int, current: int, limit: int, window: float, elapsed: float) -> float:
+    """Seconds until the sliding count drops below limit (assuming no new hits)"""
+    if current >= limit or previous == 0:
+        return window - elapsed
+    # previous * (1 - t / window) + current < limit  =>  solve for t
+    t = window * (1.0 - (limit - current) / previous)
+    return max(1.0, t - elapsed)
+
+
+class MemoryWindowStore:
+    """Per-process counters: key -> [window index, previous count, current count]"""
+
+    def __init__(self, window: int, max_keys: int = 100_000):
+        self.window = window
+        self._counters = TTLCache(maxsize=max_keys, ttl=2 * window)
+
+    def _entry(self, key: str, index: float) -> list:
+        entry = self._counters.get(key)
+        if entry is None or entry[0] < index - 1:
+            return [index, 0, 0]
+        if entry[0] == index - 1:
+            return [index, entry[2], 0]
+        return entry
+
+    async def peek(self, key: str, limit: int, now: float) -> Optional[float]:
+        """Seconds to wait if key is at limit, else None; records nothing"""
+        index, elapsed = divmod(now, self.window)
+        _, previous, current = self._entry(key, index)
+        if _sliding_count(previous, current, elapsed / self.window) >= limit:
+            return _retry_after(previous, current, limit, self.window, elapsed)
+        return None
+
+    async def hit(self, key: str, limit: int, now: float) -> Optional[float]:
+        """Like peek, but records the attempt when it is allowed"""
+        retry_after = await self.peek(key, limit, now)
+        if retry_after is None:
+            await self.add(key, now)
+        return retry_after
+
+    async def add(self, key: str, now: float):
+        """Record an event whatever the count"""
+        entry = self._entry(key, now // self.window)
+        entry[2] += 1
+        self._counters[key] = entry
+
+
+class MongoWindowStore:
+    """Counters shared by all workers, one document per key and window"""
+
+    def __init__(self, window: int):
+        self.window = window
+
+    async def _counts(self, key: str, index: int) -> tuple:
+        previous, current = 0, 0
+        ids = [f"{key}:{index - 1}", f"{key}:{index}"]
+        async for doc in get_rate_limits_collection().find({"_id": {"$in": ids}}):
+            if doc["_id"] == ids[0]:
+                previous = doc["count"]
+            else:
+                current = doc["count"]
+        return previous, current
+
+    def _increment(self, key: str, index: int) -> dict:
+        expires_at = datetime.utcfromtimestamp((index + 2) * self.window)
+        return {"$inc": {"count": 1}, "$setOnInsert": {"expires_at": expires_at}}
+
+    async def peek(self, key: str, limit: int, now: float) -> Optional[float]:
+        """Seconds to wait if key is at limit, else None; records nothing"""
+        index, elapsed = divmod(now, self.window)
+        previous, current = await self._counts(key, int(index))
+        if _sliding_count(previous, current, elapsed / self.window) >= limit:
+            return _retry_after(previous, current, limit, self.window, elapsed)
+        return None
+
+    async def hit(self, key: str, limit: int, now: float) -> Optional[float]:
+        """Like peek, but records the attempt when it is allowed"""
+        index, elapsed = divmod(now, self.window)
+        index = int(index)
+        previous, current = await self._counts(key, index)
+        # Highest current count that still leaves room for this attempt
+        room = math.ceil(limit - previous * (1.0 - elapsed / self.window))
+        if current >= room:
+            return _retry_after(previous, current, limit, self.window, elapsed)
+        try:
+            # Conditional on the count, so concurrent workers cannot overshoot
+            await get_rate_limits_collection().update_one(
+                {"_id": f"{key}:{index}", "count": {"$lt": room}}, self._increment(key, index), upsert=True
+            )
+        except DuplicateKeyError:
+            # The window filled up since the read
+            return _retry_after(previous, room, limit, self.window, elapsed)
+        return None
+
+    async def add(self, key: str, now: float):
+        """Record an event whatever the count"""
+        index = int(now // self.window)
+        await get_rate_limits_collection().update_one(
+            {"_id": f"{key}:{index}"}, self._increment(key, index), upsert=True
+        )
+
+
+class LoginRateLimiter:
+    """
+    Sliding-window limits on login attempts per client IP and per IP and
+    email, and on failed logins per email from anywhere. Attempts are never
+    limited per email alone, or anyone could lock its owner out.
+    """
+
+    def __init__(self, store, per_ip: int, per_email: int, failures_per_email: int):
+        self.store = store
+        self.per_ip = per_ip
+        self.per_email = per_email
+        self.failures_per_email = failures_per_email
+        self.allowed = 0
+        self.rejected_ip = 0
+        self.rejected_email = 0
+        self.rejected_failures = 0
+        self.store_errors = 0
+
+    async def check(self, client_ip: Optional[str], email: str) -> Optional[float]:
+        """Record an attempt. Returns seconds to wait if it is over a limit, else None."""
+        now = time.time()
+        email = email.strip().lower()
+        try:
+            if client_ip:
+                retry_after = await self.store.hit(f"ip:{client_ip}", self.per_ip, now)
+                if retry_after is not None:
+                    self.rejected_ip += 1
+                    logger.warning(f"Login rate limit hit for IP {client_ip}")
+                    return retry_after
+            retry_after = await self.store.peek(f"failures:{email}", self.failures_per_email, now)
+            if retry_after is not None:
+                self.rejected_failures += 1
+                logger.warning("Login failure limit hit for an email address")
+                return retry_after
+            # Per IP too: attempts from elsewhere must not lock the owner out
+            retry_after = await self.store.hit(f"email:{client_ip or ''}:{email}", self.per_email, now)
+            if retry_after is not None:
+                self.rejected_email += 1
+                logger.warning(f"Login rate limit hit for an email address from IP {client_ip}")
+                return retry_after
+        except Exception as e:
+            # Fail open: a broken limiter store must not lock everyone out
+            self.store_errors += 1
+            logger.error(f"Login rate limiter store failed: {e}")
+        self.allowed += 1
+        return None
+
+    async def record_failure(self, email: str):
+        """Count a failed login (unknown email or wrong password) against the email"""
+        try:
+            await self.store.add(f"failures:{email.strip().lower()}", time.time())
+        except Exception as e:
+            self.store_errors += 1
+            logger.error(f"Login rate limiter store failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "store": type(self.store).__name__,
+            "window_seconds": self.store.window,
+            "per_ip": self.per_ip,
+            "per_email": self.per_email,
+            "failures_per_email": self.failures_per_email,
+            "allowed": self.allowed,
+            "rejected_ip": self.rejected_ip,
+            "rejected_email": self.rejected_email,
+            "rejected_failures": self.rejected_failures,
+            "store_errors": self.store_errors,
+        }
+
+
+def _make_store():
+    if LOGIN_RATE_LIMIT_STORE == "mongo":
+        return MongoWindowStore(LOGIN_RATE_LIMIT_WINDOW_SECONDS)
+    return MemoryWindowStore(LOGIN_RATE_LIMIT_WINDOW_SECONDS)
+
+
+login_limiter = LoginRateLimiter(
+    _make_store(), LOGIN_RATE_LIMIT_PER_IP, LOGIN_RATE_LIMIT_PER_EMAIL, LOGIN_FAILURE_LIMIT_PER_EMAIL
+)
+
+
+def retry_after_header(retry_after: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(retry_after)))}
+
@@ -0,0 +1,46 @@
+"""Per-route read preferences, in causally consistent sessions for reads sent to secondaries"""
+import logging
+from contextlib import asynccontextmanager
+from pymongo.read_preferences import Primary, SecondaryPreferred
+from config import SECONDARY_READS, READ_MAX_STALENESS_SECONDS
+from database import get_client
+from mongo_monitoring import write_clock
+
+logger = logging.getLogger(__name__)
+
+READINGS = "readings"
+LAB_REPORTS = "lab_reports"
+IMAGES = "images"
+DRUGS = "drugs"
+
+ROUTE_READ_PREFERENCES = {
+    READINGS: SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS),
+    LAB_REPORTS: SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS),
+    IMAGES: SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS),
+    DRUGS: SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS),
+}
+
+
+def read_preference(route: str, enabled: bool = SECONDARY_READS):
+    """Read preference of a route (primary unless secondary reads are enabled)"""
+    if not enabled:
+        return Primary()
+    return ROUTE_READ_PREFERENCES.get(route, Primary())
+
+
+@asynccontextmanager
+async def routed_read(collection, route: str, enabled: bool = SECONDARY_READS):
+    """
+    Yield (collection, session) for a route's reads: the collection bound to
+    the route's read preference, and a causally consistent session (None
+    when the route reads from the primary). The session starts at this
+    worker's newest write, so the secondary waits until it has that write;
+    writes made on other workers are only seen once replicated.
+    """
+    preference = read_preference(route, enabled)
+    if isinstance(preference, Primary):
+        yield collection, None
+        return
+    async with await get_client().start_session(causal_consistency=True) as session:
+        write_clock.advance(session)
+        yield collection.with_options(read_preference=preference), session
@@ -0,0 +1,77 @@
+"""
+Primary load and read-your-writes with and without secondary reads.
+
+Each round pushes a reading and immediately reads the document back, as
+the app does after a POST. The run is repeated with reads on the primary
+and with routed_read(). It reports the queries the primary served, read
+latency, and reads that missed the write just made. It needs a replica
+set (e.g. a local three-member set) at MONGODB_URI. It writes only to a
+``read_routing_bench`` collection, which it drops afterwards.
+
+    python read_routing_benchmark.py [rounds]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from database import connect_to_mongo, close_mongo_connection, get_client, get_database
+from read_routing import READINGS, routed_read
+
+USERS = 50
+
+
+async def primary_queries(client) -> int:
+    status = await client.admin.command("serverStatus")
+    return status["opcounters"]["query"]
+
+
+async def run(collection, client, rounds: int, routed: bool) -> dict:
+    before = await primary_queries(client)
+    stale = 0
+    latencies = []
+    for i in range(rounds):
+        user_id = f"bench-user-{i % USERS}"
+        # Write, then immediately read it back, as the app does after a POST
+        await collection.update_one({"user_id": user_id}, {"$push": {"glucose_readings": {"value": i}}})
+        started = time.perf_counter()
+        async with routed_read(collection, READINGS, enabled=routed) as (reader, session):
+            doc = await reader.find_one({"user_id": user_id}, session=session)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if doc["glucose_readings"][-1]["value"] != i:
+            stale += 1
+    after = await primary_queries(client)
+    latencies.sort()
+    return {
+        "primary_queries": after - before,
+        "read_p50_ms": round(latencies[len(latencies) // 2], 2),
+        "read_p99_ms": round(latencies[int(0.99 * (len(latencies) - 1))], 2),
+        "read_your_writes_violations": stale,
+    }
+
+
+async def main(rounds: int):
+    await connect_to_mongo()
+    client = get_client()
+    try:
+        hello = await client.admin.command("hello")
+        if "setName" not in hello:
+            print("Not a replica set: secondary reads need one (e.g. a local three-member set)")
+            return
+        collection = get_database().read_routing_bench
+        await collection.drop()
+        await collection.insert_many(
+            [{"user_id": f"bench-user-{i}", "glucose_readings": [], "created_at": datetime.utcnow()} for i in range(USERS)]
+        )
+        await collection.create_index("user_id")
+        print(f"replica set {hello['setName']}, {len(hello.get('hosts', []))} members")
+        print("primary reads:  ", await run(collection, client, rounds, routed=False))
+        print("secondary reads:", await run(collection, client, rounds, routed=True))
+        await collection.drop()
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Primary load with and without secondary reads")
+    parser.add_argument("rounds", nargs="?", type=int, default=2000, help="write-then-read rounds per run")
+    asyncio.run(main(parser.parse_args().rounds))
@@ -2,7 +2,9 @@ from fastapi import APIRouter, HTTPException, Query, Body, Path
 from typing import List, Optional
 from datetime import datetime
 from models import AddBloodPressureReading, AddGlucoseReading, UserReadings
-from database import get_user_readings_collection
+from repositories import get_readings_repository
+from responses import ORJSONResponse
+import counters
 import logging
 
 # Configure logging
@@ -10,6 +12,12 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/readings", tags=["Health Readings"])
 
+
+def _reading_date() -> datetime:
+    """Now, at the millisecond precision Mongo stores"""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
 @router.post("/bp", response_model=dict)
 async def add_blood_pressure_reading(
     user_id: str = Query(..., description="User ID"),
@@ -19,25 +27,19 @@ async def add_blood_pressure_reading(
     logger.info(f"Adding BP reading for user: {user_id}")
     
     try:
-        collection = get_user_readings_collection()
-        
         # Create new reading with current timestamp
+        date = _reading_date()
         new_reading = {
-            "value": reading.value.dict(),
-            "date": datetime.utcnow()
+            "value": reading.value.model_dump(),
+            "date": date
         }
         
         # Update or insert into user_readings collection
-        result = await collection.update_one(
-            {"user_id": user_id},
-            {
-                "$push": {"blood_pressure_readings": new_reading},
-                "$setOnInsert": {"user_id": user_id, "glucose_readings": []}
-            },
-            upsert=True
-        )
-        
-        reading_id = str(datetime.utcnow().timestamp())
+        await get_readings_repository().push(user_id, {"blood_pressure_readings": new_reading})
+        await counters.increment(counters.BP_READINGS, user_id)
+        
+        # The delete routes find the reading by this timestamp
+        reading_id = str(date.timestamp())
         return {
             "status": "success",
             "message": "Blood pressure reading added successfully",
@@ -57,25 +59,19 @@ async def add_glucose_reading(
     logger.info(f"Adding glucose reading for user: {user_id}")
     
     try:
-        collection = get_user_readings_collection()
-        
         # Create new reading with current timestamp
+        date = _reading_date()
         new_reading = {
             "value": reading.value,
-            "date": datetime.utcnow()
+            "date": date
         }
         
         # Update or insert into user_readings collection
-        result = await collection.update_one(
-            {"user_id": user_id},
-            {
-                "$push": {"glucose_readings": new_reading},
-                "$setOnInsert": {"user_id": user_id, "blood_pressure_readings": []}
-            },
-            upsert=True
-        )
-        
-        reading_id = str(datetime.utcnow().timestamp())
+        await get_readings_repository().push(user_id, {"glucose_readings": new_reading})
+        await counters.increment(counters.GLUCOSE_READINGS, user_id)
+        
+        # The delete routes find the reading by this timestamp
+        reading_id = str(date.timestamp())
         return {
             "status": "success",
             "message": "Glucose reading added successfully",
@@ -96,8 +92,7 @@ async def get_user_readings(
     logger.info(f"Getting readings for user: {user_id}")
     
     try:
-        collection = get_user_readings_collection()
-        doc = await collection.find_one({"user_id": user_id})
+        doc = await get_readings_repository().get(user_id)
         
         if not doc:
             return {
@@ -106,24 +101,13 @@ async def get_user_readings(
                 "glucose_readings": []
             }
         
-        # Process the data for response
-        if "_id" in doc:
-            doc["_id"] = str(doc["_id"])
-            
-        # Apply pagination and format dates
-        if "blood_pressure_readings" in doc:
-            doc["blood_pressure_readings"] = doc["blood_pressure_readings"][skip:skip+limit]
-            for reading in doc["blood_pressure_readings"]:
-                if "date" in reading:
-                    reading["date"] = reading["date"].isoformat() if hasattr(reading["date"], "isoformat") else str(reading["date"])
-        
-        if "glucose_readings" in doc:
-            doc["glucose_readings"] = doc["glucose_readings"][skip:skip+limit]
-            for reading in doc["glucose_readings"]:
-                if "date" in reading:
-                    reading["date"] = reading["date"].isoformat() if hasattr(reading["date"], "isoformat") else str(reading["date"])
-        
-        return doc
+        # Stored readings go out as they are: ORJSONResponse writes the
+        # ObjectId and dates, no per-reading conversion or re-validation
+        for field in ("blood_pressure_readings", "glucose_readings"):
+            if field in doc:
+                doc[field] = doc[field][skip:skip+limit]
+        
+        return ORJSONResponse(doc)
         
     except Exception as e:
         logger.error(f"Error getting readings: {str(e)}")
@@ -138,8 +122,6 @@ async def delete_blood_pressure_reading(
     logger.info(f"Deleting BP reading {reading_id} for user: {user_id}")
     
     try:
-        collection = get_user_readings_collection()
-        
         # Convert reading_id (timestamp) to datetime for comparison
         try:
             timestamp = float(reading_id)
@@ -147,13 +129,11 @@ async def delete_blood_pressure_reading(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid reading ID format")
         
-        result = await collection.update_one(
-            {"user_id": user_id},
-            {"$pull": {"blood_pressure_readings": {"date": {"$eq": target_time}}}}
-        )
+        removed = await get_readings_repository().pull_by_date(user_id, "blood_pressure_readings", target_time)
         
-        if result.modified_count == 0:
+        if not removed:
             raise HTTPException(status_code=404, detail="Reading not found")
+        await counters.increment(counters.BP_READINGS, user_id, -1)
         
         return {
             "status": "success",
@@ -175,8 +155,6 @@ async def delete_glucose_reading(
     logger.info(f"Deleting glucose reading {reading_id} for user: {user_id}")
     
     try:
-        collection = get_user_readings_collection()
-        
         # Convert reading_id (timestamp) to datetime for comparison
         try:
             timestamp = float(reading_id)
@@ -184,13 +162,11 @@ async def delete_glucose_reading(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid reading ID format")
         
-        result = await collection.update_one(
-            {"user_id": user_id},
-            {"$pull": {"glucose_readings": {"date": {"$eq": target_time}}}}
-        )
+        removed = await get_readings_repository().pull_by_date(user_id, "glucose_readings", target_time)
         
-        if result.modified_count == 0:
+        if not removed:
             raise HTTPException(status_code=404, detail="Reading not found")
+        await counters.increment(counters.GLUCOSE_READINGS, user_id, -1)
         
         return {
             "status": "success",
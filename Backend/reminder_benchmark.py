@@ -0,0 +1,52 @@
+"""
+In-memory cost of the reminder loop: heap pushes, draining a day of
+reminders hour by hour, and computing next doses.
+
+    python reminder_benchmark.py [reminders]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from dose_schedule import next_dose_time, parse_dosage
+from reminder_scheduler import ReminderHeap
+
+NEXT_DOSES = 100_000
+
+
+def main(pending: int):
+    base = datetime(2026, 1, 1)
+    random.seed(7)
+    reminders = [
+        {"_id": f"user{i}:drug", "due_at": base + timedelta(seconds=random.randrange(86400))}
+        for i in range(pending)
+    ]
+
+    heap = ReminderHeap()
+    started = time.perf_counter()
+    for reminder in reminders:
+        heap.push(reminder)
+    pushed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    drained = 0
+    for hour in range(1, 25):
+        drained += len(heap.pop_until(base + timedelta(hours=hour)))
+    popped = time.perf_counter() - started
+
+    slots = parse_dosage("1+1+1")
+    sample = reminders[:NEXT_DOSES]
+    started = time.perf_counter()
+    for reminder in sample:
+        next_dose_time(slots, reminder["due_at"])
+    advanced = time.perf_counter() - started
+
+    print(f"push {pending:,}: {pushed:.2f}s ({pushed / pending * 1e6:.2f} µs each)")
+    print(f"pop {drained:,}: {popped:.2f}s ({popped / drained * 1e6:.2f} µs each)")
+    print(f"next dose x{len(sample):,}: {advanced:.2f}s ({advanced / len(sample) * 1e6:.2f} µs each)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reminder heap and next-dose timings")
+    parser.add_argument("reminders", nargs="?", type=int, default=1_000_000, help="pending reminders")
+    main(parser.parse_args().reminders)
@@ -0,0 +1,236 @@
+"""Dose reminders for active drugs: one next-dose document per drug, advanced by a background loop"""
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from pymongo import UpdateOne, DeleteOne
+from config import DOSE_REMINDER_GRACE_MINUTES
+from database import get_dose_reminders_collection, get_user_drug_collection
+from dose_schedule import parse_dosage, parse_duration, next_dose_time
+
+logger = logging.getLogger(__name__)
+
+LOAD_WINDOW = timedelta(minutes=10)
+LOAD_BATCH = 5000
+IDLE_SLEEP_SECONDS = 60
+
+
+def _reminder_id(user_id: str, drug_key: str) -> str:
+    return f"{user_id}:{drug_key}"
+
+
+def _slots_to_doc(slots) -> list:
+    return [[slot_time.strftime("%H:%M"), quantity] for slot_time, quantity in slots]
+
+
+def _slots_from_doc(slots) -> list:
+    return [(datetime.strptime(t, "%H:%M").time(), quantity) for t, quantity in slots]
+
+
+def build_reminder(user_id: str, drug: dict, now: datetime) -> Optional[dict]:
+    """Reminder document for an active drug, or None if it has no schedule"""
+    if not drug.get("drug_key"):
+        return None
+    slots = parse_dosage(drug.get("dosage"))
+    course = parse_duration(drug.get("duration"))
+    upcoming = next_dose_time(slots, now)
+    if upcoming is None:
+        if not course:
+            return None
+        # No dose times, but the course still ends: an expiry-only reminder
+        upcoming = (now + course, 0.0)
+    due_at, quantity = upcoming
+    return {
+        "_id": _reminder_id(user_id, drug["drug_key"]),
+        "user_id": user_id,
+        "drug_key": drug["drug_key"],
+        "drug_name": drug.get("drug_name"),
+        "dosage": drug.get("dosage"),
+        "instruction": drug.get("instruction"),
+        "slots": _slots_to_doc(slots),
+        "due_at": due_at,
+        "quantity": quantity,
+        "started_at": now,
+        "ends_at": now + course if course else None,
+    }
+
+
+async def schedule_drugs(user_id: str, drugs: List[dict]):
+    """Create reminders for newly active drugs (existing reminders are kept)"""
+    now = datetime.utcnow()
+    ops = []
+    for drug in drugs:
+        reminder = build_reminder(user_id, drug, now)
+        if reminder:
+            ops.append(UpdateOne({"_id": reminder["_id"]}, {"$setOnInsert": reminder}, upsert=True))
+    if not ops:
+        return
+    try:
+        await get_dose_reminders_collection().bulk_write(ops, ordered=False)
+    except Exception as e:
+        logger.warning(f"Failed to schedule reminders for user {user_id}: {e}")
+
+
+async def unschedule_drug(user_id: str, drug_key: str):
+    """Remove the reminder of a drug that is no longer active"""
+    try:
+        await get_dose_reminders_collection().delete_one({"_id": _reminder_id(user_id, drug_key)})
+    except Exception as e:
+        logger.warning(f"Failed to unschedule reminder {drug_key} for user {user_id}: {e}")
+
+
+_PUBLIC_FIELDS = {"_id": 0, "drug_key": 1, "drug_name": 1, "dosage": 1,
+                  "instruction": 1, "due_at": 1, "quantity": 1, "ends_at": 1}
+
+
+async def get_next_doses(user_id: str, limit: int = 10) -> List[dict]:
+    """A user's upcoming reminders, soonest first (index on user_id, due_at)"""
+    cursor = (
+        get_dose_reminders_collection()
+        .find({"user_id": user_id, "quantity": {"$gt": 0}}, _PUBLIC_FIELDS)
+        .sort("due_at", 1)
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
+
+
+async def get_due_doses(user_id: str, now: Optional[datetime] = None) -> List[dict]:
+    """A user's reminders that are due and not yet taken or expired"""
+    now = now or datetime.utcnow()
+    cursor = (
+        get_dose_reminders_collection()
+        .find({"user_id": user_id, "due_at": {"$lte": now}, "quantity": {"$gt": 0}}, _PUBLIC_FIELDS)
+        .sort("due_at", 1)
+    )
+    return await cursor.to_list(length=100)
+
+
+def _advance_op(reminder: dict, after: datetime):
+    """Operations moving a reminder past after: next dose, or expiry"""
+    upcoming = next_dose_time(_slots_from_doc(reminder["slots"]), after)
+    ends_at = reminder.get("ends_at")
+    if upcoming is None or (ends_at and upcoming[0] > ends_at):
+        return DeleteOne({"_id": reminder["_id"], "due_at": reminder["due_at"]}), True
+    due_at, quantity = upcoming
+    return UpdateOne(
+        {"_id": reminder["_id"], "due_at": reminder["due_at"]},
+        {"$set": {"due_at": due_at, "quantity": quantity}},
+    ), False
+
+
+async def mark_dose_taken(user_id: str, drug_key: str) -> Optional[dict]:
+    """Advance a reminder to its next dose. Returns the reminder before advancing."""
+    collection = get_dose_reminders_collection()
+    reminder = await collection.find_one({"_id": _reminder_id(user_id, drug_key)})
+    if reminder is None:
+        return None
+    await _apply([reminder], max(reminder["due_at"], datetime.utcnow()))
+    return reminder
+
+
+async def _apply(reminders: List[dict], after: datetime) -> int:
+    """Advance or expire reminders; expired drugs leave active_drugs"""
+    ops, expired = [], []
+    for reminder in reminders:
+        op, is_expired = _advance_op(reminder, after)
+        ops.append(op)
+        if is_expired:
+            expired.append(reminder)
+    if ops:
+        await get_dose_reminders_collection().bulk_write(ops, ordered=False)
+    if expired:
+        drug_ops = [
+            UpdateOne(
+                {"user_id": r["user_id"]},
+                {"$pull": {"active_drugs": {"drug_key": r["drug_key"]}}},
+            )
+            for r in expired
+        ]
+        await get_user_drug_collection().bulk_write(drug_ops, ordered=False)
+        logger.info(f"Expired {len(expired)} finished drug courses")
+    return len(ops)
+
+
+async def load_due_reminders(until: datetime) -> List[dict]:
+    """Reminders due at or before until, soonest first (at most LOAD_BATCH)"""
+    cursor = (
+        get_dose_reminders_collection()
+        .find({"due_at": {"$lte": until}})
+        .sort("due_at", 1)
+        .limit(LOAD_BATCH)
+    )
+    return await cursor.to_list(length=LOAD_BATCH)
+
+
+class ReminderHeap:
+    """Min-heap of (due_at, reminder id) with lazy de-duplication"""
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, reminder: dict):
+        current = self._entries.get(reminder["_id"])
+        if current is not None and current["due_at"] == reminder["due_at"]:
+            return
+        self._entries[reminder["_id"]] = reminder
+        heapq.heappush(self._heap, (reminder["due_at"], reminder["_id"]))
+
+    def peek_time(self) -> Optional[datetime]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_until(self, until: datetime) -> List[dict]:
+        """Remove and return every reminder due at or before until"""
+        popped = []
+        while self.peek_time() is not None and self._heap[0][0] <= until:
+            _, reminder_id = heapq.heappop(self._heap)
+            popped.append(self._entries.pop(reminder_id))
+        return popped
+
+    def _drop_stale(self):
+        # Entries superseded by a later push for the same reminder
+        while self._heap:
+            due_at, reminder_id = self._heap[0]
+            entry = self._entries.get(reminder_id)
+            if entry is not None and entry["due_at"] == due_at:
+                return
+            heapq.heappop(self._heap)
+
+
+async def run_reminder_loop():
+    """Advance reminders whose grace period has passed and expire finished courses"""
+    grace = timedelta(minutes=DOSE_REMINDER_GRACE_MINUTES)
+    heap = ReminderHeap()
+    loaded_until = None
+    while True:
+        try:
+            now = datetime.utcnow()
+            cutoff = now - grace
+            if loaded_until is None or loaded_until <= cutoff + LOAD_WINDOW / 2:
+                # Refill the heap with reminders whose grace ends within the window
+                loaded_until = cutoff + LOAD_WINDOW
+                for reminder in await load_due_reminders(loaded_until):
+                    heap.push(reminder)
+
+            stale = heap.pop_until(cutoff)
+            if stale:
+                await _apply(stale, now)
+                if len(stale) >= LOAD_BATCH:
+                    loaded_until = None
+                continue
+
+            next_time = heap.peek_time()
+            sleep_for = IDLE_SLEEP_SECONDS
+            if next_time is not None:
+                sleep_for = min(sleep_for, max(1.0, (next_time + grace - now).total_seconds()))
+            await asyncio.sleep(sleep_for)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Reminder loop failed: {e}")
+            await asyncio.sleep(IDLE_SLEEP_SECONDS)
@@ -0,0 +1,319 @@
+"""
+Storage access per aggregate: users, readings, lab reports, drugs, images
+and analyses.
+
+Routes and services talk to a repository instead of issuing Motor calls
+on collections. Each repository here runs the same queries the routes
+used to. memory_repositories.py has in-memory twins with matching
+semantics (upserts, array pushes/pulls, drug-list pipelines, pre/post
+images). Set REPOSITORY_BACKEND=memory to run the API without a Mongo
+server, e.g. for api_benchmark.py.
+
+Documents created here are stamped with the current schema version, and
+documents read are upgraded lazily if an older version is still stored
+(see migrations.py).
+
+Counters, dose reminders, sessions, rate limits and search stay on Motor:
+they depend on Mongo features (aggregation, TTL indexes, $text) with no
+meaningful in-memory equivalent.
+"""
+import sys
+from typing import List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from config import REPOSITORY_BACKEND
+from database import (
+    get_users_collection,
+    get_user_readings_collection,
+    get_lab_reports_collection,
+    get_user_drug_collection,
+    get_image_collection,
+    get_gemini_response_collection,
+)
+from read_routing import routed_read, READINGS, LAB_REPORTS, DRUGS, IMAGES
+from migrations import stamp, upgrade_document, CURRENT_VERSIONS
+
+READING_LISTS = ("blood_pressure_readings", "glucose_readings")
+DRUG_LISTS = ("all_drugs", "active_drugs")
+# Image upload states that still wait on an analysis
+PROCESSING_STATUSES = ["pending", "processing"]
+
+
+def drug_matches(entry: dict, drug: dict) -> bool:
+    """Whether a stored drug entry is the given keyed drug (legacy entries by name+dosage)"""
+    if "drug_key" in entry:
+        return entry["drug_key"] == drug["drug_key"]
+    return entry.get("drug_name") == drug["drug_name"] and entry.get("dosage") == drug["dosage"]
+
+
+class UsersRepository:
+    async def find_by_email(self, user_email: str) -> Optional[dict]:
+        return await get_users_collection().find_one({"user_email": user_email})
+
+    async def find_by_id(self, user_id: str) -> Optional[dict]:
+        return await get_users_collection().find_one({"user_id": user_id})
+
+    async def insert(self, user_doc: dict):
+        await get_users_collection().insert_one(user_doc)
+
+    async def replace_password_hash(self, user_id: str, old_hash: str, new_hash: str) -> bool:
+        """Swap the stored hash, only if it is still old_hash"""
+        result = await get_users_collection().update_one(
+            {"user_id": user_id, "password": old_hash},
+            {"$set": {"password": new_hash}},
+        )
+        return result.modified_count > 0
+
+
+class ReadingsRepository:
+    async def get(self, user_id: str) -> Optional[dict]:
+        async with routed_read(get_user_readings_collection(), READINGS) as (collection, session):
+            doc = await collection.find_one({"user_id": user_id}, session=session)
+        return upgrade_document("user_readings", doc)
+
+    async def push(self, user_id: str, readings: dict):
+        """Append one reading per list ({list name: reading}), creating the document if needed"""
+        update = {"$push": readings}
+        set_on_insert = {field: [] for field in READING_LISTS if field not in readings}
+        update["$setOnInsert"] = stamp("user_readings", set_on_insert)
+        await get_user_readings_collection().update_one({"user_id": user_id}, update, upsert=True)
+
+    async def pull_by_date(self, user_id: str, field: str, date) -> bool:
+        """Remove the readings of a list taken at date. Returns whether any were removed."""
+        result = await get_user_readings_collection().update_one(
+            {"user_id": user_id},
+            {"$pull": {field: {"date": {"$eq": date}}}},
+        )
+        return result.modified_count > 0
+
+
+class LabReportsRepository:
+    async def insert(self, doc: dict) -> dict:
+        """Insert a report; doc gains its generated _id"""
+        await get_lab_reports_collection().insert_one(stamp("lab_reports", doc))
+        return doc
+
+    async def list(self, limit: int = 1000) -> List[dict]:
+        async with routed_read(get_lab_reports_collection(), LAB_REPORTS) as (collection, session):
+            # Insertion order, read through the _id index
+            reports = await collection.find(session=session).sort("_id", 1).to_list(limit)
+        return [upgrade_document("lab_reports", report) for report in reports]
+
+    async def get(self, report_id: ObjectId) -> Optional[dict]:
+        report = await get_lab_reports_collection().find_one({"_id": report_id})
+        return upgrade_document("lab_reports", report)
+
+    async def update(self, report_id: ObjectId, fields: dict) -> Optional[dict]:
+        """Set fields; returns the updated report, or None if it does not exist"""
+        report = await get_lab_reports_collection().find_one_and_update(
+            {"_id": report_id},
+            {"$set": fields},
+            return_document=ReturnDocument.AFTER,
+        )
+        return upgrade_document("lab_reports", report)
+
+    async def delete(self, report_id: ObjectId) -> Optional[dict]:
+        """Delete a report; returns its _id and user_id, or None if it did not exist"""
+        return await get_lab_reports_collection().find_one_and_delete(
+            {"_id": report_id}, projection={"user_id": 1}
+        )
+
+
+def _element_query(drug: dict) -> dict:
+    """Array element condition for a drug: by key, or by name+dosage for legacy entries"""
+    return {"$or": [
+        {"drug_key": drug["drug_key"]},
+        {"drug_key": {"$exists": False}, "drug_name": drug["drug_name"], "dosage": drug["dosage"]},
+    ]}
+
+
+def _element_expr(drug: dict) -> dict:
+    """Aggregation expression form of _element_query, evaluated on $$this"""
+    return {"$or": [
+        {"$eq": ["$$this.drug_key", {"$literal": drug["drug_key"]}]},
+        {"$and": [
+            {"$eq": [{"$type": "$$this.drug_key"}, "missing"]},
+            {"$eq": ["$$this.drug_name", {"$literal": drug["drug_name"]}]},
+            {"$eq": ["$$this.dosage", {"$literal": drug["dosage"]}]},
+        ]},
+    ]}
+
+
+def _append_missing(field: str, drugs: List[dict]) -> dict:
+    """Pipeline expression appending the drugs whose key is not yet in field"""
+    existing = {"$ifNull": [f"${field}", []]}
+    return {"$concatArrays": [
+        existing,
+        {"$filter": {
+            "input": {"$literal": drugs},
+            "cond": {"$not": [{"$in": ["$$this.drug_key", {"$ifNull": [f"${field}.drug_key", []]}]}]},
+        }},
+    ]}
+
+
+class DrugsRepository:
+    """A user's all_drugs / active_drugs lists; every mutation is one atomic update"""
+
+    async def add(self, user_id: str, drugs: List[dict], active: bool) -> Optional[dict]:
+        """
+        Append keyed drugs missing from all_drugs (and active_drugs if active),
+        creating the document if needed. Returns the pre-image's
+        all_drugs keys and active_drugs, or None if the document was created.
+        """
+        stage = {"all_drugs": _append_missing("all_drugs", drugs)}
+        if active:
+            stage["active_drugs"] = _append_missing("active_drugs", drugs)
+        else:
+            stage["active_drugs"] = {"$ifNull": ["$active_drugs", []]}
+        # A document without all_drugs has no legacy entries: stamp it current
+        stage["schema_version"] = {"$cond": [
+            {"$eq": [{"$type": "$all_drugs"}, "missing"]},
+            CURRENT_VERSIONS["user_drugs"],
+            "$schema_version",
+        ]}
+        return await get_user_drug_collection().find_one_and_update(
+            {"user_id": user_id},
+            [{"$set": stage}],
+            projection={"_id": 0, "all_drugs.drug_key": 1, "active_drugs": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    async def remove(self, user_id: str, drug: dict) -> Optional[dict]:
+        """Pull a drug from both lists; returns the pre-image, or None if not in all_drugs"""
+        element = _element_query(drug)
+        return await get_user_drug_collection().find_one_and_update(
+            {"user_id": user_id, "all_drugs": {"$elemMatch": element}},
+            {"$pull": {field: element for field in DRUG_LISTS}},
+            projection={"_id": 0, "all_drugs": 1, "active_drugs": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    async def activate(self, user_id: str, drug: dict) -> Optional[List[dict]]:
+        """Copy a drug's all_drugs entry into active_drugs; returns active_drugs after, or None"""
+        element = _element_query(drug)
+        after = await get_user_drug_collection().find_one_and_update(
+            {
+                "user_id": user_id,
+                "all_drugs": {"$elemMatch": element},
+                "active_drugs": {"$not": {"$elemMatch": element}},
+            },
+            [{"$set": {"active_drugs": {"$concatArrays": [
+                {"$ifNull": ["$active_drugs", []]},
+                {"$slice": [{"$filter": {"input": "$all_drugs", "cond": _element_expr(drug)}}, 1]},
+            ]}}}],
+            projection={"_id": 0, "active_drugs": 1, "schema_version": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        return None if after is None else upgrade_document("user_drugs", after).get("active_drugs", [])
+
+    async def deactivate(self, user_id: str, drug: dict) -> bool:
+        """Pull a drug from active_drugs. Returns whether it was active."""
+        element = _element_query(drug)
+        result = await get_user_drug_collection().update_one(
+            {"user_id": user_id, "active_drugs": {"$elemMatch": element}},
+            {"$pull": {"active_drugs": element}},
+        )
+        return result.matched_count > 0
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        """Both lists, read from the primary (for decisions after a write)"""
+        doc = await get_user_drug_collection().find_one(
+            {"user_id": user_id}, {"_id": 0, "all_drugs": 1, "active_drugs": 1, "schema_version": 1}
+        )
+        return upgrade_document("user_drugs", doc)
+
+    async def get_list(self, user_id: str, field: str) -> List[dict]:
+        async with routed_read(get_user_drug_collection(), DRUGS) as (collection, session):
+            doc = await collection.find_one(
+                {"user_id": user_id}, {"_id": 0, field: 1, "schema_version": 1}, session=session
+            )
+        return upgrade_document("user_drugs", doc or {}).get(field, [])
+
+
+def image_document(doc: dict) -> dict:
+    """New upload or analysis record: keyed by its image id, under both _id and image_id"""
+    image_id = doc.get("image_id") or doc["_id"]
+    doc.setdefault("_id", image_id)
+    doc.setdefault("image_id", image_id)
+    return stamp("image_uploads", doc)
+
+
+class ImagesRepository:
+    async def insert(self, doc: dict):
+        await get_image_collection().insert_one(image_document(doc))
+
+    async def update(self, image_id: str, fields: dict):
+        await get_image_collection().update_one({"_id": image_id}, {"$set": fields})
+
+    async def get(self, image_id: str) -> Optional[dict]:
+        # Analyses stored before version 1 have an ObjectId _id
+        doc = await get_image_collection().find_one({"$or": [{"_id": image_id}, {"image_id": image_id}]})
+        return upgrade_document("image_uploads", doc)
+
+    async def list(self, skip: int, limit: int) -> List[dict]:
+        """Newest first"""
+        async with routed_read(get_image_collection(), IMAGES) as (collection, session):
+            cursor = collection.find({}, session=session).sort("uploaded_at", -1).skip(skip).limit(limit)
+            docs = await cursor.to_list(length=limit)
+        return [upgrade_document("image_uploads", doc) for doc in docs]
+
+    async def list_all(self, limit: int = 1000) -> List[dict]:
+        """Newest first"""
+        docs = await get_image_collection().find({}).sort("uploaded_at", -1).to_list(length=limit)
+        return [upgrade_document("image_uploads", doc) for doc in docs]
+
+    async def count_processing(self, limit: int) -> int:
+        """Uploads still waiting for analysis, counted up to limit"""
+        return await get_image_collection().count_documents(
+            {"status": {"$in": PROCESSING_STATUSES}}, limit=limit
+        )
+
+
+class AnalysesRepository:
+    async def insert(self, doc: dict):
+        await get_gemini_response_collection().insert_one(doc)
+
+
+_repositories = {}
+
+
+def _repository(name: str):
+    if not _repositories:
+        if REPOSITORY_BACKEND == "memory":
+            import memory_repositories as backend
+        else:
+            backend = sys.modules[__name__]
+        _repositories.update(
+            users=backend.UsersRepository(),
+            readings=backend.ReadingsRepository(),
+            lab_reports=backend.LabReportsRepository(),
+            drugs=backend.DrugsRepository(),
+            images=backend.ImagesRepository(),
+            analyses=backend.AnalysesRepository(),
+        )
+    return _repositories[name]
+
+
+def get_users_repository() -> UsersRepository:
+    return _repository("users")
+
+
+def get_readings_repository() -> ReadingsRepository:
+    return _repository("readings")
+
+
+def get_lab_reports_repository() -> LabReportsRepository:
+    return _repository("lab_reports")
+
+
+def get_drugs_repository() -> DrugsRepository:
+    return _repository("drugs")
+
+
+def get_images_repository() -> ImagesRepository:
+    return _repository("images")
+
+
+def get_analyses_repository() -> AnalysesRepository:
+    return _repository("analyses")
@@ -0,0 +1,42 @@
+"""
+JSON responses serialized with orjson.
+
+For a returned dict or model FastAPI validates the value against
+response_model, walks it with jsonable_encoder, then calls json.dumps.
+For documents read back from our own collections that work is repeated
+on every request, although they were validated on the way in (request
+models, the Gemini response parser). That is the trust boundary. Routes
+that serve stored documents return ``ORJSONResponse(...)`` instead;
+FastAPI sends a returned Response as is. Their response_model stays on
+the decorator for the OpenAPI schema, and ``output_fields`` keeps the
+payload to the keys validation would have produced.
+
+orjson writes datetimes itself (ISO 8601, the same as isoformat()) and
+``_default`` turns ObjectIds into their hex string, so routes no longer
+convert either in Python loops. ORJSONResponse is also the app's
+default response class, so routes that still return plain values get
+the faster dump too.
+
+``python serialization_benchmark.py`` compares both paths per endpoint.
+"""
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    """FastAPI's ORJSONResponse, plus ObjectId"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default)
+
+
+def output_fields(model) -> tuple:
+    """Top-level keys response_model validation emits for model, in order"""
+    return tuple(field.alias or name for name, field in model.model_fields.items())
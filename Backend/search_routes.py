@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Query
+from search_service import search
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+
+@router.get("/", response_model=dict)
+async def search_records(
+    q: str = Query(..., min_length=1, max_length=200, description="Search text"),
+    user_id: str = Query(..., description="User ID"),
+    limit: int = Query(20, ge=1, le=100, description="Max results to return"),
+):
+    """
+    Search a user's lab reports (title, description, diagnosis, medications)
+    and report analyses (diagnosis, complaints, prescriptions, advice).
+
+    Results are ranked by text score and include highlighted snippets.
+    """
+    logger.info(f"Search for user {user_id}: {q!r}")
+    try:
+        return await search(user_id, q, limit)
+    except Exception as e:
+        logger.error(f"Search failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
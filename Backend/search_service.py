@@ -0,0 +1,147 @@
+"""
+Full-text search over a user's lab reports and report analyses.
+
+Both collections carry a compound text index prefixed by ``user_id``. A
+$text query with an equality on user_id therefore only touches that user's
+index entries, so latency depends on the size of one user's history, not on
+the size of the collection.
+"""
+import asyncio
+import re
+import time
+import logging
+from typing import List
+from database import get_lab_reports_collection, get_gemini_response_collection
+
+logger = logging.getLogger(__name__)
+
+# Searched fields and their text index weights
+LAB_REPORT_SEARCH_FIELDS = {
+    "basicInfo.title": 10,
+    "additionalInfo.diagnosis": 5,
+    "additionalInfo.medications": 5,
+    "basicInfo.description": 2,
+}
+
+ANALYSIS_SEARCH_FIELDS = {
+    "data.diagnosis": 10,
+    "data.prescriptions.drug_name": 5,
+    "data.complaints": 3,
+    "data.advice": 1,
+}
+
+SNIPPET_CONTEXT = 40
+MAX_HIGHLIGHTS = 3
+
+
+def text_index(fields: dict):
+    """Keys and options of a user-scoped text index (see indexes.py)"""
+    keys = [("user_id", 1)] + [(field, "text") for field in fields]
+    return keys, {"weights": fields, "name": "user_text_search"}
+
+
+def _field_values(doc, path: str) -> List[str]:
+    """Collect the string values at a dotted path, descending into lists"""
+    values = [doc]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, list):
+                value = [v.get(part) for v in value if isinstance(v, dict)]
+                next_values.extend(value)
+            elif isinstance(value, dict) and part in value:
+                next_values.append(value[part])
+        values = next_values
+    strings = []
+    for value in values:
+        if isinstance(value, list):
+            strings.extend(v for v in value if isinstance(v, str))
+        elif isinstance(value, str):
+            strings.append(value)
+    return strings
+
+
+def query_terms(query: str) -> List[str]:
+    """Words of a search query, ignoring $text negations"""
+    return [
+        term.lower()
+        for term in re.findall(r'-?[\w/]+', query)
+        if not term.startswith("-")
+    ]
+
+
+def highlight(doc: dict, fields: dict, terms: List[str]) -> List[dict]:
+    """Snippets around the first match of any term in each searched field"""
+    if not terms:
+        return []
+    # Prefix match approximates the stemming done by the text index
+    pattern = re.compile(
+        r"\b(" + "|".join(re.escape(t) for t in terms) + r")\w*", re.IGNORECASE
+    )
+    highlights = []
+    for field in fields:
+        for text in _field_values(doc, field):
+            match = pattern.search(text)
+            if not match:
+                continue
+            start = max(0, match.start() - SNIPPET_CONTEXT)
+            end = min(len(text), match.end() + SNIPPET_CONTEXT)
+            snippet = pattern.sub(lambda m: f"<em>{m.group(0)}</em>", text[start:end])
+            highlights.append({
+                "field": field,
+                "snippet": ("…" if start else "") + snippet + ("…" if end < len(text) else ""),
+            })
+            break
+        if len(highlights) >= MAX_HIGHLIGHTS:
+            break
+    return highlights
+
+
+async def _search_collection(collection, fields: dict, user_id: str, query: str, limit: int, extra_fields=()):
+    # Only the searched fields are needed for titles and highlights
+    projection = {"score": {"$meta": "textScore"}}
+    projection.update({field: 1 for field in (*fields, *extra_fields)})
+    cursor = (
+        collection.find({"user_id": user_id, "$text": {"$search": query}}, projection)
+        .sort([("score", {"$meta": "textScore"})])
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
+
+
+async def search(user_id: str, query: str, limit: int = 20) -> dict:
+    """Ranked, user-scoped search across lab reports and report analyses"""
+    started = time.perf_counter()
+    lab_reports, analyses = await asyncio.gather(
+        _search_collection(get_lab_reports_collection(), LAB_REPORT_SEARCH_FIELDS, user_id, query, limit),
+        _search_collection(
+            get_gemini_response_collection(), ANALYSIS_SEARCH_FIELDS, user_id, query, limit,
+            extra_fields=("data.report_type",),
+        ),
+    )
+    terms = query_terms(query)
+
+    results = []
+    for doc in lab_reports:
+        results.append({
+            "type": "lab_report",
+            "id": str(doc["_id"]),
+            "title": (doc.get("basicInfo") or {}).get("title"),
+            "score": doc["score"],
+            "highlights": highlight(doc, LAB_REPORT_SEARCH_FIELDS, terms),
+        })
+    for doc in analyses:
+        data = doc.get("data") or {}
+        results.append({
+            "type": "report_analysis",
+            "id": str(doc["_id"]),
+            "title": data.get("diagnosis") or data.get("report_type"),
+            "score": doc["score"],
+            "highlights": highlight(doc, ANALYSIS_SEARCH_FIELDS, terms),
+        })
+    results.sort(key=lambda r: r["score"], reverse=True)
+    results = results[:limit]
+
+    took_ms = round((time.perf_counter() - started) * 1000, 2)
+    logger.info(f"Search for user {user_id} returned {len(results)} results in {took_ms} ms")
+    return {"query": query, "took_ms": took_ms, "total": len(results), "results": results}
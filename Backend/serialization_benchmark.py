@@ -0,0 +1,212 @@
+"""
+Serialization cost of the large read endpoints, in CPU ms per MB of body.
+
+Each endpoint's stored documents (in-memory repositories) are turned
+into a response body two ways:
+- before: the route's old conversion loop, then FastAPI's own
+  serialize_response (response_model validation and jsonable_encoder)
+  and a stdlib json JSONResponse;
+- after: what the route does now, an ORJSONResponse of the documents.
+The documents are fetched outside the timed part, so only serialization
+is measured. Before timing, every endpoint is also requested through the
+app, and its body must decode to the same JSON as the old path.
+
+    python serialization_benchmark.py [rounds]
+"""
+import os
+
+os.environ["REPOSITORY_BACKEND"] = "memory"
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+os.environ.setdefault("GEMINI_WARM_UP", "False")
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+import httpx
+from fastapi.routing import serialize_response
+from starlette.responses import JSONResponse
+from main import app
+from api_benchmark import LAB_REPORT
+from image_service import ImageUploadService
+from lab_reports_routes import LabReport, build_lab_report_doc, lab_report_out
+from repositories import get_images_repository, get_lab_reports_repository, get_readings_repository
+from responses import ORJSONResponse
+
+IMAGES = 300
+LAB_REPORTS = 1000
+READINGS = 100
+USER = "bench-user"
+
+# A full Gemini extraction, as stored in analysis_result
+ANALYSIS = {
+    "report_type": "prescription",
+    "date": "19/05/2024",
+    "visit_no": "2",
+    "doctor": {"name": "Dr Mohammad Anisur Rahman"},
+    "patient": {"name": "Mr Fahim", "age": "22", "sex": "M", "weight": "78"},
+    "allergies": ["Penicillin", "Dust mites"],
+    "past_medical_history": ["Appendectomy (2018)", "Hypertension"],
+    "lab_results": {
+        "CBC": {"WBC": "6.2 x10^3/µL", "Hb": "13.5 g/dL", "Platelets": "250 x10^3/µL"},
+        "CRP": "4 mg/L",
+    },
+    "diagnosis": "A PLID, L-5-S1 with canal stenosis",
+    "complaints": ["LBP RRLL", "NO COMORBIDITY", "H/O Blunt trauma"],
+    "examination": {
+        "BP": "120/70 mmHg",
+        "Pulse": "78 b/min",
+        "SLR": "RT-40, Lt-20",
+        "FABER": "-",
+        "FAIR": "-",
+        "Axial Tenderness": "LS-S1",
+    },
+    "plan": ["Fluroscopic Intervention 30", "SURGERY"],
+    "prescriptions": [
+        {"drug_name": f"TAB MIRALIN {i + 5}MG", "dosage": "1+0+1", "instructions": "After food", "duration": "8 months"}
+        for i in range(4)
+    ],
+    "advice": [
+        "Use high commode.",
+        "Sleep on a firm bed.",
+        "Apply cold compress for 20 minutes in the morning and evening for the next 3 days, then apply warm compress.",
+    ],
+    "next_appointment": "1 month later",
+    "contact": {
+        "phone_numbers": ["01799942792"],
+        "address": "House # 35. Road #17, Flat # 3/A (opposite banani kachabazar), Banani, Dhaka",
+    },
+}
+
+
+async def _seed():
+    now = datetime.utcnow()
+    images = get_images_repository()
+    for i in range(IMAGES):
+        await images.insert({
+            "_id": f"image-{i}",
+            "user_id": USER,
+            "original_filename": f"prescription-{i}.jpg",
+            "file_path": f"uploads/image-{i}.jpg",
+            "uploaded_at": now - timedelta(minutes=i),
+            "status": "completed",
+            "analysis_result": ANALYSIS,
+            "completed_at": now - timedelta(minutes=i) + timedelta(seconds=12),
+        })
+    lab_reports = get_lab_reports_repository()
+    for _ in range(LAB_REPORTS):
+        await lab_reports.insert(build_lab_report_doc(LabReport(**LAB_REPORT), USER))
+    readings = get_readings_repository()
+    for i in range(READINGS):
+        date = now - timedelta(hours=i)
+        await readings.push(USER, {
+            "blood_pressure_readings": {"value": {"systolic": 120 + i % 15, "diastolic": 80}, "date": date},
+            "glucose_readings": {"value": 5.4 + i % 7 / 10, "date": date},
+        })
+
+
+# The routes' conversion code before the fast path
+
+def _old_images_all(docs):
+    for doc in docs:
+        if "_id" in doc:
+            doc["_id"] = str(doc["_id"])
+        for dt_field in ["uploaded_at", "completed_at"]:
+            if dt_field in doc and doc[dt_field]:
+                doc[dt_field] = doc[dt_field].isoformat()
+    return {"images": docs}
+
+
+def _old_lab_reports(reports):
+    for report in reports:
+        if "_id" in report:
+            report["_id"] = str(report["_id"])
+    return reports
+
+
+def _old_readings(doc):
+    doc["_id"] = str(doc["_id"])
+    for field in ("blood_pressure_readings", "glucose_readings"):
+        doc[field] = doc[field][:READINGS]
+        for reading in doc[field]:
+            reading["date"] = reading["date"].isoformat()
+    return doc
+
+
+def _new_readings(doc):
+    for field in ("blood_pressure_readings", "glucose_readings"):
+        doc[field] = doc[field][:READINGS]
+    return doc
+
+
+async def _images_page():
+    return await ImageUploadService().list_images(100, 0)
+
+
+# path: (fetch stored documents, old conversion, new conversion)
+ENDPOINTS = {
+    "/api/images/all": (
+        lambda: get_images_repository().list_all(1000), _old_images_all, lambda docs: {"images": docs},
+    ),
+    "/api/images": (_images_page, lambda images: images, lambda images: images),
+    "/lab-reports/": (
+        lambda: get_lab_reports_repository().list(1000), _old_lab_reports,
+        lambda reports: [lab_report_out(r) for r in reports],
+    ),
+    "/api/readings/": (
+        lambda: get_readings_repository().get(USER), _old_readings, _new_readings,
+    ),
+}
+PARAMS = {"/api/images": {"limit": 100}, "/api/readings/": {"user_id": USER, "limit": READINGS}}
+
+
+def _route(path: str):
+    return next(r for r in app.routes if getattr(r, "path", None) == path and "GET" in r.methods)
+
+
+async def _old_body(path: str, docs) -> bytes:
+    content = await serialize_response(field=_route(path).response_field, response_content=ENDPOINTS[path][1](docs))
+    return JSONResponse(content).body
+
+
+async def _new_body(path: str, docs) -> bytes:
+    return ORJSONResponse(ENDPOINTS[path][2](docs)).body
+
+
+async def _cpu_ms_per_mb(path: str, body, rounds: int):
+    fetch = ENDPOINTS[path][0]
+    cpu, size = 0.0, 0
+    for _ in range(rounds):
+        docs = await fetch()
+        started = time.process_time()
+        size += len(await body(path, docs))
+        cpu += time.process_time() - started
+    return cpu * 1000 / (size / 1e6), size / rounds / 1e6
+
+
+async def main(rounds: int):
+    async with app.router.lifespan_context(app):
+        await _seed()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for path in ENDPOINTS:
+                response = await client.get(path, params=PARAMS.get(path))
+                assert response.status_code == 200, (path, response.status_code, response.text)
+                expected = json.loads(await _old_body(path, await ENDPOINTS[path][0]()))
+                assert response.json() == expected, f"{path} differs from the old serialization"
+
+        print(f"{'endpoint':18} {'body MB':>8} {'before ms/MB':>13} {'after ms/MB':>12} {'speedup':>8}")
+        for path in ENDPOINTS:
+            before, size = await _cpu_ms_per_mb(path, _old_body, rounds)
+            after, _ = await _cpu_ms_per_mb(path, _new_body, rounds)
+            print(f"{path:18} {size:8.3f} {before:13.1f} {after:12.1f} {before / after:7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response serialization CPU per MB")
+    parser.add_argument("rounds", nargs="?", type=int, default=20, help="bodies built per endpoint and path")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(main(args.rounds))
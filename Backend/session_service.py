@@ -0,0 +1,295 @@
+"""Login sessions: short-lived access tokens, rotating refresh tokens and a revocation list"""
+import asyncio
+import hashlib
+import logging
+import math
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import jwt
+from cachetools import LRUCache
+from pymongo import UpdateOne
+from config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    REFRESH_TOKEN_EXPIRE_DAYS,
+    REFRESH_REUSE_GRACE_SECONDS,
+    REVOCATION_FILTER_CAPACITY,
+)
+from database import get_sessions_collection, get_revoked_tokens_collection
+
+logger = logging.getLogger(__name__)
+
+# Access-token ids remembered per session, so logout can revoke them all
+ACCESS_JTI_HISTORY = 20
+# Replaced refresh-token hashes remembered per session, for reuse detection
+REFRESH_HASH_HISTORY = 10
+FILTER_REBUILD_INTERVAL = timedelta(hours=1)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (no false negatives)"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+
+class RevocationList:
+    """Revoked access-token ids: a Bloom filter in front of ``revoked_tokens``"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._filter = BloomFilter(capacity)
+        # Filter hits that Mongo said were not revoked
+        self._confirmed_clean = LRUCache(maxsize=10_000)
+        self._synced_at: Optional[datetime] = None
+        self._built_at: Optional[datetime] = None
+        self.checks = 0
+        self.db_lookups = 0
+        self.false_positives = 0
+
+    def add(self, jti: str):
+        self._filter.add(jti)
+        self._confirmed_clean.pop(jti, None)
+
+    async def is_revoked(self, jti: str) -> bool:
+        self.checks += 1
+        if jti not in self._filter or jti in self._confirmed_clean:
+            return False
+        self.db_lookups += 1
+        try:
+            revoked = await get_revoked_tokens_collection().find_one({"_id": jti}, {"_id": 1})
+        except Exception as e:
+            logger.error(f"Revocation lookup failed for a filtered token: {e}")
+            return True
+        if revoked is None:
+            self.false_positives += 1
+            self._confirmed_clean[jti] = True
+            return False
+        return True
+
+    async def sync(self):
+        """Pull revocations made since the last sync, rebuilding the filter when stale"""
+        now = datetime.utcnow()
+        collection = get_revoked_tokens_collection()
+        if (
+            self._built_at is None
+            or now - self._built_at > FILTER_REBUILD_INTERVAL
+            or self._filter.count > self.capacity
+        ):
+            # Bloom filters cannot delete: rebuild from unexpired revocations
+            rebuilt = BloomFilter(max(self.capacity, self._filter.count))
+            async for doc in collection.find({"expires_at": {"$gt": now}}, {"_id": 1}):
+                rebuilt.add(doc["_id"])
+            self._filter = rebuilt
+            self._built_at = now
+            self._synced_at = now
+            self._confirmed_clean.clear()
+            logger.info(f"Rebuilt revocation filter with {rebuilt.count} token ids")
+            # Pick up anything revoked while the rebuild query ran
+            now = datetime.utcnow()
+
+        async for doc in collection.find({"revoked_at": {"$gte": self._synced_at}}, {"_id": 1}):
+            self.add(doc["_id"])
+        self._synced_at = now
+
+    def stats(self) -> dict:
+        return {
+            "filter_entries": self._filter.count,
+            "filter_bits": self._filter.size,
+            "filter_hashes": self._filter.hashes,
+            "checks": self.checks,
+            "db_lookups": self.db_lookups,
+            "false_positives": self.false_positives,
+        }
+
+
+revocations = RevocationList(REVOCATION_FILTER_CAPACITY)
+
+
+async def run_revocation_sync_loop(interval_seconds: int):
+    """Load the revocation filter on startup and keep it in sync"""
+    while True:
+        try:
+            await revocations.sync()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Revocation filter sync failed: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+def _hash_refresh_token(refresh_token: str) -> str:
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+def _new_refresh_token(session_id: str) -> str:
+    return f"{session_id}.{secrets.token_urlsafe(32)}"
+
+
+def create_access_token(user_id: str, session_id: str, jti: Optional[str] = None) -> Tuple[str, str]:
+    """Signed short-lived access token and its jti"""
+    jti = jti or uuid.uuid4().hex
+    now = datetime.utcnow()
+    payload = {
+        "sub": user_id,
+        "sid": session_id,
+        "jti": jti,
+        "iat": now,
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM), jti
+
+
+async def create_session(user_id: str) -> Tuple[str, str]:
+    """Start a session for a user. Returns (access token, refresh token)."""
+    session_id = uuid.uuid4().hex
+    access_token, jti = create_access_token(user_id, session_id)
+    refresh_token = _new_refresh_token(session_id)
+    now = datetime.utcnow()
+    await get_sessions_collection().insert_one(
+        {
+            "_id": session_id,
+            "user_id": user_id,
+            "refresh_hash": _hash_refresh_token(refresh_token),
+            "access_jtis": [jti],
+            "created_at": now,
+            "last_used_at": now,
+            "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+            "revoked_at": None,
+        }
+    )
+    return access_token, refresh_token
+
+
+async def rotate_session(refresh_token: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """
+    Exchange a refresh token for new tokens.
+    Returns (user_id, access token, refresh token), or None if the token is not valid.
+    The refresh token is None when the one presented was replaced within the
+    grace window: the caller keeps the newer one it already holds.
+    """
+    session_id, _, _ = refresh_token.partition(".")
+    old_hash = _hash_refresh_token(refresh_token)
+    new_refresh_token = _new_refresh_token(session_id)
+    jti = uuid.uuid4().hex
+    collection = get_sessions_collection()
+    now = datetime.utcnow()
+    live = {"_id": session_id, "revoked_at": None, "expires_at": {"$gt": now}}
+
+    session = await collection.find_one_and_update(
+        {**live, "refresh_hash": old_hash},
+        {
+            "$set": {
+                "refresh_hash": _hash_refresh_token(new_refresh_token),
+                "rotated_from": old_hash,
+                "rotated_at": now,
+                "last_used_at": now,
+            },
+            "$push": {
+                "access_jtis": {"$each": [jti], "$slice": -ACCESS_JTI_HISTORY},
+                "previous_refresh_hashes": {"$each": [old_hash], "$slice": -REFRESH_HASH_HISTORY},
+            },
+        },
+        projection={"user_id": 1},
+    )
+    if session is not None:
+        access_token, _ = create_access_token(session["user_id"], session_id, jti)
+        return session["user_id"], access_token, new_refresh_token
+
+    # Concurrent refreshes from one client send the same token; the losers
+    # get an access token, not a reuse verdict
+    session = await collection.find_one_and_update(
+        {
+            **live,
+            "rotated_from": old_hash,
+            "rotated_at": {"$gt": now - timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS)},
+        },
+        {
+            "$set": {"last_used_at": now},
+            "$push": {"access_jtis": {"$each": [jti], "$slice": -ACCESS_JTI_HISTORY}},
+        },
+        projection={"user_id": 1},
+    )
+    if session is not None:
+        access_token, _ = create_access_token(session["user_id"], session_id, jti)
+        return session["user_id"], access_token, None
+
+    # A rotated refresh token coming back later means it was copied: end the
+    # session. Any other mismatch is only an invalid token, since session ids
+    # are not secret and a forged "<sid>.garbage" must not end the session.
+    stale = await collection.find_one(
+        {"_id": session_id, "revoked_at": None, "previous_refresh_hashes": old_hash}, {"_id": 1}
+    )
+    if stale is not None:
+        logger.warning(f"Refresh token reuse detected, revoking session {session_id}")
+        await revoke_session(session_id)
+    return None
+
+
+async def revoke_session(session_id: str, user_id: Optional[str] = None) -> bool:
+    """Revoke a session and every access token it issued"""
+    query = {"_id": session_id, "revoked_at": None}
+    if user_id is not None:
+        query["user_id"] = user_id
+    now = datetime.utcnow()
+    session = await get_sessions_collection().find_one_and_update(
+        query, {"$set": {"revoked_at": now}}
+    )
+    if session is None:
+        return False
+
+    # No issued access token outlives this, so the TTL index can drop the entries then
+    expires_at = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    jtis = session.get("access_jtis", [])
+    ops = [
+        UpdateOne(
+            {"_id": jti},
+            {"$setOnInsert": {
+                "user_id": session["user_id"],
+                "session_id": session_id,
+                "revoked_at": now,
+                "expires_at": expires_at,
+            }},
+            upsert=True,
+        )
+        for jti in jtis
+    ]
+    if ops:
+        await get_revoked_tokens_collection().bulk_write(ops, ordered=False)
+    for jti in jtis:
+        revocations.add(jti)
+    return True
+
+
+async def revoke_refresh_token(refresh_token: str) -> bool:
+    """Revoke the session a refresh token belongs to (the token must be current)"""
+    session_id, _, _ = refresh_token.partition(".")
+    session = await get_sessions_collection().find_one(
+        {"_id": session_id, "refresh_hash": _hash_refresh_token(refresh_token)},
+        {"user_id": 1},
+    )
+    if session is None:
+        return False
+    return await revoke_session(session_id)
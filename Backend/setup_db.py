@@ -1,22 +1,19 @@
 """
 Database setup script to create indexes for better performance
 Run this script once to set up the database indexes
+(the app also applies them at startup; the specification lives in indexes.py)
 """
 import asyncio
-from database import connect_to_mongo, get_users_collection, close_mongo_connection
+from database import connect_to_mongo, close_mongo_connection, get_database
+from indexes import ensure_indexes
 
 async def create_indexes():
     """Create database indexes"""
     await connect_to_mongo()
     
-    user_collection = get_users_collection()
-    
-    # Create unique indexes for email and username
-    await user_collection.create_index("email", unique=True)
-    await user_collection.create_index("username", unique=True)
-    
-    # Create index for created_at for sorting
-    await user_collection.create_index("created_at")
+    reports = await ensure_indexes(get_database())
+    for name, report in reports.items():
+        print(f"{name}: {report}")
     
     print("Database indexes created successfully!")
     
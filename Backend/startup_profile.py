@@ -0,0 +1,125 @@
+"""
+Cold-start profile and budget check.
+
+Starts fresh interpreters to measure, as a scale-to-zero container would
+see them:
+- interpreter startup;
+- ``import main``;
+- lifespan startup, up to the point where the app serves requests.
+
+It also prints the slowest imports from ``python -X importtime``.
+
+    python startup_profile.py                 # report, exit 1 if over 1500 ms
+    python startup_profile.py --budget-ms 0   # report only
+
+Without MONGODB_URI the lifespan runs with REPOSITORY_BACKEND=memory, so
+the numbers leave out the Mongo connection and index checks. Password
+hash calibration runs unless PASSWORD_HASH_ROUNDS is pinned, as it would
+in production.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Cold start budget for one worker (import + lifespan startup)
+DEFAULT_BUDGET_MS = 1500
+
+_CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def start():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(start())
+print(json.dumps({"import_ms": (imported - started) * 1000, "startup_ms": (ready - imported) * 1000}))
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    if not env.get("MONGODB_URI"):
+        env.setdefault("REPOSITORY_BACKEND", "memory")
+    return env
+
+
+def _run(args, **kwargs) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=HERE, env=_env(), capture_output=True, text=True, check=True, **kwargs
+    )
+
+
+def interpreter_ms(runs: int) -> float:
+    """Median wall time of starting and exiting a bare interpreter"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        _run(["-c", "pass"])
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+def cold_starts(runs: int) -> dict:
+    """Median import and lifespan startup times over fresh processes"""
+    samples = [json.loads(_run(["-c", _CHILD]).stdout.strip().splitlines()[-1]) for _ in range(runs)]
+    imports = [s["import_ms"] for s in samples]
+    startups = [s["startup_ms"] for s in samples]
+    totals = [i + s for i, s in zip(imports, startups)]
+    return {
+        "import_ms": round(statistics.median(imports), 1),
+        "startup_ms": round(statistics.median(startups), 1),
+        "total_ms": round(statistics.median(totals), 1),
+        "max_total_ms": round(max(totals), 1),
+    }
+
+
+def slowest_imports(top: int) -> list:
+    """(cumulative ms, self ms, module) of main and its slowest direct imports"""
+    err = _run(["-X", "importtime", "-c", "import main"]).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0 and name.strip() != "main":
+            # Interpreter startup imports (site, encodings, ...), not main's
+            rows = []
+            continue
+        if depth <= 1:
+            rows.append((int(cumulative_us) / 1000, int(self_us) / 1000, name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="fail if median import + startup exceeds this (0 to only report)")
+    args = parser.parse_args(argv)
+
+    print("Slowest imports under main (cumulative / self ms):")
+    for cumulative, self_ms, name in slowest_imports(args.top):
+        print(f"  {cumulative:8.1f} {self_ms:8.1f}  {name}")
+
+    print(f"Interpreter startup: {interpreter_ms(args.runs)} ms")
+    result = cold_starts(args.runs)
+    print(f"Cold start over {args.runs} runs: {result}")
+    if args.budget_ms and result["total_ms"] > args.budget_ms:
+        print(f"FAIL: cold start {result['total_ms']} ms exceeds budget {args.budget_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
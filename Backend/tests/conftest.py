@@ -0,0 +1,14 @@
+import os
+import pytest
+
+# The suite runs without Mongo or Gemini: in-memory repositories, a cheap
+# fixed hash cost and a thread pool for hashing
+os.environ["REPOSITORY_BACKEND"] = "memory"
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+os.environ.setdefault("PASSWORD_HASH_EXECUTOR", "thread")
+os.environ.setdefault("GEMINI_WARM_UP", "False")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,146 @@
+"""
+API tests on the in-memory repositories, through httpx's ASGI transport.
+They pin the behaviour memory_repositories.py shares with the Motor ones:
+drug dedupe by identity, reading push/pull and lab report CRUD.
+"""
+import uuid
+import httpx
+import pytest
+from main import app
+
+pytestmark = pytest.mark.anyio
+
+LAB_REPORT = {
+    "basicInfo": {"title": "Checkup", "type": "routine", "description": "Annual"},
+    "healthcareInfo": {"doctorName": "Dr. Rahman", "hospitalName": "City Hospital"},
+    "vitalSigns": {
+        "bloodPressure": "120/80",
+        "heartRate": "72 bpm",
+        "GlucoseLevel": "5.4 mmol/L",
+        "weight": "70 kg",
+    },
+    "additionalInfo": {"medications": "none", "diagnosis": "healthy"},
+}
+
+
+def _drug(name: str, dosage: str = "1+0+1") -> dict:
+    return {"drug_name": name, "dosage": dosage, "instruction": "after meal", "duration": "7 days"}
+
+
+@pytest.fixture
+async def client():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def user_id():
+    return f"test-{uuid.uuid4().hex}"
+
+
+# Drugs
+
+async def test_add_drugs_dedupes_spelling_variants(client, user_id):
+    response = await client.post(
+        f"/user-drugs/all-drugs/{user_id}",
+        json=[_drug("TAB MIRALIN 5MG"), _drug("miralin 5 mg"), _drug("Napa 500mg")],
+    )
+    assert response.json()["message"] == "Added 2 drugs to all_drugs"
+
+    response = await client.post(f"/user-drugs/all-drugs/{user_id}", json=[_drug("Tab. Miralin 5mg")])
+    assert response.json()["message"] == "Added 0 drugs to all_drugs"
+
+    drugs = (await client.get(f"/user-drugs/all-drugs/{user_id}")).json()
+    assert [d["canonical_id"] for d in drugs] == ["miralin", "paracetamol"]
+    assert drugs[0]["drug_name"] == "TAB MIRALIN 5MG"
+    assert drugs[0]["drug_key"] == "miralin|5 mg|1+0+1"
+
+
+async def test_distinct_drugs_are_not_deduped(client, user_id):
+    response = await client.post(
+        f"/user-drugs/all-drugs/{user_id}",
+        json=[_drug("Vitamin D3"), _drug("Vitamin B12"), _drug("Napa"), _drug("Napa Extra")],
+    )
+    assert response.json()["message"] == "Added 4 drugs to all_drugs"
+
+
+async def test_activate_and_remove_drugs(client, user_id):
+    drug = _drug("Napa 500mg")
+    assert (await client.post(f"/user-drugs/active-drugs/{user_id}", json=drug)).status_code == 404
+
+    await client.post(f"/user-drugs/all-drugs/{user_id}", json=[drug])
+    response = await client.post(f"/user-drugs/active-drugs/{user_id}", json=_drug("paracetamol 500 mg"))
+    assert response.status_code == 200
+    response = await client.post(f"/user-drugs/active-drugs/{user_id}", json=drug)
+    assert response.status_code == 400
+    active = (await client.get(f"/user-drugs/active-drugs/{user_id}")).json()
+    assert [d["canonical_id"] for d in active] == ["paracetamol"]
+
+    response = await client.request("DELETE", f"/user-drugs/active-drugs/{user_id}", json=drug)
+    assert response.json()["message"] == "Drug removed from active_drugs"
+    response = await client.request("DELETE", f"/user-drugs/active-drugs/{user_id}", json=drug)
+    assert response.status_code == 404
+    assert (await client.get(f"/user-drugs/active-drugs/{user_id}")).json() == []
+    assert len((await client.get(f"/user-drugs/all-drugs/{user_id}")).json()) == 1
+
+    await client.post(f"/user-drugs/active-drugs/{user_id}", json=drug)
+    response = await client.request("DELETE", f"/user-drugs/all-drugs/{user_id}", json=drug)
+    assert response.json()["message"] == "Removed 1 drugs from all_drugs and 1 from active_drugs"
+    assert (await client.get(f"/user-drugs/all-drugs/{user_id}")).json() == []
+    assert (await client.get(f"/user-drugs/active-drugs/{user_id}")).json() == []
+
+
+# Readings
+
+async def test_push_and_pull_readings(client, user_id):
+    empty = (await client.get("/api/readings/", params={"user_id": user_id})).json()
+    assert empty == {"user_id": user_id, "blood_pressure_readings": [], "glucose_readings": []}
+
+    bp = await client.post(
+        "/api/readings/bp", params={"user_id": user_id}, json={"value": {"systolic": 120, "diastolic": 80}}
+    )
+    for value in (5.4, 6.1):
+        await client.post("/api/readings/glucose", params={"user_id": user_id}, json={"value": value})
+
+    readings = (await client.get("/api/readings/", params={"user_id": user_id})).json()
+    assert [r["value"] for r in readings["blood_pressure_readings"]] == [{"systolic": 120, "diastolic": 80}]
+    assert [r["value"] for r in readings["glucose_readings"]] == [5.4, 6.1]
+    assert isinstance(readings["blood_pressure_readings"][0]["date"], str)
+
+    page = (await client.get("/api/readings/", params={"user_id": user_id, "skip": 1, "limit": 1})).json()
+    assert [r["value"] for r in page["glucose_readings"]] == [6.1]
+
+    reading_id = bp.json()["reading_id"]
+    response = await client.delete(f"/api/readings/bp/{reading_id}", params={"user_id": user_id})
+    assert response.status_code == 200
+    response = await client.delete(f"/api/readings/bp/{reading_id}", params={"user_id": user_id})
+    assert response.status_code == 404
+    readings = (await client.get("/api/readings/", params={"user_id": user_id})).json()
+    assert readings["blood_pressure_readings"] == []
+    assert len(readings["glucose_readings"]) == 2
+
+
+# Lab reports
+
+async def test_lab_report_crud(client, user_id):
+    created = (await client.post("/lab-reports/", params={"user_id": user_id}, json=LAB_REPORT)).json()
+    report_id = created["_id"]
+    assert created["user_id"] == user_id
+    assert created["normalizedVitals"]["bloodPressure"] == {"systolic": 120, "diastolic": 80, "unit": "mmHg"}
+    assert "schema_version" not in created
+
+    assert (await client.get(f"/lab-reports/{report_id}")).json() == created
+    listed = (await client.get("/lab-reports/")).json()
+    assert created in listed
+
+    changed = {**LAB_REPORT, "vitalSigns": {**LAB_REPORT["vitalSigns"], "bloodPressure": "140/90"}}
+    updated = (await client.put(f"/lab-reports/{report_id}", json=changed)).json()
+    assert updated["vitalSigns"]["bloodPressure"] == "140/90"
+    assert updated["normalizedVitals"]["bloodPressure"]["systolic"] == 140
+    assert (await client.get(f"/lab-reports/{report_id}")).json() == updated
+
+    assert (await client.delete(f"/lab-reports/{report_id}")).status_code == 200
+    assert (await client.get(f"/lab-reports/{report_id}")).status_code == 404
+    assert (await client.delete(f"/lab-reports/{report_id}")).status_code == 404
+    assert (await client.put(f"/lab-reports/{report_id}", json=LAB_REPORT)).status_code == 404
@@ -0,0 +1,37 @@
+from datetime import timedelta
+import pytest
+from dose_schedule import parse_dosage, parse_duration
+
+
+@pytest.mark.parametrize("duration, days", [
+    ("8 months", 240),
+    ("14 days", 14),
+    ("10days", 10),
+    ("one month", 30),
+    ("once a day for 2 weeks", 14),
+    ("twice a day for 3 months", 90),
+    ("1 tab a day x 10 days", 10),
+    ("3 times a day for 5 days", 5),
+    ("every 2 days for 10 days", 10),
+    ("for a week", 7),
+])
+def test_course_length(duration, days):
+    assert parse_duration(duration) == timedelta(days=days)
+
+
+@pytest.mark.parametrize("duration", [
+    "continue",
+    "daily",
+    "1 tab a day",
+    "2 weeks then 1 month",
+    "",
+    None,
+])
+def test_no_course_end(duration):
+    assert parse_duration(duration) is None
+
+
+def test_dosage_slots():
+    assert [quantity for _, quantity in parse_dosage("1+0+1")] == [1.0, 1.0]
+    assert [quantity for _, quantity in parse_dosage("½+0+½")] == [0.5, 0.5]
+    assert parse_dosage("as needed") == []
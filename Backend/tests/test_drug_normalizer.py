@@ -0,0 +1,77 @@
+import pytest
+from drug_normalizer import get_normalizer, parse_drug_text
+from interaction_service import check_drugs
+
+
+@pytest.fixture(scope="module")
+def normalizer():
+    return get_normalizer()
+
+
+@pytest.mark.parametrize("text, canonical_id", [
+    ("TAB MIRALIN 5MG", "miralin"),
+    ("Tab. Napa 500", "paracetamol"),
+    ("paracetamol 500mg", "paracetamol"),
+    ("acetylsalicylic acid", "aspirin"),
+    ("hctz", "hydrochlorothiazide"),
+    ("Vitamin D3 1000 IU", "vitamin_d3"),
+    ("Prednisone", "prednisone"),
+])
+def test_exact_names_and_aliases(normalizer, text, canonical_id):
+    result = normalizer.normalize(text)
+    assert result["canonical_id"] == canonical_id
+    assert result["suggestion"] is None
+
+
+@pytest.mark.parametrize("text, canonical_id", [
+    ("amoxicilin 500mg", "amoxicillin"),
+    ("omeprazol", "omeprazole"),
+    ("metformine", "metformin"),
+    ("paracetmol", "paracetamol"),
+    ("atorvastatn", "atorvastatin"),
+    ("predisolone", "prednisolone"),
+    ("ampicilin", "ampicillin"),
+])
+def test_misspellings_are_identified(normalizer, text, canonical_id):
+    result = normalizer.normalize(text)
+    assert result["canonical_id"] == canonical_id
+    assert result["matched"]
+
+
+@pytest.mark.parametrize("text, canonical_id, suggested", [
+    ("Vitamin B12", "vitamin_b12", "vitamin_d3"),
+    ("Vitamin B1", "vitamin_b1", "vitamin_d3"),
+    ("Vitamin B6", "vitamin_b6", "vitamin_d3"),
+    ("Vitamin K2", "vitamin_k2", "vitamin_d3"),
+    ("Levocetirizine", "levocetirizine", "cetirizine"),
+])
+def test_similar_names_are_distinct_drugs(normalizer, text, canonical_id, suggested):
+    result = normalizer.normalize(text)
+    assert result["canonical_id"] == canonical_id
+    assert not result["matched"]
+    assert result["suggestion"]["id"] == suggested
+
+
+@pytest.mark.parametrize("text, canonical_id, ingredients", [
+    ("Napa Extra", "paracetamol_caffeine", ["paracetamol", "caffeine"]),
+    ("Losartan 50mg + HCTZ 12.5mg", "losartan_hydrochlorothiazide", ["losartan", "hydrochlorothiazide"]),
+    ("Amlodipine 5mg + Atorvastatin 10mg", "amlodipine_atorvastatin", ["amlodipine", "atorvastatin"]),
+    ("Napa", "paracetamol", ["paracetamol"]),
+    ("TAB MIRALIN 5MG", "miralin", ["miralin"]),
+])
+def test_combinations_resolve_to_ingredients(normalizer, text, canonical_id, ingredients):
+    result = normalizer.normalize(text)
+    assert result["canonical_id"] == canonical_id
+    assert result["ingredients"] == ingredients
+
+
+def test_combination_interactions_use_ingredients():
+    interactions = check_drugs([{"drug_name": "Losartan 50mg + HCTZ 12.5mg"}, {"drug_name": "Lithium 300mg"}])
+    assert {tuple(i["drugs"]) for i in interactions} == {
+        ("hydrochlorothiazide", "lithium"), ("lithium", "losartan"),
+    }
+
+
+def test_digits_stay_in_the_name():
+    assert parse_drug_text("Vitamin B12 500mcg") == ("vitamin b12", "500 mcg", None)
+    assert parse_drug_text("Losartan 50mg + HCTZ 12.5mg") == ("losartan hctz", "50 mg + 12.5 mg", None)
@@ -0,0 +1,30 @@
+import pytest
+from password_hashing import _hash, _verify, get_password_hash, verify_and_update_password, verify_password
+
+
+def test_hash_round_trip():
+    hashed = _hash("correct horse")
+    assert _verify("correct horse", hashed)
+    assert not _verify("wrong horse", hashed)
+
+
+@pytest.mark.anyio
+async def test_pool_round_trip():
+    hashed = await get_password_hash("correct horse")
+    assert await verify_password("correct horse", hashed)
+    assert not await verify_password("wrong horse", hashed)
+    assert await verify_and_update_password("correct horse", hashed) == (True, None)
+
+
+@pytest.mark.anyio
+async def test_calibration_failure_keeps_default_rounds(monkeypatch):
+    import password_hashing
+
+    def broken(scheme, target_ms):
+        raise ValueError("password cannot be longer than 72 bytes")
+
+    monkeypatch.setattr(password_hashing, "PASSWORD_HASH_ROUNDS", 0)
+    monkeypatch.setattr(password_hashing, "_calibrate", broken)
+    before = password_hashing.hash_settings
+    await password_hashing.calibrate_password_hashing()
+    assert password_hashing.hash_settings == before
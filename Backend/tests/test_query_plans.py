@@ -0,0 +1,49 @@
+"""
+The query plan check of query_plans.py. The explain() run needs a mongod:
+set MONGODB_TEST_URI (CI uses a service container) or it is skipped.
+"""
+import inspect
+import os
+from types import SimpleNamespace
+import pytest
+import repositories
+from query_plans import QueryRecorder, repository_calls, run_plan_check
+
+MONGODB_TEST_URI = os.getenv("MONGODB_TEST_URI")
+
+
+def test_every_repository_method_is_called():
+    sources = {source for source, _ in repository_calls()}
+    for cls in (repositories.UsersRepository, repositories.ReadingsRepository, repositories.LabReportsRepository,
+                repositories.DrugsRepository, repositories.ImagesRepository, repositories.AnalysesRepository):
+        for name, _ in inspect.getmembers(cls, inspect.iscoroutinefunction):
+            if not name.startswith("_"):
+                assert f"{cls.__name__}.{name}" in sources
+    assert {"LabReportsRepository.list", "ImagesRepository.list_all"} <= sources
+
+
+def test_recorder_splits_bulk_writes_and_drops_session_fields():
+    recorder = QueryRecorder()
+    command = {
+        "update": "counters",
+        "ordered": False,
+        "updates": [{"q": {"_id": "drugs"}, "u": {"$inc": {"count": 1}}}, {"q": {"_id": "drugs:user0"}, "u": {}}],
+        "lsid": {"id": "x"},
+        "$db": "medwise",
+    }
+    recorder.started(SimpleNamespace(command_name="update", command=command))
+    assert recorder.commands == []
+
+    recorder.source = "counters"
+    recorder.started(SimpleNamespace(command_name="update", command=command))
+    recorder.started(SimpleNamespace(command_name="insert", command={"insert": "counters", "documents": []}))
+    assert [(s, c["updates"][0]["q"]) for s, c in recorder.commands] == [
+        ("counters", {"_id": "drugs"}), ("counters", {"_id": "drugs:user0"}),
+    ]
+    assert all("lsid" not in c and "$db" not in c for _, c in recorder.commands)
+
+
+@pytest.mark.anyio
+@pytest.mark.skipif(not MONGODB_TEST_URI, reason="needs a mongod (MONGODB_TEST_URI)")
+async def test_app_queries_use_an_index():
+    assert await run_plan_check(MONGODB_TEST_URI) == []
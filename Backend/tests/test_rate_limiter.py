@@ -0,0 +1,141 @@
+import asyncio
+import ipaddress
+import time
+from datetime import datetime
+import pytest
+from starlette.requests import Request
+import rate_limiter
+from rate_limiter import LoginRateLimiter, MemoryWindowStore, client_ip
+
+
+def _request(peer: str, *forwarded: str) -> Request:
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded]
+    return Request({"type": "http", "client": (peer, 50000), "headers": headers})
+
+
+@pytest.fixture
+def trusted(monkeypatch):
+    def configure(*proxies):
+        monkeypatch.setattr(rate_limiter, "_TRUST_ANY_PEER", "*" in proxies)
+        monkeypatch.setattr(rate_limiter, "_TRUSTED_NETWORKS", [
+            ipaddress.ip_network(p, strict=False) for p in proxies if p != "*"
+        ])
+    return configure
+
+
+def test_untrusted_peer_cannot_forward(trusted):
+    trusted("127.0.0.1")
+    assert client_ip(_request("203.0.113.7", "198.51.100.1")) == "203.0.113.7"
+
+
+def test_trusted_proxy_forwards_the_client(trusted):
+    trusted("10.0.0.0/8")
+    assert client_ip(_request("10.1.2.3", "198.51.100.1")) == "198.51.100.1"
+    assert client_ip(_request("10.1.2.3")) == "10.1.2.3"
+
+
+def test_spoofed_entries_left_of_the_client_are_ignored(trusted):
+    trusted("10.0.0.0/8")
+    request = _request("10.1.2.3", "1.2.3.4, 198.51.100.1", "10.9.9.9")
+    assert client_ip(request) == "198.51.100.1"
+
+
+def test_any_peer_trusts_one_hop(trusted):
+    trusted("*")
+    assert client_ip(_request("172.16.0.5", "1.2.3.4, 198.51.100.1")) == "198.51.100.1"
+    trusted("*", "192.0.2.0/24")
+    assert client_ip(_request("172.16.0.5", "198.51.100.1, 192.0.2.10")) == "198.51.100.1"
+
+
+# Limits
+
+@pytest.fixture
+def limiter():
+    return LoginRateLimiter(MemoryWindowStore(60), per_ip=20, per_email=5, failures_per_email=30)
+
+
+@pytest.mark.anyio
+async def test_other_ips_cannot_lock_an_account_out(limiter):
+    for _ in range(10):
+        await limiter.check("203.0.113.7", "patient@example.com")
+    assert await limiter.check("203.0.113.7", "patient@example.com") is not None
+    assert await limiter.check("198.51.100.1", "Patient@example.com ") is None
+
+
+@pytest.mark.anyio
+async def test_failures_are_capped_per_email_from_anywhere(limiter):
+    for i in range(30):
+        assert await limiter.check(f"203.0.113.{i}", "patient@example.com") is None
+        await limiter.record_failure("patient@example.com")
+    assert await limiter.check("198.51.100.1", "patient@example.com") is not None
+    assert await limiter.check("198.51.100.1", "other@example.com") is None
+
+
+@pytest.mark.anyio
+async def test_rejected_attempts_are_not_counted():
+    store = MemoryWindowStore(60)
+    now = 120.0
+    for _ in range(3):
+        assert await store.hit("key", 3, now) is None
+    for _ in range(10):
+        assert await store.hit("key", 3, now) is not None
+    # Halfway through the next window 3 * 0.5 is carried over: two more fit
+    assert await store.hit("key", 3, now + 90) is None
+    assert await store.hit("key", 3, now + 90) is None
+    assert await store.hit("key", 3, now + 90) is not None
+
+
+# Credential stuffing through the app
+
+@pytest.mark.anyio
+async def test_stuffing_leaves_other_endpoints_responsive(monkeypatch):
+    import httpx
+    import auth_routes
+    from main import app
+    from password_hashing import _hash, hash_pool
+    from repositories import get_users_repository
+
+    attackers, attempts = 4, 200
+    limiter = LoginRateLimiter(MemoryWindowStore(60), per_ip=5, per_email=3, failures_per_email=30)
+    monkeypatch.setattr(auth_routes, "login_limiter", limiter)
+    # A real hash cost (~20 ms a verify), so unthrottled attempts would queue for seconds
+    hashed = _hash("real-password", ("bcrypt", 8))
+    users = get_users_repository()
+    for i in range(50):
+        if not await users.find_by_email(f"victim{i}@example.com"):
+            await users.insert({
+                "user_id": f"victim-{i}", "user_name": "Victim", "user_email": f"victim{i}@example.com",
+                "password": hashed, "blood_group": "O+", "sex": "female", "created_at": datetime.utcnow(),
+            })
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        done = asyncio.Event()
+        latencies = []
+
+        async def unrelated_requests():
+            while not done.is_set():
+                started = time.perf_counter()
+                assert (await client.get("/health/live")).status_code == 200
+                latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.005)
+
+        async def attempt(i: int):
+            response = await client.post(
+                "/auth/login",
+                json={"user_email": f"victim{i % 50}@example.com", "password": f"guess-{i}"},
+                headers={"X-Forwarded-For": f"203.0.113.{i % attackers}"},
+            )
+            return response.status_code
+
+        verified_before = hash_pool.completed
+        probe = asyncio.create_task(unrelated_requests())
+        statuses = await asyncio.gather(*(attempt(i) for i in range(attempts)))
+        done.set()
+        await probe
+
+    assert set(statuses) == {401, 429}
+    assert statuses.count(401) <= attackers * limiter.per_ip
+    assert hash_pool.completed - verified_before <= attackers * limiter.per_ip
+    latencies.sort()
+    assert latencies[int(0.99 * (len(latencies) - 1))] < 0.25
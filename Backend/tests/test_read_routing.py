@@ -0,0 +1,116 @@
+"""
+Read preferences per route, routed_read() sessions and the write clock
+that makes routed reads see this worker's writes. No replica set is
+needed: the client, session and collection are stand-ins.
+"""
+from types import SimpleNamespace
+import pytest
+from bson import Timestamp
+from pymongo.read_preferences import Primary, SecondaryPreferred
+import read_routing
+from config import READ_MAX_STALENESS_SECONDS
+from mongo_monitoring import WriteClock
+from read_routing import LAB_REPORTS, READINGS, read_preference, routed_read
+
+
+class FakeSession:
+    def __init__(self):
+        self.cluster_time = None
+        self.operation_time = None
+
+    def advance_cluster_time(self, cluster_time):
+        self.cluster_time = cluster_time
+
+    def advance_operation_time(self, operation_time):
+        self.operation_time = operation_time
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.ended = True
+
+
+class FakeClient:
+    def __init__(self):
+        self.sessions = []
+
+    async def start_session(self, **options):
+        session = FakeSession()
+        session.options = options
+        self.sessions.append(session)
+        return session
+
+
+class FakeCollection:
+    def with_options(self, read_preference):
+        return SimpleNamespace(read_preference=read_preference)
+
+
+def _write(clock: WriteClock, seconds: int, command: str = "update"):
+    cluster_time = {"clusterTime": Timestamp(seconds, 1)}
+    reply = {"ok": 1, "operationTime": Timestamp(seconds, 1), "$clusterTime": cluster_time}
+    clock.succeeded(SimpleNamespace(command_name=command, reply=reply))
+
+
+# read_preference
+
+def test_routes_read_from_the_primary_unless_enabled():
+    assert read_preference(READINGS, enabled=False) == Primary()
+    assert read_preference("unlisted", enabled=True) == Primary()
+
+
+def test_enabled_routes_prefer_secondaries_within_the_staleness_bound():
+    preference = read_preference(LAB_REPORTS, enabled=True)
+    assert preference == SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS)
+
+
+# routed_read
+
+@pytest.mark.anyio
+async def test_primary_reads_use_no_session(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(read_routing, "get_client", lambda: client)
+    collection = FakeCollection()
+    async with routed_read(collection, READINGS, enabled=False) as (reader, session):
+        assert reader is collection
+        assert session is None
+    assert client.sessions == []
+
+
+@pytest.mark.anyio
+async def test_secondary_reads_start_after_the_newest_write(monkeypatch):
+    client, clock = FakeClient(), WriteClock()
+    monkeypatch.setattr(read_routing, "get_client", lambda: client)
+    monkeypatch.setattr(read_routing, "write_clock", clock)
+    _write(clock, 100)
+
+    async with routed_read(FakeCollection(), READINGS, enabled=True) as (reader, session):
+        assert reader.read_preference == read_preference(READINGS, enabled=True)
+        assert session.options == {"causal_consistency": True}
+        assert session.operation_time == Timestamp(100, 1)
+        assert session.cluster_time == {"clusterTime": Timestamp(100, 1)}
+    assert session.ended
+
+
+# WriteClock
+
+def test_write_clock_keeps_the_newest_write():
+    clock = WriteClock()
+    _write(clock, 200)
+    _write(clock, 100)
+    _write(clock, 300, command="find")
+    assert clock.operation_time == Timestamp(200, 1)
+    assert clock.cluster_time == {"clusterTime": Timestamp(200, 1)}
+
+    _write(clock, 250, command="findAndModify")
+    assert clock.operation_time == Timestamp(250, 1)
+
+
+def test_write_clock_ignores_standalone_replies():
+    clock = WriteClock()
+    clock.succeeded(SimpleNamespace(command_name="insert", reply={"ok": 1, "n": 1}))
+    session = FakeSession()
+    clock.advance(session)
+    assert session.operation_time is None
+    assert session.cluster_time is None
@@ -0,0 +1,36 @@
+import asyncio
+import pytest
+import health
+import main
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_indexes_and_migrations_wait_for_mongo(monkeypatch):
+    calls = {"ping": 0, "indexes": 0, "migrations": 0}
+
+    class Database:
+        async def command(self, name):
+            calls["ping"] += 1
+            if calls["ping"] < 3:
+                raise ConnectionError("Mongo is down")
+
+    async def ensure_indexes(db):
+        calls["indexes"] += 1
+        return {"users": {"created": [], "dropped": [], "conflicts": [], "unmanaged": []}}
+
+    async def run_pending_migrations(db):
+        assert health.indexes_ready
+        calls["migrations"] += 1
+
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(main, "get_database", Database)
+    monkeypatch.setattr(main, "ensure_indexes", ensure_indexes)
+    monkeypatch.setattr(main, "run_pending_migrations", run_pending_migrations)
+    monkeypatch.setattr(main, "MIGRATIONS_ON_STARTUP", True)
+    monkeypatch.setattr(main.asyncio, "sleep", lambda seconds: real_sleep(0))
+    monkeypatch.setattr(health, "indexes_ready", False)
+
+    await main.prepare_database()
+    assert calls == {"ping": 3, "indexes": 1, "migrations": 1}
+    assert health.indexes_ready
@@ -0,0 +1,358 @@
+"""
+Lightweight request tracing.
+
+A trace is a tree of spans, each with a name, start/end time, attributes
+and status. The current span lives in a context variable, so spans nest
+across awaits and follow ``asyncio.create_task``, ``asyncio.to_thread``
+and Motor's executor threads.
+
+- TracingMiddleware opens a server span per request, continuing an
+  incoming W3C ``traceparent`` header if there is one.
+- ``span(name, **attributes)`` opens a child of the current span. With no
+  trace active it does nothing, so stages can be instrumented
+  unconditionally.
+- Background jobs take ``traceparent()`` with them and open their first
+  span with ``span(name, parent=...)``. The job then joins the request's
+  trace even though it outlives the request.
+- ``command_spans``, a pymongo CommandListener, adds a client span for
+  every Mongo command issued inside a trace.
+
+Finished spans go to a ring buffer (TRACE_BUFFER_SPANS), browsable at
+/admin/traces. With TRACE_EXPORTER=file they are also appended to
+TRACE_FILE by a background thread, as JSON lines. TRACE_FORMAT=otlp
+writes each batch as an OTLP/JSON ExportTraceServiceRequest, which the
+OpenTelemetry Collector's otlpjsonfile receiver can read. The admin
+endpoint can return either format.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pymongo import monitoring
+from config import TRACE_SAMPLE_RATE, TRACE_EXPORTER, TRACE_FORMAT, TRACE_FILE, TRACE_BUFFER_SPANS
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "medwise-backend"
+SERVER, CLIENT, INTERNAL = "server", "client", "internal"
+
+_current = contextvars.ContextVar("span", default=None)
+_TRACEPARENT = re.compile(r"00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id, kind: str, attributes: dict):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.status = "unset"
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException):
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self, end_ns: int = None):
+        self.end_ns = end_ns or time.time_ns()
+        if self.status == "unset":
+            self.status = "ok"
+        _export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+    def fail(self, error: BaseException):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def current_span():
+    return _current.get()
+
+
+def traceparent():
+    """W3C traceparent of the current span, to hand to background work (None outside a trace)"""
+    span = _current.get()
+    return None if span is None else f"00-{span.trace_id}-{span.span_id}-01"
+
+
+def _parse_traceparent(value):
+    match = _TRACEPARENT.fullmatch(value or "")
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, int(flags, 16) & 1
+
+
+def _start(name: str, kind: str, attributes: dict, parent=None, root: bool = False):
+    """A new span (not yet current), or None when this work is not traced"""
+    if parent is not None:
+        parsed = _parse_traceparent(parent)
+        if parsed is None or not parsed[2]:
+            return None
+        trace_id, parent_id = parsed[0], parsed[1]
+    else:
+        current = _current.get()
+        if current is not None:
+            trace_id, parent_id = current.trace_id, current.span_id
+        elif root and random.random() < TRACE_SAMPLE_RATE:
+            trace_id, parent_id = os.urandom(16).hex(), None
+        else:
+            return None
+    return Span(name, trace_id, parent_id, kind, attributes)
+
+
+@contextmanager
+def span(name: str, parent: str = None, kind: str = INTERNAL, **attributes):
+    """
+    Child span of the current one, or of ``parent`` (a traceparent) when
+    given. Yields the span (or a no-op stand-in) so callers can add
+    attributes with ``.set()``.
+    """
+    new = _start(name, kind, attributes, parent)
+    if new is None:
+        yield _NOOP
+        return
+    token = _current.set(new)
+    try:
+        yield new
+    except BaseException as e:
+        new.fail(e)
+        raise
+    finally:
+        _current.reset(token)
+        new.end()
+
+
+class TracingMiddleware:
+    """Server span per HTTP request; continues an incoming traceparent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                incoming = value.decode("latin-1")
+                break
+        if incoming is not None and _parse_traceparent(incoming) is None:
+            incoming = None
+        server = _start(scope["method"], SERVER, {"http.method": scope["method"]}, incoming, root=True)
+        if server is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                server.attributes["http.status_code"] = message["status"]
+                if message["status"] >= 500:
+                    server.status = "error"
+            await send(message)
+
+        token = _current.set(server)
+        try:
+            await self.app(scope, receive, send_with_status)
+        except BaseException as e:
+            server.fail(e)
+            raise
+        finally:
+            _current.reset(token)
+            # The route template is known once routing has run
+            route = scope.get("route")
+            if route is not None:
+                server.name = f"{scope['method']} {route.path}"
+                server.attributes["http.route"] = route.path
+            server.end()
+
+
+class CommandSpans(monitoring.CommandListener):
+    """Client span per Mongo command issued inside a trace (events arrive on Motor's threads)"""
+
+    def __init__(self):
+        self._open = {}
+
+    def started(self, event):
+        new = _start(f"mongo {event.command_name}", CLIENT, {
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+            "db.collection": str(event.command.get(event.command_name, "")),
+        })
+        if new is not None:
+            self._open[(event.request_id, event.operation_id)] = new
+
+    def _finish(self, event, error=None):
+        finished = self._open.pop((event.request_id, event.operation_id), None)
+        if finished is None:
+            return
+        if error is not None:
+            finished.status, finished.error = "error", error
+        # The driver's own round trip time rather than the callback timing
+        finished.end(finished.start_ns + event.duration_micros * 1000)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure.get("errmsg", "command failed")))
+
+
+command_spans = CommandSpans()
+
+
+# Export
+
+buffer = deque(maxlen=TRACE_BUFFER_SPANS)
+_file_queue = None
+
+
+def _export(finished: Span):
+    buffer.append(finished)
+    if _file_queue is not None:
+        _file_queue.put(finished)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+_OTLP_KIND = {INTERNAL: 1, SERVER: 2, CLIENT: 3}
+_OTLP_STATUS = {"unset": 0, "ok": 1, "error": 2}
+
+
+def to_otlp(spans) -> dict:
+    """Spans as an OTLP/JSON ExportTraceServiceRequest"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [
+                    {
+                        "traceId": s.trace_id,
+                        "spanId": s.span_id,
+                        "parentSpanId": s.parent_id or "",
+                        "name": s.name,
+                        "kind": _OTLP_KIND[s.kind],
+                        "startTimeUnixNano": str(s.start_ns),
+                        "endTimeUnixNano": str(s.end_ns),
+                        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                        "status": {"code": _OTLP_STATUS[s.status], **({"message": s.error} if s.error else {})},
+                    }
+                    for s in spans
+                ],
+            }],
+        }],
+    }
+
+
+def _write_file(spans_queue: queue.SimpleQueue, path: str, fmt: str):
+    with open(path, "a", encoding="utf-8") as out:
+        while True:
+            batch = [spans_queue.get()]
+            # Drain whatever else is waiting so one write covers a burst
+            while len(batch) < 512:
+                try:
+                    batch.append(spans_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if fmt == "otlp":
+                out.write(json.dumps(to_otlp(batch), default=str) + "\n")
+            else:
+                out.writelines(json.dumps(s.to_dict(), default=str) + "\n" for s in batch)
+            out.flush()
+
+
+def start_file_exporter(path: str = TRACE_FILE, fmt: str = TRACE_FORMAT):
+    """Append finished spans to path from a background thread"""
+    global _file_queue
+    if _file_queue is not None:
+        return
+    _file_queue = queue.SimpleQueue()
+    threading.Thread(target=_write_file, args=(_file_queue, path, fmt), name="trace-file-exporter", daemon=True).start()
+    logger.info(f"Exporting traces to {path} ({fmt})")
+
+
+if TRACE_EXPORTER == "file":
+    start_file_exporter()
+
+
+def recent_traces(limit: int = 50) -> list:
+    """
+    Newest traces in the buffer, with the first span's name, span and error
+    counts, and the time from first start to last end (background work
+    included)
+    """
+    traces = {}
+    for s in reversed(buffer):
+        entry = traces.get(s.trace_id)
+        if entry is None:
+            if len(traces) == limit:
+                continue
+            entry = traces[s.trace_id] = {"trace_id": s.trace_id, "spans": 0, "errors": 0, "start_ns": s.start_ns, "end_ns": s.end_ns, "root": s.name}
+        entry["spans"] += 1
+        entry["errors"] += s.status == "error"
+        if s.start_ns < entry["start_ns"]:
+            entry["start_ns"], entry["root"] = s.start_ns, s.name
+        entry["end_ns"] = max(entry["end_ns"], s.end_ns)
+    return [
+        {
+            "trace_id": entry["trace_id"],
+            "root": entry["root"],
+            "duration_ms": round((entry["end_ns"] - entry["start_ns"]) / 1e6, 3),
+            "spans": entry["spans"],
+            "errors": entry["errors"],
+        }
+        for entry in traces.values()
+    ]
+
+
+def get_trace(trace_id: str) -> list:
+    """Spans of one trace in start order"""
+    return sorted((s for s in list(buffer) if s.trace_id == trace_id), key=lambda s: s.start_ns)
@@ -0,0 +1,129 @@
+"""
+Vital-sign normalization for manually entered lab reports.
+
+Lab reports keep the strings typed by the user in ``vitalSigns``. At ingest
+they are parsed into typed numeric values with canonical units and stored
+under ``normalizedVitals`` so they can be indexed, range-queried and charted:
+
+- blood pressure: systolic/diastolic in mmHg   ("120/80", "120/80 mmHg")
+- heart rate:     beats per minute            ("98 bpm", "78 b/min", "72")
+- glucose:        mmol/L                       ("5.6 mmol/L", "101 mg/dL")
+- weight:         kg                           ("78kg", "172 lbs")
+
+Unparseable or empty values normalize to None.
+"""
+import re
+import logging
+from datetime import datetime
+from typing import Optional
+from repositories import get_readings_repository
+import counters
+
+logger = logging.getLogger(__name__)
+
+MG_DL_PER_MMOL_L = 18.016
+KG_PER_LB = 0.45359237
+
+_NUMBER = r"(\d+(?:[.,]\d+)?)"
+_BP_RE = re.compile(rf"{_NUMBER}\s*/\s*{_NUMBER}")
+_VALUE_RE = re.compile(rf"{_NUMBER}\s*([a-zA-Z/µ]*)")
+
+
+def _to_float(text: str) -> float:
+    return float(text.replace(",", "."))
+
+
+def _split_value(text) -> Optional[tuple]:
+    """Return (value, lowercased unit) for strings like '78kg' or '5.6 mmol/L'"""
+    if not text or not isinstance(text, str):
+        return None
+    match = _VALUE_RE.search(text)
+    if not match:
+        return None
+    return _to_float(match.group(1)), match.group(2).lower()
+
+
+def parse_blood_pressure(text) -> Optional[dict]:
+    if not text or not isinstance(text, str):
+        return None
+    match = _BP_RE.search(text)
+    if not match:
+        return None
+    systolic, diastolic = round(_to_float(match.group(1))), round(_to_float(match.group(2)))
+    if not (40 <= systolic <= 300 and 20 <= diastolic <= 200):
+        return None
+    return {"systolic": systolic, "diastolic": diastolic, "unit": "mmHg"}
+
+
+def parse_heart_rate(text) -> Optional[dict]:
+    parsed = _split_value(text)
+    if not parsed:
+        return None
+    value, _ = parsed
+    if not 20 <= value <= 300:
+        return None
+    return {"value": value, "unit": "bpm"}
+
+
+def parse_glucose(text) -> Optional[dict]:
+    parsed = _split_value(text)
+    if not parsed:
+        return None
+    value, unit = parsed
+    # Without an explicit unit, values above the mmol/L physiological range are mg/dL
+    if unit.startswith("mg") or (not unit.startswith("mmol") and value > 35):
+        value = value / MG_DL_PER_MMOL_L
+    if not 0.5 <= value <= 60:
+        return None
+    return {"value": round(value, 2), "unit": "mmol/L"}
+
+
+def parse_weight(text) -> Optional[dict]:
+    parsed = _split_value(text)
+    if not parsed:
+        return None
+    value, unit = parsed
+    if unit.startswith("lb") or unit.startswith("pound"):
+        value = value * KG_PER_LB
+    if not 0.5 <= value <= 500:
+        return None
+    return {"value": round(value, 2), "unit": "kg"}
+
+
+def normalize_vital_signs(vital_signs: dict) -> dict:
+    """Parse a lab report's vitalSigns strings into typed values"""
+    return {
+        "bloodPressure": parse_blood_pressure(vital_signs.get("bloodPressure")),
+        "heartRate": parse_heart_rate(vital_signs.get("heartRate")),
+        "glucose": parse_glucose(vital_signs.get("GlucoseLevel")),
+        "weight": parse_weight(vital_signs.get("weight")),
+    }
+
+
+async def record_vital_readings(user_id: str, normalized_vitals: dict, lab_report_id: str):
+    """Feed parsed blood pressure and glucose into the user's readings time series"""
+    date = datetime.utcnow()
+    source = {"source": "lab_report", "lab_report_id": lab_report_id}
+    push = {}
+
+    bp = normalized_vitals.get("bloodPressure")
+    if bp:
+        push["blood_pressure_readings"] = {
+            "value": {"systolic": bp["systolic"], "diastolic": bp["diastolic"]},
+            "date": date,
+            **source,
+        }
+    glucose = normalized_vitals.get("glucose")
+    if glucose:
+        push["glucose_readings"] = {"value": glucose["value"], "date": date, **source}
+
+    if not push:
+        return
+
+    await get_readings_repository().push(user_id, push)
+
+    if bp:
+        await counters.increment(counters.BP_READINGS, user_id)
+    if glucose:
+        await counters.increment(counters.GLUCOSE_READINGS, user_id)
+    logger.info(f"Recorded readings {list(push)} from lab report {lab_report_id} for user {user_id}")
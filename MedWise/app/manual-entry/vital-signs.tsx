@@ -22,6 +22,7 @@ import { MedicalRecord } from "@/types/medical";
 import { storageUtils } from "@/utils/storage";
 import { PDFExportService } from "@/utils/pdfExport";
 import { useFocusEffect } from "@react-navigation/native";
+import { useAuth } from "@/contexts/AuthContext";
 
 const { width, height } = Dimensions.get("window");
 
@@ -39,6 +40,7 @@ export default function VitalSignsScreen() {
   const router = useRouter();
   const { formData, updateFormData, resetFormData, exportToPDF, isExporting } =
     useManualEntry();
+  const { currentUser } = useAuth();
   const [loading, setLoading] = useState(false);
   const [focusedField, setFocusedField] = useState<string | null>(null);
   const [recordSaved, setRecordSaved] = useState(false);
@@ -280,7 +282,12 @@ export default function VitalSignsScreen() {
 
         console.log("Saving lab report to backend:", payload);
 
-        await fetch("https://medwise-9nv0.onrender.com/lab-reports/", {
+        // Passing the user lets the backend add parsed vitals to the readings charts
+        const userQuery = currentUser?.user_id
+          ? `?user_id=${encodeURIComponent(currentUser.user_id)}`
+          : "";
+
+        await fetch(`https://medwise-9nv0.onrender.com/lab-reports/${userQuery}`, {
           method: "POST",
           headers: {
             "Content-Type": "application/json",
@@ -7,6 +7,7 @@ interface LoginData {
 
 interface LoginResponse {
   access_token: string;
+  refresh_token?: string;
   token_type: string;
   user: {
     user_id: string;
@@ -29,6 +30,7 @@ interface CurrentUser {
 
 interface SignupResponse {
   access_token: string;
+  refresh_token?: string;
   token_type: string;
   user: {
     user_id: string;
@@ -58,6 +60,55 @@ class AuthService {
     }
   }
 
+  private async storeTokens(accessToken: string, refreshToken?: string) {
+    await AsyncStorage.setItem("access_token", accessToken);
+    if (refreshToken) {
+      await AsyncStorage.setItem("refresh_token", refreshToken);
+    }
+  }
+
+  private refreshInFlight: Promise<string | null> | null = null;
+
+  // Access tokens are short-lived: trade the refresh token for a new pair.
+  // Concurrent callers share one request: each refresh token works only once.
+  refreshSession(): Promise<string | null> {
+    if (!this.refreshInFlight) {
+      this.refreshInFlight = this.requestRefresh().finally(() => {
+        this.refreshInFlight = null;
+      });
+    }
+    return this.refreshInFlight;
+  }
+
+  private async requestRefresh(): Promise<string | null> {
+    try {
+      const refreshToken = await AsyncStorage.getItem("refresh_token");
+      if (!refreshToken) {
+        return null;
+      }
+
+      const response = await fetch(`${this.baseURL}/auth/refresh`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({ refresh_token: refreshToken }),
+      });
+
+      if (!response.ok) {
+        console.log("AuthService: Refresh failed with status:", response.status);
+        return null;
+      }
+
+      const result = await response.json();
+      await this.storeTokens(result.access_token, result.refresh_token);
+      return result.access_token;
+    } catch (error) {
+      console.error("AuthService: Refresh error:", error);
+      return null;
+    }
+  }
+
   async login(data: LoginData): Promise<LoginResponse> {
     try {
       console.log("AuthService: Attempting login for:", data.user_email);
@@ -84,7 +135,7 @@ class AuthService {
       console.log("AuthService: Login successful, storing token...");
 
       // Store the token
-      await AsyncStorage.setItem("access_token", result.access_token);
+      await this.storeTokens(result.access_token, result.refresh_token);
       await AsyncStorage.setItem("user_data", JSON.stringify(result.user));
 
       console.log("AuthService: Token and user data stored successfully");
@@ -139,7 +190,21 @@ class AuthService {
   async logout(): Promise<void> {
     try {
       console.log("AuthService: Logging out...");
+      const token = await this.getToken();
+      const refreshToken = await AsyncStorage.getItem("refresh_token");
+      if (token || refreshToken) {
+        // Revoke the session on the server; local logout proceeds regardless
+        fetch(`${this.baseURL}/auth/logout`, {
+          method: "POST",
+          headers: {
+            ...(token ? { Authorization: `Bearer ${token}` } : {}),
+            "Content-Type": "application/json",
+          },
+          body: refreshToken ? JSON.stringify({ refresh_token: refreshToken }) : undefined,
+        }).catch((error) => console.log("AuthService: Server logout failed:", error));
+      }
       await AsyncStorage.removeItem("access_token");
+      await AsyncStorage.removeItem("refresh_token");
       await AsyncStorage.removeItem("user_data");
       console.log("AuthService: Logout completed");
     } catch (error) {
@@ -171,7 +236,14 @@ class AuthService {
       if (response.ok) {
         const data = await response.json();
         console.log("AuthService: Token verification result:", data);
-        return data.authenticated === true;
+        if (data.authenticated === true) {
+          return true;
+        }
+        if (await this.refreshSession()) {
+          return true;
+        }
+        await this.logout();
+        return false;
       } else if (response.status === 404 || response.status === 401) {
         // Token is invalid
         console.log("AuthService: Token invalid during check, clearing...");
@@ -190,7 +262,7 @@ class AuthService {
     }
   }
 
-  async getCurrentUser(): Promise<CurrentUser | null> {
+  async getCurrentUser(retry: boolean = true): Promise<CurrentUser | null> {
     try {
       const token = await this.getToken();
       if (!token) {
@@ -216,6 +288,9 @@ class AuthService {
         const userData = await response.json();
         console.log("Current user data fetched successfully:", userData);
         return userData;
+      } else if (response.status === 401 && retry && (await this.refreshSession())) {
+        // Access token expired: retry once with the refreshed token
+        return this.getCurrentUser(false);
       } else if (response.status === 404 || response.status === 401) {
         // Token is invalid or user not found
         console.log(
@@ -297,7 +372,7 @@ class AuthService {
       console.log("AuthService: Signup successful:", result);
 
       // Store the token and user data
-      await AsyncStorage.setItem("access_token", result.access_token);
+      await this.storeTokens(result.access_token, result.refresh_token);
       await AsyncStorage.setItem("user_data", JSON.stringify(result.user));
 
       return result;